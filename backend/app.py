@@ -1,17 +1,29 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import pandas as pd
 from datetime import datetime
-import joblib
 import numpy as np
 import sys
 import json
 import io
+import shutil
+import time
+from functools import lru_cache
 
 # Import database and auth
-from models.database import db, User, Upload, Prediction, init_db
+from models.database import db, User, Upload, Prediction, Job, init_db
 from utils.auth import generate_token, get_current_user, login_required, optional_auth
+from utils.ingest import scan_csv, read_csv_header, append_csv_rows, DEFAULT_CHUNK_ROWS, COPY_BUFFER_SIZE
+from utils.frame_store import FrameStoreWriter, write_frame, load_frame, store_exists, store_rows, iter_frame
+from utils.model_registry import ModelRegistry, LIKES_MODEL, GROWTH_MODEL
+from utils.jobs import JobManager
+from utils.jobs import FINISHED_STATUSES
+from utils.tasks import train_models_job, train_shard_job, predict_job
+from utils.prediction import feature_matrix, summarize_predictions, write_prediction_rows
+from utils.batching import MicroBatcher
+from utils.schedule import account_profile, optimize_schedule, PROFILE_COLUMNS, DEFAULT_TOP_SLOTS
+from utils.shards import UserModels, SHARD_SCOPES, MIN_SHARD_POSTS
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
@@ -19,6 +31,7 @@ CORS(app, supports_credentials=True)
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+PREDICTION_FOLDER = os.path.join(UPLOAD_FOLDER, 'predictions')
 MODEL_FOLDER = os.path.join(BASE_DIR, '..', 'ml', 'models')
 DATABASE_FOLDER = os.path.join(BASE_DIR, '..', 'database')
 ALLOWED_EXTENSIONS = {'csv'}
@@ -27,80 +40,369 @@ ALLOWED_EXTENSIONS = {'csv'}
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(DATABASE_FOLDER, "postpredict.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Uploads are parsed in bounded chunks, so the size cap only limits disk usage
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_FILE_SIZE_MB', 1024)) * 1024 * 1024
+app.config['UPLOAD_CHUNK_ROWS'] = int(os.environ.get('UPLOAD_CHUNK_ROWS', DEFAULT_CHUNK_ROWS))
+# Uploads with at least this many posts are engineered in partitions across a process pool
+app.config['PARALLEL_FEATURE_ROWS'] = int(os.environ.get('PARALLEL_FEATURE_ROWS', 1_000_000))
+app.config['FEATURE_WORKERS'] = int(os.environ.get('FEATURE_WORKERS', 0)) or None
+# First-model trainings queued by /api/predict stop after this many seconds (0: train on all posts)
+app.config['TRAIN_BUDGET_SECONDS'] = float(os.environ.get('TRAIN_BUDGET_SECONDS', 60))
+# Queue training when /api/predict finds no model (0: models only come from the offline trainer)
+app.config['TRAIN_ON_REQUEST'] = os.environ.get('TRAIN_ON_REQUEST', '1') != '0'
+# Processes cross-validating candidates of model_type 'auto' (0: one per CPU)
+app.config['SELECTION_WORKERS'] = int(os.environ.get('SELECTION_WORKERS', 0)) or None
+# Trained forests are published as flat arrays ('float64', 'float32' or 'quantized' thresholds; 'none' keeps sklearn pickles)
+app.config['MODEL_EXPORT'] = os.environ.get('MODEL_EXPORT', 'float32').lower()
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'  # Change in production!
 
+# Rows serialized per chunk by the per-post prediction export
+EXPORT_CHUNK_ROWS = 10000
+
+# Maximum number of posts accepted by one /api/score request
+MAX_SCORE_POSTS = 1000
+
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(PREDICTION_FOLDER, exist_ok=True)
 os.makedirs(MODEL_FOLDER, exist_ok=True)
 os.makedirs(DATABASE_FOLDER, exist_ok=True)
 
+# Make the ml package importable (also needed to unpickle joint and flat models)
+ML_PATH = os.path.join(BASE_DIR, '..', 'ml')
+if ML_PATH not in sys.path:
+    sys.path.insert(0, ML_PATH)
+
+# Trained models (global and per-user shards), served from memory and hot-reloaded
+# when artifacts change; the least recently used are evicted beyond the cache budget
+model_registry = ModelRegistry(
+    MODEL_FOLDER,
+    mmap_mode=os.environ.get('MODEL_MMAP_MODE') or None,
+    max_bytes=int(os.environ.get('MODEL_CACHE_MB', 512)) * 1024 * 1024
+)
+model_registry.preload([LIKES_MODEL, GROWTH_MODEL])
+from trainings.feature_cache import FeatureCache
+from trainings.feature_engineering import engineer_features, engineer_features_incremental, IncrementalUnsupported
+from trainings.parallel_features import engineer_features_partitioned
+from trainings.incremental_training import INCREMENTAL_MODEL_TYPES
+from trainings.budgeted_training import BUDGETED_MODEL_TYPES
+from trainings.compact import frame_memory
+
+# Feature matrices cached per upload (memory LRU + disk tier)
+FEATURE_CACHE_FOLDER = os.path.join(BASE_DIR, 'cache', 'features')
+feature_cache = FeatureCache(
+    FEATURE_CACHE_FOLDER,
+    memory_bytes=int(os.environ.get('FEATURE_CACHE_MEMORY_MB', 256)) * 1024 * 1024,
+    disk_bytes=int(os.environ.get('FEATURE_CACHE_DISK_MB', 2048)) * 1024 * 1024
+)
+
 # Initialize database
 init_db(app)
 
+# Background jobs (training, scoring) run in a local process pool
+JOB_FOLDER = os.path.join(BASE_DIR, 'jobs')
+job_manager = JobManager(app, db, Job, JOB_FOLDER, max_workers=int(os.environ.get('JOB_WORKERS', 2)))
+with app.app_context():
+    job_manager.recover()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def train_model_safe(df_processed, model_path):
-    """Safely train model with error handling"""
-    try:
-        ml_path = os.path.join(BASE_DIR, '..', 'ml')
-        if ml_path not in sys.path:
-            sys.path.insert(0, ml_path)
-        from trainings.train_model import train_model
-        model = train_model(df_processed)
-        joblib.dump(model, model_path)
-        return model
-    except Exception as e:
-        raise Exception(f"Model training failed: {str(e)}")
-
 def preprocess_data(df):
     """
     Preprocess the uploaded CSV data using advanced feature engineering
     Uses the feature_engineering module for comprehensive feature creation
     """
+    from trainings.feature_engineering import engineer_features
+    return engineer_features(df)
+
+# Rolling-window state kept next to each store for incremental appends
+FEATURE_STATE_NAME = 'feature_state.json'
+
+def save_feature_state(store_path, state):
+    """Persist the feature state of a store (removing it when there is none)"""
+    path = os.path.join(store_path, FEATURE_STATE_NAME)
+    if state is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as fh:
+        json.dump(state, fh)
+    os.replace(tmp_path, path)
+
+def load_feature_state(store_path):
+    """Feature state of a store, or None"""
+    try:
+        with open(os.path.join(store_path, FEATURE_STATE_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, TypeError, ValueError):
+        return None
+
+def stage_raw_frame(filepath):
+    """
+    Stream a CSV into a temporary raw columnar store and memory-map it back
+    
+    String columns stay dictionary-encoded (Categoricals over the mapped codes).
+    The caller removes the raw store (filepath + '.raw') when done.
+    
+    Returns:
+        (scan stats, raw frame)
+    """
+    raw_store_path = filepath + '.raw'
+    with FrameStoreWriter(raw_store_path) as raw_writer:
+        scan = scan_csv(filepath, chunk_rows=app.config['UPLOAD_CHUNK_ROWS'], on_chunk=raw_writer.append)
+    
+    return scan, load_frame(raw_store_path)
+
+def ingest_upload(filepath):
+    """
+    Parse an uploaded CSV once and persist its preprocessed frame
+    
+    The preprocessed frame is written to a columnar store next to the CSV so
+    predictions never re-parse it, together with the rolling-window state
+    used to engineer posts appended later. Large uploads are engineered in
+    partitions across a process pool and streamed into the store.
+    
+    Returns:
+        (scan stats with the memory of the raw and preprocessed frames,
+        path of the preprocessed store, preprocessed frame)
+    """
+    store_path = filepath + '.store'
+    try:
+        scan, df_raw = stage_raw_frame(filepath)
+        if len(df_raw) >= app.config['PARALLEL_FEATURE_ROWS']:
+            with FrameStoreWriter(store_path) as writer:
+                state = engineer_features_partitioned(
+                    df_raw, writer.append, return_state=True, max_workers=app.config['FEATURE_WORKERS']
+                )
+            df_processed = load_frame(store_path)
+        else:
+            df_processed, state = engineer_features(df_raw, return_state=True)
+            write_frame(df_processed, store_path)
+        scan['memory'] = {
+            'raw_bytes': frame_memory(df_raw)['total'],
+            'processed_bytes': frame_memory(df_processed)['total']
+        }
+        save_feature_state(store_path, state)
+    finally:
+        shutil.rmtree(filepath + '.raw', ignore_errors=True)
+    
+    return scan, store_path, df_processed
+
+def append_to_upload(upload, filepath):
+    """
+    Append the posts of a CSV (same columns as the upload) to an upload
+    
+    New posts are engineered from the stored rolling-window state and appended
+    to the upload's store and cached feature matrix, so the cost is
+    proportional to the new posts. When that could differ from a full
+    recomputation (e.g. back-dated posts), the whole upload is re-ingested.
+    
+    Returns:
+        (number of appended posts, 'incremental' or 'full')
+    """
+    from trainings.train_model import build_feature_matrix
+    
     try:
-        # Import feature engineering module
-        ml_path = os.path.join(BASE_DIR, '..', 'ml')
-        if ml_path not in sys.path:
-            sys.path.insert(0, ml_path)
-        from trainings.feature_engineering import engineer_features
-        
-        # Use advanced feature engineering
-        df_processed = engineer_features(df)
-        return df_processed
-    except ImportError:
-        # Fallback to basic preprocessing if module not found
-        df_processed = df.copy()
-        
-        # Basic date parsing
-        date_columns = ['post_date', 'date', 'timestamp', 'datetime', 'created_at']
-        for col in date_columns:
-            if col in df_processed.columns:
-                df_processed[col] = pd.to_datetime(df_processed[col], errors='coerce')
-                df_processed['posting_hour'] = df_processed[col].dt.hour
-                df_processed['posting_day'] = df_processed[col].dt.dayofweek
-                df_processed['month'] = df_processed[col].dt.month
-                break
-        
-        # Platform encoding
-        if 'platform' in df_processed.columns:
-            platform_map = {'instagram': 0, 'facebook': 1, 'linkedin': 2, 'Instagram': 0, 'Facebook': 1, 'LinkedIn': 2}
-            df_processed['platform_encoded'] = df_processed['platform'].str.lower().map(platform_map).fillna(0).astype(int)
-        
-        # Content type encoding
-        if 'content_type' in df_processed.columns:
-            content_map = {'image': 0, 'video': 1, 'carousel': 2, 'text': 3, 'Image': 0, 'Video': 1, 'Carousel': 2, 'Text': 3}
-            df_processed['content_type_encoded'] = df_processed['content_type'].str.lower().map(content_map).fillna(0).astype(int)
-        
-        # Fill missing values
-        numeric_cols = ['likes', 'comments', 'shares', 'followers_at_post_time', 'followers', 'caption_length', 'hashtags_count', 'hashtag_count']
-        for col in numeric_cols:
-            if col in df_processed.columns:
-                df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0).astype(int)
-        
-        df_processed = df_processed.replace([np.inf, -np.inf], 0)
-        return df_processed
+        scan, df_raw = stage_raw_frame(filepath)
+        try:
+            df_processed, state = engineer_features_incremental(df_raw, load_feature_state(upload.store_path))
+        except IncrementalUnsupported:
+            df_processed = None
+        
+        if df_processed is not None and store_exists(upload.store_path):
+            rows = store_rows(upload.store_path)
+            with FrameStoreWriter(upload.store_path, append=True) as writer:
+                writer.append(df_processed)
+            save_feature_state(upload.store_path, state)
+            append_csv_rows(upload.file_path, filepath)
+            
+            # Cache entries are keyed by row count, so every process now misses
+            # the old matrix; store the extended one instead of rebuilding it
+            cached = feature_cache.get(upload.id, rows)
+            if cached is not None:
+                X, feature_names = cached
+                try:
+                    X_new = build_feature_matrix(df_processed, feature_names).to_numpy(dtype=np.float32)
+                    feature_cache.put(upload.id, np.concatenate([X, X_new]), feature_names)
+                except KeyError:
+                    pass
+            mode = 'incremental'
+        else:
+            # The state no longer describes the CSV once rows are appended to it
+            if store_exists(upload.store_path):
+                save_feature_state(upload.store_path, None)
+            append_csv_rows(upload.file_path, filepath)
+            _, upload.store_path, _ = ingest_upload(upload.file_path)
+            mode = 'full'
+    finally:
+        shutil.rmtree(filepath + '.raw', ignore_errors=True)
+    
+    upload.total_posts = (upload.total_posts or 0) + scan['total_posts']
+    return scan['total_posts'], mode
+
+def load_upload_frame(upload):
+    """Load the preprocessed frame of an upload, preferring its columnar store"""
+    if store_exists(upload.store_path):
+        return load_frame(upload.store_path)
+    return preprocess_data(pd.read_csv(upload.file_path))
+
+def model_export():
+    """Threshold format forests are published in (None: sklearn pickles)"""
+    export = app.config['MODEL_EXPORT']
+    return None if export in ('', 'none') else export
+
+def start_shard_job(user, model_type='random_forest', platforms=False, filepath=None, budget_seconds=None,
+                    fallback_global=False):
+    """
+    Queue training of the user's model shard from all of their uploads,
+    reusing an active shard job of the user
+    
+    With budget_seconds training stops once the budget is spent (see
+    trainings.budgeted_training); model_type 'auto' picks the models by
+    cross-validation (see trainings.model_selection). With fallback_global
+    users with fewer than MIN_SHARD_POSTS posts train the global models.
+    """
+    scope = 'platform' if platforms else 'user'
+    active = job_manager.find_active('train', scope=scope, shard_user_id=user.id)
+    if active:
+        return active
+    
+    uploads = Upload.query.filter_by(user_id=user.id).order_by(Upload.created_at).all()
+    sources = [(upload.store_path, upload.file_path) for upload in uploads]
+    if not sources and filepath:
+        sources = [(None, filepath)]
+    
+    job = job_manager.create(user.id, 'train', {
+        'scope': scope,
+        'shard_user_id': user.id,
+        'model_type': model_type,
+        'budget_seconds': budget_seconds
+    })
+    job_manager.submit(
+        job, train_shard_job, user.id, sources, MODEL_FOLDER,
+        model_type=model_type, platforms=platforms, export=model_export(), budget_seconds=budget_seconds,
+        selection_workers=app.config['SELECTION_WORKERS'], fallback_global=fallback_global
+    )
+    return job
+
+def save_prediction(user_id, upload_id, summary, output_path=None):
+    """Persist a prediction summary"""
+    likes = summary['predictions']['likes']
+    prediction = Prediction(
+        user_id=user_id,
+        upload_id=upload_id,
+        average_likes=likes['average'],
+        max_likes=likes['max'],
+        min_likes=likes['min'],
+        best_posting_hour=summary['predictions']['best_posting_hour'],
+        platform_analysis=json.dumps(summary['platform_analysis']),
+        total_posts_analyzed=summary['total_posts_analyzed'],
+        output_path=output_path
+    )
+    db.session.add(prediction)
+    db.session.commit()
+    return prediction
+
+def start_prediction_job(user, upload):
+    """Queue scoring of an upload; the Prediction row is saved when it finishes"""
+    def on_success(job, summary):
+        output_path = summary.pop('_output_path', None)
+        prediction = save_prediction(job.user_id, upload_id, summary, output_path)
+        return dict(summary, prediction_id=prediction.id)
+    
+    upload_id = upload.id
+    job = job_manager.create(user.id, 'predict', {'upload_id': upload_id})
+    job_manager.submit(
+        job, predict_job,
+        upload_id, upload.store_path, upload.file_path, MODEL_FOLDER, FEATURE_CACHE_FOLDER, PREDICTION_FOLDER,
+        user_id=user.id, on_success=on_success
+    )
+    return job
+
+def score_posts(items):
+    """
+    Score (user_id, post dictionary) pairs with the served models
+    
+    A batch may hold posts of several users; each user's posts are scored
+    with their own model shards (falling back to the global models).
+    
+    Returns:
+        One {"predicted_likes", "predicted_follower_growth"} dict per post
+    """
+    from trainings.feature_engineering import engineer_post_features
+    
+    user_ids = np.array([user_id for user_id, _ in items], dtype=object)
+    df_processed = engineer_post_features(pd.DataFrame.from_records([post for _, post in items]))
+    X = feature_matrix(df_processed)
+    platforms = df_processed['platform'] if 'platform' in df_processed.columns else None
+    
+    predictions_likes = np.empty(len(items), dtype=np.float64)
+    predictions_growth = np.full(len(items), np.nan)
+    for user_id in dict.fromkeys(user_ids.tolist()):
+        rows = np.flatnonzero(user_ids == user_id)
+        likes, growth = UserModels(model_registry, user_id).predict(
+            X.iloc[rows], platforms.iloc[rows] if platforms is not None else None
+        )
+        predictions_likes[rows] = likes
+        if growth is not None:
+            predictions_growth[rows] = growth
+    
+    return [
+        {
+            "predicted_likes": float(predictions_likes[i]),
+            "predicted_follower_growth": float(predictions_growth[i]) if not np.isnan(predictions_growth[i]) else None
+        }
+        for i in range(len(items))
+    ]
+
+# Concurrent /api/score requests are coalesced into one vectorized predict call
+score_batcher = MicroBatcher(
+    score_posts,
+    max_batch_size=int(os.environ.get('SCORE_BATCH_SIZE', 64)),
+    max_wait_ms=float(os.environ.get('SCORE_BATCH_WAIT_MS', 2))
+)
+
+@lru_cache(maxsize=256)
+def _upload_profile(upload_id, store_path, file_path, total_posts):
+    columns = ['platform', 'content_type'] + list(PROFILE_COLUMNS)
+    if store_exists(store_path):
+        df_processed = load_frame(store_path, columns=columns)
+    else:
+        df_processed = preprocess_data(pd.read_csv(file_path))
+    return account_profile(df_processed)
+
+def upload_profile(upload):
+    """Account profile of an upload (cached per worker until posts are appended)"""
+    return _upload_profile(upload.id, upload.store_path, upload.file_path, upload.total_posts)
+
+def recommend_schedule(user, upload=None, top_n=DEFAULT_TOP_SLOTS, platforms=None, content_types=None):
+    """
+    Rank posting slots for a user's account (default: based on the latest upload)
+
+    Returns:
+        Optimizer result, or None when there is no upload or no trained model
+    """
+    if upload is None:
+        upload = Upload.query.filter_by(user_id=user.id).order_by(Upload.created_at.desc()).first()
+    models = UserModels(model_registry, user.id)
+    if upload is None or not models.available():
+        return None
+    
+    model_likes, model_growth = models.default()
+    result = optimize_schedule(
+        upload_profile(upload), model_likes, model_growth,
+        top_n=top_n, platforms=platforms, content_types=content_types, models=models
+    )
+    result['upload_id'] = upload.id
+    return result
+
+@app.errorhandler(413)
+def file_too_large(e):
+    """Return a JSON error when an upload exceeds MAX_CONTENT_LENGTH"""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({"error": f"File too large. Maximum upload size is {limit_mb}MB"}), 413
 
 # ==================== AUTHENTICATION ROUTES ====================
 
@@ -198,25 +500,23 @@ def upload_file():
         return jsonify({"error": "Invalid file type. Only CSV files are allowed"}), 400
     
     try:
-        # Save file
+        # Save file (streamed to disk in fixed-size blocks)
         filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        file.save(filepath, buffer_size=COPY_BUFFER_SIZE)
         
-        # Read and validate CSV
-        df = pd.read_csv(filepath)
-        
-        # Check required columns
+        # Check required columns from the header before parsing any rows
+        columns = read_csv_header(filepath)
         required_cols = ['likes']
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        missing_cols = [col for col in required_cols if col not in columns]
         if missing_cols:
             return jsonify({
                 "error": f"Missing required columns: {', '.join(missing_cols)}",
-                "available_columns": list(df.columns)
+                "available_columns": columns
             }), 400
         
-        # Preprocess data
-        df_processed = preprocess_data(df)
+        # Stream the CSV in chunks, then preprocess and persist it once
+        scan, store_path, df_processed = ingest_upload(filepath)
         
         # Save upload to database
         upload = Upload(
@@ -224,17 +524,25 @@ def upload_file():
             filename=filename,
             original_filename=file.filename,
             file_path=filepath,
-            total_posts=len(df),
-            columns=json.dumps(list(df.columns))
+            store_path=store_path,
+            total_posts=scan['total_posts'],
+            columns=json.dumps(scan['columns'])
         )
         db.session.add(upload)
         db.session.commit()
         
+        # Warm the feature cache (best effort; predict rebuilds on a miss)
+        try:
+            feature_matrix(df_processed, feature_cache, upload.id)
+        except Exception:
+            pass
+        
         # Get basic stats
         stats = {
-            "total_posts": len(df),
-            "columns": list(df.columns),
-            "preview": df.head(5).to_dict('records'),
+            "total_posts": scan['total_posts'],
+            "columns": scan['columns'],
+            "preview": scan['preview'],
+            "memory": scan['memory'],
             "upload_id": upload.id
         }
         
@@ -249,6 +557,60 @@ def upload_file():
         db.session.rollback()
         return jsonify({"error": f"Error processing file: {str(e)}"}), 500
 
+@app.route('/api/uploads/<int:upload_id>/append', methods=['POST'])
+@login_required
+def append_upload(upload_id):
+    """Append new posts (CSV with the same columns) to an existing upload"""
+    user = get_current_user()
+    
+    upload = Upload.query.filter_by(id=upload_id, user_id=user.id).first()
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    if not os.path.exists(upload.file_path):
+        return jsonify({"error": "Upload file no longer exists"}), 404
+    
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type. Only CSV files are allowed"}), 400
+    
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_append_{upload.id}.csv")
+    try:
+        file.save(filepath, buffer_size=COPY_BUFFER_SIZE)
+        
+        # Rows are appended to the upload's CSV as-is, so the header must match exactly
+        columns = read_csv_header(filepath)
+        expected = json.loads(upload.columns) if upload.columns else read_csv_header(upload.file_path)
+        if columns != expected:
+            return jsonify({
+                "error": "Columns must match the original upload",
+                "expected_columns": expected,
+                "available_columns": columns
+            }), 400
+        
+        appended, mode = append_to_upload(upload, filepath)
+        db.session.commit()
+        
+        return jsonify({
+            "message": f"Appended {appended} posts",
+            "appended_posts": appended,
+            "mode": mode,
+            "upload": upload.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error appending posts: {str(e)}"}), 500
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
 @app.route('/api/predict', methods=['POST'])
 @login_required
 def predict():
@@ -263,140 +625,85 @@ def predict():
         
         # Get upload record
         upload_id = data.get('upload_id')
+        async_mode = bool(data.get('async'))
+        if async_mode and not upload_id:
+            return jsonify({"error": "upload_id required for async predictions"}), 400
+        
         if upload_id:
             upload = Upload.query.filter_by(id=upload_id, user_id=user.id).first()
             if not upload:
                 return jsonify({"error": "Upload not found"}), 404
-            filepath = upload.file_path
+            
+            # Load the persisted preprocessed frame (no CSV parsing); async jobs load it themselves
+            df_processed = None if async_mode else load_upload_frame(upload)
         else:
             filename = data['filename']
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             if not os.path.exists(filepath):
                 return jsonify({"error": "File not found"}), 404
+            
+            # Load data
+            df = pd.read_csv(filepath)
+            df_processed = preprocess_data(df)
         
-        # Load data
-        df = pd.read_csv(filepath)
-        df_processed = preprocess_data(df)
-        
-        # Load or train models (for both likes and follower growth)
-        model_path_likes = os.path.join(MODEL_FOLDER, 'likes_predictor.pkl')
-        model_path_growth = os.path.join(MODEL_FOLDER, 'follower_growth_predictor.pkl')
-        
-        # Train models if needed
-        ml_path = os.path.join(BASE_DIR, '..', 'ml')
-        if ml_path not in sys.path:
-            sys.path.insert(0, ml_path)
-        from trainings.train_model import train_models, prepare_features
-        
-        # Check if models exist, otherwise train
-        if not os.path.exists(model_path_likes):
-            models_dict, _ = train_models(df_processed, model_type='random_forest')
-            if 'likes_random_forest' in models_dict:
-                joblib.dump(models_dict['likes_random_forest'], model_path_likes)
-            if 'follower_growth_random_forest' in models_dict:
-                joblib.dump(models_dict['follower_growth_random_forest'], model_path_growth)
-        
-        # Load models
-        try:
-            model_likes = joblib.load(model_path_likes)
-        except:
-            models_dict, _ = train_models(df_processed, model_type='random_forest')
-            model_likes = models_dict.get('likes_random_forest')
-            if model_likes:
-                joblib.dump(model_likes, model_path_likes)
-        
-        model_growth = None
-        if os.path.exists(model_path_growth):
-            try:
-                model_growth = joblib.load(model_path_growth)
-            except:
-                pass
-        
-        # Prepare features for prediction
-        available_features = prepare_features(df_processed)
-        
-        if len(available_features) == 0:
-            return jsonify({"error": "No valid features found in data"}), 400
+        # The user's model shards, else the global models (loaded lazily, cached per worker)
+        models = UserModels(model_registry, user.id)
         
-        X = df_processed[available_features].fillna(0)
-        X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
-        X = X.replace([np.inf, -np.inf], 0)
+        # No model yet: train the user's shard in the background (within the training
+        # budget, so a first model is served soon) instead of blocking this request;
+        # users with too few posts for a shard train the global models
+        if not models.available():
+            if not app.config['TRAIN_ON_REQUEST']:
+                return jsonify({"error": "No trained model available yet; run the offline trainer"}), 409
+            job = start_shard_job(
+                user, filepath=None if upload_id else filepath,
+                budget_seconds=app.config['TRAIN_BUDGET_SECONDS'] or None, fallback_global=True
+            )
+            return jsonify({
+                "message": "No trained model available yet; training has been queued",
+                "job_id": job.id,
+                "job_kind": job.kind,
+                "status": job.status
+            }), 202
         
-        # Make predictions for LIKES
+        # Async mode: score in the job pool and stream progress via /api/jobs/<id>/events
+        if async_mode:
+            job = start_prediction_job(user, upload)
+            return jsonify({
+                "message": "Prediction queued",
+                "job_id": job.id,
+                "job_kind": job.kind,
+                "status": job.status
+            }), 202
+        
+        # Prepare features for prediction (cached per upload)
+        X = feature_matrix(df_processed, feature_cache, upload.id if upload_id else None)
+        
+        if X.shape[1] == 0:
+            return jsonify({"error": "No valid features found in data"}), 400
+        
+        # Make predictions for LIKES and FOLLOWER GROWTH (if model available)
         try:
-            predictions_likes = model_likes.predict(X)
+            platforms = df_processed['platform'] if 'platform' in df_processed.columns else None
+            predictions_likes, predictions_growth = models.predict(X, platforms)
         except Exception as e:
             return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
         
-        # Make predictions for FOLLOWER GROWTH (if model available)
-        predictions_growth = None
-        if model_growth:
-            try:
-                predictions_growth = model_growth.predict(X)
-            except:
-                pass
-        
-        # Calculate statistics for LIKES
-        avg_predicted_likes = float(np.mean(predictions_likes))
-        max_predicted_likes = float(np.max(predictions_likes))
-        min_predicted_likes = float(np.min(predictions_likes))
-        
-        # Calculate statistics for FOLLOWER GROWTH
-        avg_predicted_growth = float(np.mean(predictions_growth)) if predictions_growth is not None else None
-        max_predicted_growth = float(np.max(predictions_growth)) if predictions_growth is not None else None
-        min_predicted_growth = float(np.min(predictions_growth)) if predictions_growth is not None else None
-        
-        # Get best posting time
-        hour_col = 'posting_hour' if 'posting_hour' in df_processed.columns else ('hour' if 'hour' in df_processed.columns else None)
-        if hour_col:
-            df_processed['predicted_likes'] = predictions_likes
-            best_hour = int(df_processed.groupby(hour_col)['predicted_likes'].mean().idxmax())
-        else:
-            best_hour = None
-        
-        # Platform analysis
-        platform_analysis = {}
-        if 'platform' in df_processed.columns:
-            for platform in df_processed['platform'].unique():
-                platform_data = df_processed[df_processed['platform'] == platform]
-                platform_analysis[platform] = {
-                    "avg_predicted_likes": float(np.mean(predictions_likes[df_processed['platform'] == platform])),
-                    "post_count": int(len(platform_data))
-                }
+        # Calculate statistics, best posting time and platform analysis
+        summary = summarize_predictions(df_processed, predictions_likes, predictions_growth)
         
         # Save prediction to database
-        prediction = Prediction(
-            user_id=user.id,
-            upload_id=upload_id if upload_id else None,
-            average_likes=avg_predicted_likes,
-            max_likes=max_predicted_likes,
-            min_likes=min_predicted_likes,
-            best_posting_hour=best_hour,
-            platform_analysis=json.dumps(platform_analysis),
-            total_posts_analyzed=len(df)
+        prediction = save_prediction(user.id, upload_id if upload_id else None, summary)
+        
+        # Keep per-post predictions for the streaming export endpoint
+        prediction.output_path = write_prediction_rows(
+            df_processed, predictions_likes, predictions_growth,
+            os.path.join(PREDICTION_FOLDER, f"{prediction.id}.store")
         )
-        db.session.add(prediction)
         db.session.commit()
         
         # Prepare response with both likes and follower growth
-        response_data = {
-            "predictions": {
-                "likes": {
-                    "average": avg_predicted_likes,
-                    "max": max_predicted_likes,
-                    "min": min_predicted_likes
-                },
-                "follower_growth": {
-                    "average": avg_predicted_growth,
-                    "max": max_predicted_growth,
-                    "min": min_predicted_growth
-                } if avg_predicted_growth is not None else None,
-                "best_posting_hour": best_hour
-            },
-            "platform_analysis": platform_analysis,
-            "total_posts_analyzed": len(df),
-            "prediction_id": prediction.id
-        }
+        response_data = dict(summary, prediction_id=prediction.id)
         
         return jsonify(response_data), 200
         
@@ -404,6 +711,194 @@ def predict():
         db.session.rollback()
         return jsonify({"error": f"Prediction error: {str(e)}"}), 500
 
+@app.route('/api/score', methods=['POST'])
+@login_required
+def score():
+    """Score one or more draft posts without uploading a CSV"""
+    user = get_current_user()
+    
+    try:
+        data = request.json or {}
+        
+        if 'posts' in data:
+            posts = data['posts']
+        elif 'post' in data:
+            posts = [data['post']]
+        else:
+            return jsonify({"error": "post or posts required"}), 400
+        
+        if not isinstance(posts, list) or not all(isinstance(post, dict) for post in posts):
+            return jsonify({"error": "posts must be a list of objects"}), 400
+        if len(posts) == 0:
+            return jsonify({"predictions": []}), 200
+        if len(posts) > MAX_SCORE_POSTS:
+            return jsonify({"error": f"At most {MAX_SCORE_POSTS} posts can be scored per request"}), 400
+        
+        try:
+            predictions = score_batcher.score([(user.id, post) for post in posts])
+        except LookupError as e:
+            return jsonify({"error": f"{str(e)}. Upload data to train a model first"}), 503
+        
+        return jsonify({"predictions": predictions}), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Scoring error: {str(e)}"}), 500
+
+# ==================== JOB ROUTES ====================
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """Submit a background job"""
+    user = get_current_user()
+    
+    try:
+        data = request.json or {}
+        kind = data.get('kind', 'train')
+        
+        if kind not in ('train', 'predict'):
+            return jsonify({"error": f"Unsupported job kind: {kind}"}), 400
+        
+        model_type = data.get('model_type', 'random_forest')
+        if model_type not in ('linear', 'random_forest', 'both', 'hist_gradient_boosting', 'joint', 'auto'):
+            return jsonify({"error": f"Unsupported model type: {model_type}"}), 400
+        
+        incremental = bool(data.get('incremental', False))
+        if incremental and model_type not in INCREMENTAL_MODEL_TYPES:
+            return jsonify({"error": f"Incremental training supports {', '.join(INCREMENTAL_MODEL_TYPES)}"}), 400
+        
+        budget_seconds = data.get('budget_seconds')
+        if budget_seconds is not None:
+            if isinstance(budget_seconds, bool) or not isinstance(budget_seconds, (int, float)) or budget_seconds <= 0:
+                return jsonify({"error": "budget_seconds must be a positive number"}), 400
+            if model_type not in BUDGETED_MODEL_TYPES or incremental:
+                return jsonify({"error": f"Budgeted training supports {', '.join(BUDGETED_MODEL_TYPES)} (not incremental)"}), 400
+        
+        scope = data.get('scope', 'global')
+        if scope not in SHARD_SCOPES:
+            return jsonify({"error": f"Unsupported scope: {scope}"}), 400
+        if scope != 'global' and incremental:
+            return jsonify({"error": "Incremental training is only supported for the global models"}), 400
+        
+        if kind == 'train' and scope != 'global':
+            if not Upload.query.filter_by(user_id=user.id).first():
+                return jsonify({"error": "No uploads to train on"}), 404
+            total_posts = db.session.query(db.func.sum(Upload.total_posts)).filter_by(user_id=user.id).scalar() or 0
+            if total_posts < MIN_SHARD_POSTS:
+                return jsonify({"error": f"At least {MIN_SHARD_POSTS} posts are needed to train a user model"}), 400
+            job = start_shard_job(user, model_type, platforms=scope == 'platform', budget_seconds=budget_seconds)
+            return jsonify({"job": job_manager.describe(job)}), 202
+        
+        upload = Upload.query.filter_by(id=data.get('upload_id'), user_id=user.id).first()
+        if not upload:
+            return jsonify({"error": "Upload not found"}), 404
+        
+        if kind == 'predict':
+            if not UserModels(model_registry, user.id).available():
+                return jsonify({"error": "No trained model available yet; submit a train job first"}), 409
+            job = start_prediction_job(user, upload)
+        else:
+            job = job_manager.create(user.id, kind, {
+                'upload_id': upload.id, 'model_type': model_type, 'incremental': incremental,
+                'budget_seconds': budget_seconds
+            })
+            job_manager.submit(
+                job, train_models_job, upload.store_path, upload.file_path, MODEL_FOLDER,
+                model_type=model_type, incremental=incremental, export=model_export(), budget_seconds=budget_seconds,
+                selection_workers=app.config['SELECTION_WORKERS']
+            )
+        
+        return jsonify({"job": job_manager.describe(job)}), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error submitting job: {str(e)}"}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def list_jobs():
+    """Get all user jobs"""
+    user = get_current_user()
+    
+    try:
+        jobs = Job.query.filter_by(user_id=user.id).order_by(Job.created_at.desc()).all()
+        return jsonify({"jobs": [job_manager.describe(job) for job in jobs]}), 200
+    except Exception as e:
+        return jsonify({"error": f"Error fetching jobs: {str(e)}"}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Get job status and progress"""
+    user = get_current_user()
+    
+    try:
+        job = Job.query.filter_by(id=job_id, user_id=user.id).first()
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify({"job": job_manager.describe(job)}), 200
+    except Exception as e:
+        return jsonify({"error": f"Error fetching job: {str(e)}"}), 500
+
+@app.route('/api/jobs/<int:job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream job progress as Server-Sent Events"""
+    # EventSource cannot send headers, so the token may be passed as ?token=
+    user = get_current_user(allow_query_token=True)
+    if not user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    job = Job.query.filter_by(id=job_id, user_id=user.id).first()
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def stream():
+        last_payload = None
+        last_sent = time.monotonic()
+        while True:
+            job = db.session.get(Job, job_id)
+            state = job_manager.describe(job)
+            finished = job.status in FINISHED_STATUSES
+            # End the read transaction so job writers are never blocked
+            db.session.remove()
+            
+            payload = json.dumps(state)
+            if finished:
+                yield f"event: done\ndata: {payload}\n\n"
+                return
+            if payload != last_payload:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(0.5)
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    user = get_current_user()
+    
+    try:
+        job = Job.query.filter_by(id=job_id, user_id=user.id).first()
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        job_manager.cancel(job)
+        return jsonify({"job": job_manager.describe(job)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error cancelling job: {str(e)}"}), 500
+
 # ==================== DASHBOARD ROUTES ====================
 
 @app.route('/api/dashboard', methods=['GET'])
@@ -421,9 +916,17 @@ def get_dashboard():
         total_predictions = len(predictions)
         avg_likes = np.mean([p.average_likes for p in predictions]) if predictions else 0
         
-        # Get best posting time from most recent prediction
+        # Rank every posting slot of the account; fall back to the most recent prediction
+        try:
+            schedule = recommend_schedule(user, top_n=5)
+        except Exception as e:
+            app.logger.warning("Schedule optimization failed: %s", e)
+            schedule = None
+        
         best_time = None
-        if predictions:
+        if schedule and schedule['best_slot']:
+            best_time = schedule['best_slot']['hour']
+        elif predictions:
             best_time = predictions[0].best_posting_hour
         
         # Platform breakdown
@@ -443,12 +946,42 @@ def get_dashboard():
             },
             "recent_predictions": [p.to_dict() for p in predictions[:5]],
             "recent_uploads": [u.to_dict() for u in uploads[:5]],
-            "platform_breakdown": platform_counts
+            "platform_breakdown": platform_counts,
+            "schedule": schedule
         }), 200
         
     except Exception as e:
         return jsonify({"error": f"Error fetching dashboard: {str(e)}"}), 500
 
+@app.route('/api/schedule', methods=['GET'])
+@login_required
+def get_schedule():
+    """Recommend posting slots ranked by predicted likes"""
+    user = get_current_user()
+    
+    try:
+        upload = None
+        upload_id = request.args.get('upload_id', type=int)
+        if upload_id:
+            upload = Upload.query.filter_by(id=upload_id, user_id=user.id).first()
+            if not upload:
+                return jsonify({"error": "Upload not found"}), 404
+        
+        top_n = request.args.get('top', DEFAULT_TOP_SLOTS, type=int)
+        if top_n is not None and top_n <= 0:
+            top_n = None
+        platforms = request.args.getlist('platform') or None
+        content_types = request.args.getlist('content_type') or None
+        
+        result = recommend_schedule(user, upload, top_n, platforms, content_types)
+        if result is None:
+            return jsonify({"error": "Upload data and train a model to get a posting schedule"}), 404
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Error optimizing schedule: {str(e)}"}), 500
+
 @app.route('/api/predictions', methods=['GET'])
 @login_required
 def get_predictions():
@@ -478,6 +1011,66 @@ def get_prediction(prediction_id):
     except Exception as e:
         return jsonify({"error": f"Error fetching prediction: {str(e)}"}), 500
 
+@app.route('/api/predictions/<int:prediction_id>/export', methods=['GET'])
+def export_prediction(prediction_id):
+    """
+    Stream per-post predictions as CSV or NDJSON
+    
+    Query parameters:
+        format: 'csv' (default) or 'ndjson'
+        offset: First row to send, to resume an interrupted download
+        limit: Maximum number of rows to send
+        chunk_rows: Rows serialized per chunk
+    """
+    # Allow ?token= so the export can be a plain download link
+    user = get_current_user(allow_query_token=True)
+    if not user:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    prediction = Prediction.query.filter_by(id=prediction_id, user_id=user.id).first()
+    if not prediction:
+        return jsonify({"error": "Prediction not found"}), 404
+    if not store_exists(prediction.output_path):
+        return jsonify({"error": "Per-post predictions are not available for this prediction"}), 404
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "Format must be csv or ndjson"}), 400
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        chunk_rows = min(max(int(request.args.get('chunk_rows', EXPORT_CHUNK_ROWS)), 1), EXPORT_CHUNK_ROWS * 10)
+        total_rows = store_rows(prediction.output_path)
+        stop = total_rows if limit is None else min(total_rows, offset + max(int(limit), 0))
+    except ValueError:
+        return jsonify({"error": "offset, limit and chunk_rows must be integers"}), 400
+    
+    output_path = prediction.output_path
+    
+    def generate():
+        first = True
+        for chunk in iter_frame(output_path, chunk_rows, start=offset, stop=stop):
+            chunk.index.name = 'row'
+            if export_format == 'csv':
+                # Header only on a fresh download so resumed parts can be appended
+                yield chunk.to_csv(header=first and offset == 0, date_format='%Y-%m-%d %H:%M:%S')
+            else:
+                yield chunk.reset_index().to_json(orient='records', lines=True, date_format='iso')
+            first = False
+    
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={
+            "Content-Disposition": f"attachment;filename=prediction_{prediction_id}.{extension}",
+            "X-Total-Rows": str(total_rows),
+            "X-Row-Offset": str(offset),
+            "X-Row-Count": str(max(stop - offset, 0))
+        }
+    )
+
 # ==================== PUBLIC ROUTES ====================
 
 @app.route('/')
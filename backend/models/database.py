@@ -51,6 +51,7 @@ class Upload(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     total_posts = db.Column(db.Integer, nullable=False)
     columns = db.Column(db.Text)  # JSON string of columns
+    store_path = db.Column(db.String(500), nullable=True)  # Columnar store of the preprocessed frame
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -86,6 +87,7 @@ class Prediction(db.Model):
     
     # Metadata
     total_posts_analyzed = db.Column(db.Integer, nullable=False)
+    output_path = db.Column(db.String(500), nullable=True)  # Columnar store of per-post predictions
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -101,14 +103,57 @@ class Prediction(db.Model):
             },
             'platform_analysis': json.loads(self.platform_analysis) if self.platform_analysis else {},
             'total_posts_analyzed': self.total_posts_analyzed,
+            'export_available': bool(self.output_path),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class Job(db.Model):
+    """Job model for background work (training, scoring)"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text)  # JSON string
+    result = db.Column(db.Text)  # JSON string
+    error = db.Column(db.Text, nullable=True)
+    worker_pid = db.Column(db.Integer, nullable=True)  # Web worker that owns the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+def upgrade_schema():
+    """Add nullable columns introduced after a table was first created"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+
 def init_db(app):
     """Initialize database"""
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         # Create admin user if doesn't exist
         admin = User.query.filter_by(email='admin@postpredict.com').first()
         if not admin:
@@ -0,0 +1,113 @@
+"""
+Grouped analytics over per-post predictions
+All breakdowns are computed with a single bincount over stacked group codes,
+so the cost is linear in the number of rows regardless of how many platforms,
+content types or time slots an export contains.
+"""
+import numpy as np
+import pandas as pd
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def _first_column(df, candidates):
+    for col in candidates:
+        if col in df.columns:
+            return col
+    return None
+
+def _factorize(values):
+    """Sorted group codes (-1 for missing) and their labels"""
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), list(uniques)
+
+def _day_label(value):
+    day = int(value)
+    return DAY_NAMES[day] if 0 <= day < len(DAY_NAMES) else str(day)
+
+def _group_stats(count, sum_likes, sum_growth):
+    stats = {
+        "avg_predicted_likes": float(sum_likes / count),
+        "post_count": int(count)
+    }
+    if sum_growth is not None:
+        stats["avg_predicted_follower_growth"] = float(sum_growth / count)
+    return stats
+
+def compute_breakdowns(df_processed, predictions_likes, predictions_growth=None):
+    """
+    Aggregate predictions by platform, content type, weekday, hour and hour x weekday
+
+    Returns:
+        (breakdowns dict, best posting hour or None)
+    """
+    dimensions = []
+
+    platform_col = _first_column(df_processed, ['platform'])
+    if platform_col:
+        codes, labels = _factorize(df_processed[platform_col])
+        dimensions.append(('platform', codes, [str(v) for v in labels]))
+
+    content_col = _first_column(df_processed, ['content_type'])
+    if content_col:
+        codes, labels = _factorize(df_processed[content_col])
+        dimensions.append(('content_type', codes, [str(v) for v in labels]))
+
+    day_col = _first_column(df_processed, ['posting_day', 'day_of_week'])
+    day_codes = day_labels = None
+    if day_col:
+        day_codes, day_labels = _factorize(df_processed[day_col])
+        dimensions.append(('day_of_week', day_codes, [_day_label(v) for v in day_labels]))
+
+    hour_col = _first_column(df_processed, ['posting_hour', 'hour'])
+    hour_codes = hour_labels = None
+    if hour_col:
+        hour_codes, hour_labels = _factorize(df_processed[hour_col])
+        dimensions.append(('hour', hour_codes, [int(v) for v in hour_labels]))
+
+    if day_col and hour_col:
+        valid = (day_codes >= 0) & (hour_codes >= 0)
+        combined = np.where(valid, day_codes * len(hour_labels) + hour_codes, -1)
+        labels = [(_day_label(d), int(h)) for d in day_labels for h in hour_labels]
+        dimensions.append(('hour_by_day', combined, labels))
+
+    if not dimensions:
+        return {}, None
+
+    # Stack every dimension into one code space; missing values go to a spill bucket
+    offsets = np.cumsum([0] + [len(labels) for _, _, labels in dimensions])
+    spill = offsets[-1]
+    stacked = np.concatenate([
+        np.where(codes >= 0, codes + offset, spill)
+        for (_, codes, _), offset in zip(dimensions, offsets[:-1])
+    ])
+    repeats = len(dimensions)
+    counts = np.bincount(stacked, minlength=spill + 1)
+    sums_likes = np.bincount(stacked, weights=np.tile(np.asarray(predictions_likes, dtype=np.float64), repeats), minlength=spill + 1)
+    sums_growth = None
+    if predictions_growth is not None:
+        sums_growth = np.bincount(stacked, weights=np.tile(np.asarray(predictions_growth, dtype=np.float64), repeats), minlength=spill + 1)
+
+    breakdowns = {}
+    best_hour = None
+    for (name, _, labels), offset in zip(dimensions, offsets[:-1]):
+        group = {}
+        for i, label in enumerate(labels):
+            slot = offset + i
+            if counts[slot] == 0:
+                continue
+            stats = _group_stats(counts[slot], sums_likes[slot], sums_growth[slot] if sums_growth is not None else None)
+            if name == 'hour_by_day':
+                day, hour = label
+                group.setdefault(day, {})[str(hour)] = stats
+            else:
+                group[str(label)] = stats
+        breakdowns[name] = group
+
+        if name == 'hour':
+            means = np.where(counts[offset:offset + len(labels)] > 0,
+                             sums_likes[offset:offset + len(labels)] / np.maximum(counts[offset:offset + len(labels)], 1),
+                             -np.inf)
+            if len(labels) and np.isfinite(means).any():
+                best_hour = int(labels[int(np.argmax(means))])
+
+    return breakdowns, best_hour
@@ -31,9 +31,11 @@ def verify_token(token):
     except jwt.InvalidTokenError:
         return None
 
-def get_current_user():
+def get_current_user(allow_query_token=False):
     """Get current user from token"""
     token = request.headers.get('Authorization')
+    if not token and allow_query_token:
+        token = request.args.get('token')
     if not token:
         return None
     
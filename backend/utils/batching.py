@@ -0,0 +1,94 @@
+"""
+Micro-batching of concurrent scoring requests
+Requests that arrive within a short window are scored with one vectorized
+call, so the fixed per-call cost of predict (input validation, thread
+dispatch over the trees) is paid once per batch instead of once per request.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2
+
+class MicroBatcher:
+    """
+    Coalesce concurrent calls into batched calls of a scoring function
+
+    Args:
+        score_fn: Callable taking a list of items and returning one result
+            per item, in order
+        max_batch_size: Maximum number of items scored in one call
+        max_wait_ms: How long the first request of a batch waits for others
+    """
+
+    def __init__(self, score_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+    def submit(self, items):
+        """Queue a list of items; the returned Future resolves to their results"""
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._queue.put((list(items), future))
+        return future
+
+    def score(self, items, timeout=None):
+        """Score a list of items, blocking until their batch has run"""
+        return self.submit(items).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        # The window opens with the first request and is not extended by later arrivals
+        deadline = time.monotonic() + self.max_wait
+        size = len(batch[0][0])
+        while size < self.max_batch_size:
+            try:
+                request = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            requests = [(items, future) for items, future in batch if future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+
+            flat = [item for items, _ in requests for item in items]
+            try:
+                results = list(self.score_fn(flat))
+            except Exception:
+                # Re-run the requests one by one so a bad item only fails its own request
+                for items, future in requests:
+                    self._score_single(items, future)
+                continue
+
+            offset = 0
+            for items, future in requests:
+                future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+
+    def _score_single(self, items, future):
+        try:
+            future.set_result(list(self.score_fn(items)))
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,359 @@
+"""
+Columnar on-disk store for parsed DataFrames
+Each column is kept in its own raw binary file so it can be memory-mapped back
+without any parsing. String columns are dictionary-encoded (int32 codes plus
+a categories file).
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = 'manifest.json'
+STORE_FORMAT_VERSION = 1
+
+KIND_NUMERIC = 'numeric'
+KIND_DATETIME = 'datetime'
+KIND_CATEGORY = 'category'
+
+CODE_DTYPE = np.dtype('int32')
+DATETIME_DTYPE = np.dtype('int64')
+NAT_VALUE = np.iinfo(np.int64).min
+
+def _column_kind(series):
+    """Classify a Series into one of the supported storage kinds"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return KIND_DATETIME
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return KIND_NUMERIC
+    return KIND_CATEGORY
+
+def _numeric_values(series):
+    """Return a plain numpy array for a numeric Series (nullable dtypes become float)"""
+    if pd.api.types.is_extension_array_dtype(series.dtype):
+        return series.to_numpy(dtype='float64', na_value=np.nan)
+    return series.to_numpy()
+
+def _datetime_values(series):
+    """Return datetime values as int64 nanoseconds (NaT as int64 min)"""
+    if getattr(series.dt, 'tz', None) is not None:
+        series = series.dt.tz_convert(None)
+    return series.astype('datetime64[ns]').to_numpy().view(DATETIME_DTYPE)
+
+class FrameStoreWriter:
+    """
+    Append DataFrame chunks to a columnar store
+
+    Chunks may arrive with slightly different dtypes (e.g. a column that is
+    integer in one chunk and float in the next); numeric columns are promoted
+    (rewritten to a new data file) and mismatched kinds are coerced to the kind
+    seen first.
+
+    Args:
+        path: Store directory
+        append: Reopen an existing store and append rows to it instead of
+            replacing it. Readers keep seeing the previous rows until close()
+            publishes the new manifest; on error the store is rolled back.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.rows = 0
+        self.columns = {}
+        self._initial = None
+        if append:
+            self._reopen()
+            return
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._initial is not None:
+            self._rollback()
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def _reopen(self):
+        """Load the column layout of an existing store for appending"""
+        manifest = read_manifest(self.path)
+        self.rows = manifest['rows']
+        for entry in manifest['columns']:
+            meta = {'index': entry['index'], 'kind': entry['kind'], 'dtype': entry['dtype'],
+                    'file': entry.get('file', f"{entry['index']}.bin")}
+            if entry['kind'] == KIND_CATEGORY:
+                with open(os.path.join(self.path, entry['categories_file'])) as fh:
+                    meta['categories'] = json.load(fh)
+                meta['lookup'] = {value: code for code, value in enumerate(meta['categories'])}
+            self.columns[entry['name']] = meta
+            # Drop bytes left behind by an interrupted append
+            self._truncate(meta, np.dtype(meta['dtype']), self.rows)
+        self._initial = {name: (meta['dtype'], meta['file']) for name, meta in self.columns.items()}
+        self._initial_rows = self.rows
+
+    def _truncate(self, meta, dtype, rows):
+        data_file = self._data_file(meta)
+        size = rows * dtype.itemsize
+        if os.path.getsize(data_file) > size:
+            with open(data_file, 'r+b') as fh:
+                fh.truncate(size)
+
+    def _rollback(self):
+        """Restore an appended store to the rows and dtypes of its manifest"""
+        for name, meta in list(self.columns.items()):
+            if name not in self._initial:
+                os.remove(self._data_file(meta))
+                continue
+            # Promoted columns were written to new files; the published ones are untouched
+            dtype, data_file = self._initial[name]
+            if meta['file'] != data_file:
+                os.remove(self._data_file(meta))
+                meta['dtype'], meta['file'] = dtype, data_file
+            self._truncate(meta, np.dtype(dtype), self._initial_rows)
+
+    def _data_file(self, meta):
+        return os.path.join(self.path, meta['file'])
+
+    def _next_file(self, meta):
+        """Unused data file name for a column whose values are rewritten"""
+        parts = meta['file'].split('.')
+        generation = int(parts[1]) + 1 if len(parts) == 3 else 1
+        return f"{meta['index']}.{generation}.bin"
+
+    def _add_column(self, name, kind, dtype):
+        """Register a new column, back-filling rows written before it appeared"""
+        index = len(self.columns)
+        meta = {'index': index, 'kind': kind, 'dtype': np.dtype(dtype).str, 'file': f"{index}.bin"}
+        if kind == KIND_CATEGORY:
+            meta['lookup'] = {}
+            meta['categories'] = []
+        self.columns[name] = meta
+        open(self._data_file(meta), 'wb').close()
+        if self.rows:
+            missing = self._missing(meta, self.rows)
+            with open(self._data_file(meta), 'ab') as fh:
+                missing.tofile(fh)
+        return meta
+
+    def _missing(self, meta, length):
+        """Array of missing values for a column"""
+        dtype = np.dtype(meta['dtype'])
+        if meta['kind'] == KIND_CATEGORY:
+            return np.full(length, -1, dtype=CODE_DTYPE)
+        if meta['kind'] == KIND_DATETIME:
+            return np.full(length, NAT_VALUE, dtype=DATETIME_DTYPE)
+        if dtype.kind == 'f':
+            return np.full(length, np.nan, dtype=dtype)
+        # Integer/bool columns cannot hold NaN; promote before back-filling
+        self._promote(meta, np.dtype('float64'))
+        return np.full(length, np.nan, dtype=np.dtype(meta['dtype']))
+
+    def _promote(self, meta, dtype):
+        """
+        Widen a numeric column's stored dtype, rewriting existing rows
+
+        The widened values go to a new data file: readers may still map the
+        current one through the published manifest, so it is only removed by
+        close() once a manifest pointing at the new file is in place.
+        """
+        current = np.dtype(meta['dtype'])
+        target = np.promote_types(current, dtype)
+        if target == current:
+            return
+        existing = np.fromfile(self._data_file(meta), dtype=current).astype(target)
+        meta['file'] = self._next_file(meta)
+        existing.tofile(self._data_file(meta))
+        meta['dtype'] = target.str
+
+    def _encode(self, meta, series):
+        """Convert a chunk column to the stored representation of its column"""
+        kind = meta['kind']
+        if kind == KIND_NUMERIC:
+            if _column_kind(series) != KIND_NUMERIC:
+                series = pd.to_numeric(series, errors='coerce')
+            values = _numeric_values(series)
+            if values.dtype != np.dtype(meta['dtype']):
+                self._promote(meta, values.dtype)
+                values = values.astype(np.dtype(meta['dtype']))
+            return values
+        if kind == KIND_DATETIME:
+            if _column_kind(series) != KIND_DATETIME:
+                series = pd.to_datetime(series, errors='coerce')
+            return _datetime_values(series)
+
+        # Dictionary-encode strings against the store-wide vocabulary
+        if _column_kind(series) != KIND_CATEGORY:
+            series = series.astype(str).where(series.notna())
+        codes, uniques = pd.factorize(series)
+        lookup = meta['lookup']
+        mapping = np.empty(len(uniques) + 1, dtype=CODE_DTYPE)
+        mapping[-1] = -1
+        for i, value in enumerate(uniques):
+            value = str(value)
+            code = lookup.get(value)
+            if code is None:
+                code = len(meta['categories'])
+                lookup[value] = code
+                meta['categories'].append(value)
+            mapping[i] = code
+        return mapping[codes]
+
+    def append(self, df):
+        """Append a DataFrame chunk to the store"""
+        length = len(df)
+        for name in df.columns:
+            series = df[name]
+            meta = self.columns.get(name)
+            if meta is None:
+                kind = _column_kind(series)
+                if kind == KIND_NUMERIC:
+                    dtype = _numeric_values(series.iloc[:0]).dtype
+                elif kind == KIND_DATETIME:
+                    dtype = DATETIME_DTYPE
+                else:
+                    dtype = CODE_DTYPE
+                meta = self._add_column(name, kind, dtype)
+            values = self._encode(meta, series)
+            with open(self._data_file(meta), 'ab') as fh:
+                np.ascontiguousarray(values).tofile(fh)
+
+        # Columns absent from this chunk are padded with missing values
+        for name, meta in self.columns.items():
+            if name not in df.columns:
+                missing = self._missing(meta, length)
+                with open(self._data_file(meta), 'ab') as fh:
+                    missing.tofile(fh)
+
+        self.rows += length
+
+    def close(self):
+        """Write the manifest; the store is only readable once this is done"""
+        manifest = {'version': STORE_FORMAT_VERSION, 'rows': self.rows, 'columns': []}
+        for name, meta in self.columns.items():
+            entry = {
+                'name': name, 'index': meta['index'], 'kind': meta['kind'], 'dtype': meta['dtype'],
+                'file': meta['file']
+            }
+            if meta['kind'] == KIND_CATEGORY:
+                categories_file = f"{meta['index']}.categories.json"
+                tmp_path = os.path.join(self.path, categories_file + '.tmp')
+                with open(tmp_path, 'w') as fh:
+                    json.dump(meta['categories'], fh)
+                os.replace(tmp_path, os.path.join(self.path, categories_file))
+                entry['categories_file'] = categories_file
+            manifest['columns'].append(entry)
+
+        tmp_path = os.path.join(self.path, MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_NAME))
+
+        # Data files replaced by promotions are no longer referenced
+        published = {meta['file'] for meta in self.columns.values()}
+        for name in os.listdir(self.path):
+            if name.endswith('.bin') and name not in published:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+def write_frame(df, path):
+    """Write a whole DataFrame to a new store"""
+    with FrameStoreWriter(path) as writer:
+        writer.append(df)
+    return path
+
+def store_exists(path):
+    """Check whether a complete store exists at path"""
+    return bool(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+def read_manifest(path):
+    """Load the manifest of a store"""
+    with open(os.path.join(path, MANIFEST_NAME)) as fh:
+        return json.load(fh)
+
+def _map_column(path, entry, rows):
+    """Memory-map the raw values of one column"""
+    data_file = os.path.join(path, entry.get('file', f"{entry['index']}.bin"))
+    dtype = np.dtype(entry['dtype'])
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(data_file, dtype=dtype, mode='r', shape=(rows,))
+
+def load_frame(path, columns=None, as_categorical=True):
+    """
+    Load a store as a DataFrame
+
+    Args:
+        path: Store directory
+        columns: Optional list of columns to load (default: all)
+        as_categorical: Return string columns as pandas Categoricals; when
+            False they are decoded to plain object strings like read_csv
+
+    Returns:
+        DataFrame backed by memory-mapped column files where possible
+    """
+    manifest = read_manifest(path)
+    rows = manifest['rows']
+    data = {}
+    for entry in manifest['columns']:
+        name = entry['name']
+        if columns is not None and name not in columns:
+            continue
+        values = _map_column(path, entry, rows)
+        if entry['kind'] == KIND_DATETIME:
+            data[name] = pd.Series(values.view('datetime64[ns]'), copy=False)
+        elif entry['kind'] == KIND_CATEGORY:
+            with open(os.path.join(path, entry['categories_file'])) as fh:
+                categories = json.load(fh)
+            categorical = pd.Categorical.from_codes(np.asarray(values), categories=categories)
+            data[name] = pd.Series(categorical if as_categorical else np.asarray(categorical, dtype=object))
+        else:
+            data[name] = pd.Series(values, copy=False)
+    return pd.DataFrame(data)
+
+def store_rows(path):
+    """Number of rows in a store"""
+    return read_manifest(path)['rows']
+
+def iter_frame(path, chunk_rows, start=0, stop=None, columns=None):
+    """
+    Yield a store as DataFrames of at most chunk_rows rows
+
+    Only the requested row range is touched, so a reader can resume from any
+    row offset without scanning what came before.
+    """
+    manifest = read_manifest(path)
+    rows = manifest['rows']
+    stop = rows if stop is None else min(stop, rows)
+    entries = [e for e in manifest['columns'] if columns is None or e['name'] in columns]
+
+    mapped = {}
+    for entry in entries:
+        values = _map_column(path, entry, rows)
+        categories = None
+        if entry['kind'] == KIND_CATEGORY:
+            with open(os.path.join(path, entry['categories_file'])) as fh:
+                categories = np.array(json.load(fh) + [None], dtype=object)
+        mapped[entry['name']] = (entry['kind'], values, categories)
+
+    for offset in range(max(start, 0), stop, chunk_rows):
+        end = min(offset + chunk_rows, stop)
+        data = {}
+        for name, (kind, values, categories) in mapped.items():
+            chunk = np.asarray(values[offset:end])
+            if kind == KIND_DATETIME:
+                data[name] = chunk.view('datetime64[ns]')
+            elif kind == KIND_CATEGORY:
+                # Code -1 (missing) indexes the trailing None
+                data[name] = categories[chunk]
+            else:
+                data[name] = chunk
+        yield pd.DataFrame(data, index=pd.RangeIndex(offset, end))
@@ -0,0 +1,74 @@
+"""
+Streaming CSV ingestion utilities
+"""
+import shutil
+import pandas as pd
+
+# Rows parsed per chunk; bounds peak memory independently of file size
+DEFAULT_CHUNK_ROWS = 50000
+
+# Buffer used when copying the uploaded stream to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def read_csv_header(filepath):
+    """Return the column names of a CSV file without parsing its rows"""
+    return list(pd.read_csv(filepath, nrows=0).columns)
+
+def iter_csv_chunks(filepath, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the CSV file as DataFrames of at most chunk_rows rows"""
+    with pd.read_csv(filepath, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk
+
+def scan_csv(filepath, chunk_rows=DEFAULT_CHUNK_ROWS, preview_rows=5, on_chunk=None):
+    """
+    Stream a CSV file once and collect upload statistics incrementally
+
+    Args:
+        filepath: Path of the saved CSV file
+        chunk_rows: Maximum number of rows held in memory at a time
+        preview_rows: Number of leading rows returned as preview
+        on_chunk: Optional callable invoked with every parsed chunk
+
+    Returns:
+        Dictionary with total_posts, columns and preview records
+    """
+    total_posts = 0
+    columns = None
+    preview = []
+
+    for chunk in iter_csv_chunks(filepath, chunk_rows):
+        if columns is None:
+            columns = list(chunk.columns)
+        if len(preview) < preview_rows:
+            preview.extend(chunk.head(preview_rows - len(preview)).to_dict('records'))
+        total_posts += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+    if columns is None:
+        columns = read_csv_header(filepath)
+
+    return {
+        "total_posts": total_posts,
+        "columns": columns,
+        "preview": preview
+    }
+
+def append_csv_rows(target_path, source_path):
+    """
+    Append the data rows of a CSV file (without its header) to another CSV
+
+    Both files must have the same header; rows are copied byte for byte.
+    """
+    with open(target_path, 'rb+') as target:
+        target.seek(0, 2)
+        if target.tell() > 0:
+            target.seek(-1, 2)
+            last_byte = target.read(1)
+            target.seek(0, 2)
+            if last_byte not in (b'\n', b'\r'):
+                target.write(b'\n')
+        with open(source_path, 'rb') as source:
+            source.readline()
+            shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
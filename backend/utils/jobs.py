@@ -0,0 +1,295 @@
+"""
+Background job execution
+Jobs are persisted in the jobs table and executed in a local process pool so
+heavy work (training, scoring) never runs inside a web request. A job marks
+itself running in the table when a pool process starts it; progress and
+cancellation are exchanged with the worker processes through small state
+files, which any web worker can read.
+"""
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from sqlalchemy import column, create_engine, table
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+# Database engines of a pool process, by URI
+_engines = {}
+
+def _engine(database_uri):
+    if database_uri not in _engines:
+        _engines[database_uri] = create_engine(database_uri)
+    return _engines[database_uri]
+
+class JobContext:
+    """
+    Handle passed to job functions for progress reporting and cancellation
+    Picklable, so it can be sent to pool processes.
+    """
+
+    def __init__(self, job_id, state_dir, database_uri=None, table_name='jobs'):
+        self.job_id = job_id
+        self.state_dir = state_dir
+        self.database_uri = database_uri
+        self.table_name = table_name
+
+    @property
+    def progress_path(self):
+        return os.path.join(self.state_dir, f"{self.job_id}.progress.json")
+
+    @property
+    def cancel_path(self):
+        return os.path.join(self.state_dir, f"{self.job_id}.cancel")
+
+    def report(self, stage, progress, **extra):
+        """Record the current stage and progress (0-1) of the job"""
+        state = {'stage': stage, 'progress': round(float(progress), 4), 'pid': os.getpid()}
+        state.update(extra)
+        tmp_path = f"{self.progress_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, self.progress_path)
+
+    def mark_running(self):
+        """Persist the running status of a job that is still queued"""
+        if not self.database_uri:
+            return
+        jobs = table(self.table_name, column('id'), column('status'))
+        with _engine(self.database_uri).begin() as conn:
+            conn.execute(
+                jobs.update()
+                .where(jobs.c.id == self.job_id, jobs.c.status == JOB_QUEUED)
+                .values(status=JOB_RUNNING)
+            )
+
+    def read_progress(self):
+        """Last reported progress, or None if nothing was reported yet"""
+        try:
+            with open(self.progress_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def cancelled(self):
+        return os.path.exists(self.cancel_path)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self.cancelled():
+            raise JobCancelled()
+
+    def request_cancel(self):
+        open(self.cancel_path, 'w').close()
+
+    def cleanup(self):
+        for path in (self.progress_path, self.cancel_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _run_job(fn, ctx, args, kwargs):
+    """Entry point executed in the pool process"""
+    ctx.check_cancelled()
+    ctx.mark_running()
+    ctx.report(JOB_RUNNING, 0.0)
+    return fn(ctx, *args, **kwargs)
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+class JobManager:
+    """
+    Submit jobs to a process pool and keep the jobs table up to date
+
+    Args:
+        app: Flask app (used for an app context when jobs finish)
+        db: SQLAlchemy instance
+        job_model: Job model class
+        state_dir: Directory for progress/cancel state files
+        max_workers: Pool size (default: number of CPUs)
+    """
+
+    def __init__(self, app, db, job_model, state_dir, max_workers=None):
+        self.app = app
+        self.db = db
+        self.Job = job_model
+        self.state_dir = state_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a broken pool so the next submission starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def context(self, job_id):
+        return JobContext(
+            job_id, self.state_dir,
+            database_uri=self.app.config.get('SQLALCHEMY_DATABASE_URI'),
+            table_name=self.Job.__tablename__
+        )
+
+    def create(self, user_id, kind, params=None):
+        """Persist a new queued job"""
+        job = self.Job(
+            user_id=user_id,
+            kind=kind,
+            status=JOB_QUEUED,
+            params=json.dumps(params or {}),
+            worker_pid=os.getpid()
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+        return job
+
+    def submit(self, job, fn, *args, on_success=None, **kwargs):
+        """
+        Run fn(ctx, *args, **kwargs) for a persisted job in the process pool
+
+        on_success, if given, is called in this process (inside an app
+        context) with the job and the function's result before it is stored.
+        """
+        job_id = job.id
+        ctx = self.context(job_id)
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_run_job, fn, ctx, args, kwargs)
+        except BrokenProcessPool:
+            # A pool process died; its jobs fail through their futures
+            self._discard_executor(executor)
+            executor = self._get_executor()
+            future = executor.submit(_run_job, fn, ctx, args, kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish(job_id, f, on_success, executor))
+        return future
+
+    def _finish(self, job_id, future, on_success, executor=None):
+        """Record the outcome of a job (runs in the pool's callback thread)"""
+        with self._lock:
+            self._futures.pop(job_id, None)
+        ctx = self.context(job_id)
+        error = None if future.cancelled() else future.exception()
+        if isinstance(error, BrokenProcessPool) and executor is not None:
+            self._discard_executor(executor)
+
+        with self.app.app_context():
+            try:
+                job = self.db.session.get(self.Job, job_id)
+                if job is None:
+                    return
+                if future.cancelled() or isinstance(error, JobCancelled):
+                    job.status = JOB_CANCELLED
+                elif isinstance(error, BrokenProcessPool):
+                    job.status = JOB_FAILED
+                    job.error = 'Worker process terminated unexpectedly'
+                elif error is not None:
+                    job.status = JOB_FAILED
+                    job.error = str(error) or error.__class__.__name__
+                else:
+                    result = future.result()
+                    if on_success is not None:
+                        result = on_success(job, result)
+                    job.status = JOB_SUCCEEDED
+                    job.result = json.dumps(result)
+                job.finished_at = datetime.utcnow()
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                traceback.print_exc()
+                job = self.db.session.get(self.Job, job_id)
+                if job is not None and job.status in ACTIVE_STATUSES:
+                    job.status = JOB_FAILED
+                    job.error = 'Failed to record job result'
+                    job.finished_at = datetime.utcnow()
+                    self.db.session.commit()
+            finally:
+                self.db.session.remove()
+                ctx.cleanup()
+
+    def cancel(self, job):
+        """Cancel a queued job, or ask a running one to stop"""
+        if job.status not in ACTIVE_STATUSES:
+            return job
+        with self._lock:
+            future = self._futures.get(job.id)
+        if future is not None and future.cancel():
+            # Still queued in this worker's pool; the done callback records it
+            return job
+        if future is None and not _pid_alive(job.worker_pid):
+            job.status = JOB_CANCELLED
+            job.finished_at = datetime.utcnow()
+            self.db.session.commit()
+            return job
+        self.context(job.id).request_cancel()
+        return job
+
+    def describe(self, job):
+        """Job as a dictionary, including live progress for active jobs"""
+        data = job.to_dict()
+        if job.status in ACTIVE_STATUSES:
+            state = self.context(job.id).read_progress()
+            if state:
+                data['stage'] = state.get('stage')
+                data['progress'] = state.get('progress')
+            if self.context(job.id).cancelled():
+                data['cancel_requested'] = True
+        return data
+
+    def find_active(self, kind, **params):
+        """Return an active job of the given kind whose params match"""
+        candidates = self.Job.query.filter(
+            self.Job.kind == kind,
+            self.Job.status.in_(ACTIVE_STATUSES)
+        ).order_by(self.Job.created_at.desc()).all()
+        for job in candidates:
+            job_params = json.loads(job.params) if job.params else {}
+            if all(job_params.get(k) == v for k, v in params.items()):
+                return job
+        return None
+
+    def recover(self):
+        """Fail jobs whose owning web worker is gone (e.g. after a restart)"""
+        stale = self.Job.query.filter(self.Job.status.in_(ACTIVE_STATUSES)).all()
+        changed = False
+        for job in stale:
+            if job.worker_pid != os.getpid() and not _pid_alive(job.worker_pid):
+                job.status = JOB_FAILED
+                job.error = 'Interrupted by server restart'
+                job.finished_at = datetime.utcnow()
+                self.context(job.id).cleanup()
+                changed = True
+        if changed:
+            self.db.session.commit()
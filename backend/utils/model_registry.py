@@ -0,0 +1,183 @@
+"""
+In-process registry of trained models
+Models are loaded lazily, once per worker, and served from memory. Artifacts
+are re-checked on disk (mtime/size) and swapped in atomically when they change
+(or dropped when they are removed). With a memory budget the least recently
+used models are evicted once the loaded artifacts exceed it, so a worker can
+serve many model shards without holding all of them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Artifact names of the global models in the model folder
+LIKES_MODEL = 'likes_predictor.pkl'
+GROWTH_MODEL = 'follower_growth_predictor.pkl'
+
+class ModelRegistry:
+    """
+    Serve joblib model artifacts from memory with hot reload
+
+    Args:
+        folder: Directory containing the model artifacts
+        mmap_mode: Optional joblib mmap_mode (e.g. 'r') so numpy arrays inside
+            the models are memory-mapped and shared between forked workers
+        check_interval: Minimum seconds between disk checks for one artifact
+        max_bytes: Optional memory budget; the size of a loaded model is
+            estimated by its artifact size
+    """
+
+    def __init__(self, folder, mmap_mode=None, check_interval=1.0, max_bytes=None):
+        self.folder = folder
+        self.mmap_mode = mmap_mode
+        self.check_interval = check_interval
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._checked_at = {}
+        self._loading = set()
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """Absolute path of an artifact"""
+        return os.path.join(self.folder, name)
+
+    def _disk_version(self, name):
+        try:
+            stat = os.stat(self.path(name))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, name):
+        """
+        Return the model for an artifact name, or None if it is unavailable
+
+        While a new version is being loaded by one request, concurrent requests
+        keep being served the previous version.
+        """
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and now - self._checked_at.get(name, 0) < self.check_interval:
+            self._touch(name)
+            return entry[0]
+
+        self._checked_at[name] = now
+        version = self._disk_version(name)
+        if version is None:
+            # The artifact was removed (e.g. superseded by a joint model)
+            with self._lock:
+                self._entries.pop(name, None)
+            return None
+        if entry is not None and entry[1] == version:
+            self._touch(name)
+            return entry[0]
+
+        with self._lock:
+            if name in self._loading:
+                return entry[0] if entry is not None else None
+            self._loading.add(name)
+
+        try:
+            model = joblib.load(self.path(name), mmap_mode=self.mmap_mode)
+            self._store(name, model, version)
+            return model
+        except Exception:
+            logger.exception("Failed to load model %s", name)
+            return entry[0] if entry is not None else None
+        finally:
+            with self._lock:
+                self._loading.discard(name)
+
+    def _touch(self, name):
+        """Mark an entry as most recently used"""
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+
+    def _store(self, name, model, version):
+        """Serve a loaded model, evicting least recently used ones over the budget"""
+        with self._lock:
+            self._entries[name] = (model, version)
+            self._entries.move_to_end(name)
+            if self.max_bytes is None:
+                return
+            total = sum(entry[1][1] for entry in self._entries.values())
+            for old in list(self._entries):
+                if total <= self.max_bytes or old == name:
+                    break
+                total -= self._entries.pop(old)[1][1]
+                self._checked_at.pop(old, None)
+
+    def memory_bytes(self):
+        """Estimated memory of the loaded models (sum of their artifact sizes)"""
+        return sum(entry[1][1] for entry in list(self._entries.values()))
+
+    def loaded(self):
+        """Names of the loaded models, least recently used first"""
+        return list(self._entries)
+
+    def preload(self, names):
+        """Load artifacts eagerly (e.g. at worker startup)"""
+        for name in names:
+            self.get(name)
+
+    def metadata_path(self, name):
+        """Path of the JSON metadata stored next to an artifact"""
+        return os.path.splitext(self.path(name))[0] + '.json'
+
+    def metadata(self, name):
+        """Metadata saved with an artifact (e.g. its model selection), or None"""
+        try:
+            with open(self.metadata_path(name)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name, model, metadata=None):
+        """
+        Persist a model atomically and serve it immediately
+
+        metadata (JSON-serializable, e.g. a model comparison) is written next
+        to the artifact; without it, metadata of a previous model is removed.
+        """
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        metadata_path = self.metadata_path(name)
+        if metadata is not None:
+            tmp_path = f"{metadata_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as fh:
+                json.dump(metadata, fh)
+            os.replace(tmp_path, metadata_path)
+        else:
+            try:
+                os.remove(metadata_path)
+            except FileNotFoundError:
+                pass
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+        self._store(name, model, self._disk_version(name))
+        self._checked_at[name] = time.monotonic()
+        return path
+
+    def remove(self, name):
+        """Delete an artifact and stop serving it"""
+        for path in (self.path(name), self.metadata_path(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._entries.pop(name, None)
+        self._checked_at.pop(name, None)
+
+    def version(self, name):
+        """Version (mtime_ns, size) of the model currently served, if any"""
+        entry = self._entries.get(name)
+        return entry[1] if entry is not None else None
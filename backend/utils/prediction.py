@@ -0,0 +1,147 @@
+"""
+Prediction pipeline shared by synchronous requests and background jobs
+"""
+import numpy as np
+import pandas as pd
+from utils.frame_store import write_frame
+from utils.analytics import compute_breakdowns
+
+# Columns copied next to the per-post predictions so exported rows can be identified
+EXPORT_CONTEXT_COLUMNS = [
+    'post_id', 'id', 'post_date', 'date', 'timestamp', 'datetime', 'created_at',
+    'post_time', 'platform', 'content_type', 'posting_hour', 'posting_day'
+]
+
+def feature_matrix(df_processed, cache=None, upload_id=None):
+    """
+    Return the feature matrix for a preprocessed frame
+
+    Matrices of stored uploads are served from the feature cache, so repeated
+    scoring of the same upload skips feature preparation entirely.
+    """
+    from trainings.train_model import build_feature_matrix
+
+    if cache is not None and upload_id is not None:
+        cached = cache.get(upload_id, len(df_processed))
+        if cached is not None:
+            X, feature_names = cached
+            return pd.DataFrame(X, columns=feature_names, copy=False)
+
+    X = build_feature_matrix(df_processed)
+    if cache is not None and upload_id is not None and X.shape[1] > 0:
+        cache.put(upload_id, X.to_numpy(dtype=np.float32), list(X.columns))
+    return X
+
+def align_features(X, model):
+    """
+    Reorder feature columns to the ones a fitted model was trained on
+
+    Columns the model expects but X lacks are filled with 0, so single posts
+    with missing optional fields can still be scored.
+    """
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if feature_names is None:
+        return X
+    return X.reindex(columns=list(feature_names), fill_value=0)
+
+def _predict_chunked(model, X, chunk_rows, progress, start, span):
+    """Predict in row chunks, reporting progress between chunks"""
+    if not chunk_rows or len(X) <= chunk_rows:
+        return model.predict(X)
+
+    parts = []
+    for offset in range(0, len(X), chunk_rows):
+        parts.append(model.predict(X.iloc[offset:offset + chunk_rows]))
+        if progress is not None:
+            progress(start + span * min(offset + chunk_rows, len(X)) / len(X))
+    return np.concatenate(parts)
+
+def predict_targets(X, model_likes, model_growth=None, chunk_rows=None, progress=None):
+    """
+    Predict likes and (if a model is available) follower growth
+
+    A joint model (one with a targets attribute, see MultiTargetRegressor)
+    predicts both targets in one pass; model_growth is then ignored.
+
+    Args:
+        X: Feature matrix
+        model_likes: Fitted likes model or joint model
+        model_growth: Optional fitted follower growth model
+        chunk_rows: Predict in chunks of this many rows (default: all at once)
+        progress: Optional callable receiving the completed fraction (0-1)
+
+    Returns:
+        (predictions_likes, predictions_growth or None)
+    """
+    targets = getattr(model_likes, 'targets', None)
+    if targets is not None:
+        predictions = _predict_chunked(model_likes, X, chunk_rows, progress, 0.0, 1.0)
+        predictions_growth = predictions[:, targets.index('follower_growth')] if 'follower_growth' in targets else None
+        return predictions[:, targets.index('likes')], predictions_growth
+
+    span = 0.5 if model_growth is not None else 1.0
+    predictions_likes = _predict_chunked(model_likes, X, chunk_rows, progress, 0.0, span)
+
+    predictions_growth = None
+    if model_growth is not None:
+        try:
+            predictions_growth = _predict_chunked(model_growth, X, chunk_rows, progress, 0.5, 0.5)
+        except Exception:
+            predictions_growth = None
+
+    return predictions_likes, predictions_growth
+
+def summarize_predictions(df_processed, predictions_likes, predictions_growth=None):
+    """
+    Aggregate per-post predictions into the prediction response payload
+
+    Returns:
+        Dictionary with predictions, platform_analysis, breakdowns and total_posts_analyzed
+    """
+    # Calculate statistics for LIKES
+    avg_predicted_likes = float(np.mean(predictions_likes))
+    max_predicted_likes = float(np.max(predictions_likes))
+    min_predicted_likes = float(np.min(predictions_likes))
+
+    # Calculate statistics for FOLLOWER GROWTH
+    avg_predicted_growth = float(np.mean(predictions_growth)) if predictions_growth is not None else None
+    max_predicted_growth = float(np.max(predictions_growth)) if predictions_growth is not None else None
+    min_predicted_growth = float(np.min(predictions_growth)) if predictions_growth is not None else None
+
+    # Platform, content type, weekday and hour breakdowns in one grouped pass
+    breakdowns, best_hour = compute_breakdowns(df_processed, predictions_likes, predictions_growth)
+    platform_analysis = {
+        platform: {
+            "avg_predicted_likes": stats["avg_predicted_likes"],
+            "post_count": stats["post_count"]
+        }
+        for platform, stats in breakdowns.get('platform', {}).items()
+    }
+
+    return {
+        "predictions": {
+            "likes": {
+                "average": avg_predicted_likes,
+                "max": max_predicted_likes,
+                "min": min_predicted_likes
+            },
+            "follower_growth": {
+                "average": avg_predicted_growth,
+                "max": max_predicted_growth,
+                "min": min_predicted_growth
+            } if avg_predicted_growth is not None else None,
+            "best_posting_hour": best_hour
+        },
+        "platform_analysis": platform_analysis,
+        "breakdowns": breakdowns,
+        "total_posts_analyzed": len(df_processed)
+    }
+
+def write_prediction_rows(df_processed, predictions_likes, predictions_growth, path):
+    """Persist per-post predictions (with identifying columns) to a columnar store"""
+    context_cols = [col for col in EXPORT_CONTEXT_COLUMNS if col in df_processed.columns]
+    rows = df_processed[context_cols].reset_index(drop=True)
+    rows['predicted_likes'] = np.asarray(predictions_likes, dtype=np.float64)
+    if predictions_growth is not None:
+        rows['predicted_follower_growth'] = np.asarray(predictions_growth, dtype=np.float64)
+    return write_frame(rows, path)
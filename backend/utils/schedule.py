@@ -0,0 +1,156 @@
+"""
+Posting-schedule optimizer
+Scores every candidate slot (hour x weekday x content type x platform) for an
+account in one batched predict call and ranks them, so hours the account has
+never posted at can still be recommended.
+"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.analytics import DAY_NAMES
+from utils.prediction import align_features, predict_targets
+
+DEFAULT_TOP_SLOTS = 10
+
+# Columns of the account profile and how they are summarised from its history
+PROFILE_COLUMNS = {
+    'caption_length': 'median',
+    'hashtags_count': 'median',
+    'engagement_rate': 'mean',
+    'rolling_avg_likes': 'last',
+    'followers_at_post_time': 'last',
+    'followers': 'last'
+}
+
+def _labels(df_processed, col, known):
+    """Labels of a categorical column that map to a known encoding, in first-seen order"""
+    if col not in df_processed.columns:
+        return list(known)
+    labels = []
+    seen = set()
+    for value in pd.unique(df_processed[col].dropna().astype(str)):
+        key = value.lower()
+        if key in known and key not in seen:
+            labels.append(value)
+            seen.add(key)
+    return labels or list(known)
+
+def account_profile(df_processed):
+    """
+    Summarise an account's posting history into the inputs of the candidate grid
+
+    Returns:
+        Dictionary with typical feature values plus the platforms and content
+        types the account uses
+    """
+    from trainings.feature_engineering import PLATFORM_MAP, CONTENT_TYPE_MAP
+
+    values = {}
+    for col, how in PROFILE_COLUMNS.items():
+        if col not in df_processed.columns:
+            continue
+        series = pd.to_numeric(df_processed[col], errors='coerce').dropna()
+        if series.empty:
+            continue
+        value = series.iloc[-1] if how == 'last' else getattr(series, how)()
+        values[col] = float(value)
+
+    return {
+        'values': values,
+        'platforms': _labels(df_processed, 'platform', PLATFORM_MAP),
+        'content_types': _labels(df_processed, 'content_type', CONTENT_TYPE_MAP)
+    }
+
+def candidate_grid(profile, platforms=None, content_types=None, month=None):
+    """
+    Build the feature frame of every (platform, content type, weekday, hour) slot
+
+    Returns:
+        (grid DataFrame with the slot columns, feature DataFrame)
+    """
+    from trainings.feature_engineering import PLATFORM_MAP, CONTENT_TYPE_MAP
+
+    platforms = platforms or profile['platforms']
+    content_types = content_types or profile['content_types']
+    month = month or datetime.utcnow().month
+
+    # Cartesian product laid out as platform-major, hour-minor
+    platform_idx, content_idx, day, hour = (
+        axis.ravel() for axis in np.meshgrid(
+            np.arange(len(platforms)), np.arange(len(content_types)),
+            np.arange(7), np.arange(24), indexing='ij'
+        )
+    )
+    platform_codes = np.array([PLATFORM_MAP.get(p.lower(), 0) for p in platforms])[platform_idx]
+    content_codes = np.array([CONTENT_TYPE_MAP.get(c.lower(), 0) for c in content_types])[content_idx]
+
+    grid = pd.DataFrame({
+        'platform': np.asarray(platforms, dtype=object)[platform_idx],
+        'content_type': np.asarray(content_types, dtype=object)[content_idx],
+        'day': day,
+        'hour': hour
+    })
+
+    features = {
+        'posting_hour': hour,
+        'posting_day': day,
+        'month': np.full(len(grid), month),
+        'platform_encoded': platform_codes,
+        'content_type_encoded': content_codes,
+        'is_weekend': (day >= 5).astype(int),
+        'platform_content_interaction': platform_codes * 10 + content_codes,
+        'hour_platform_interaction': hour * 10 + platform_codes
+    }
+    for col, value in profile['values'].items():
+        features[col] = np.full(len(grid), value)
+    return grid, pd.DataFrame(features)
+
+def optimize_schedule(profile, model_likes, model_growth=None, top_n=DEFAULT_TOP_SLOTS,
+                      platforms=None, content_types=None, month=None, models=None):
+    """
+    Rank all candidate posting slots of an account by predicted likes
+
+    Args:
+        profile: Account profile from account_profile()
+        model_likes: Fitted likes model
+        model_growth: Optional fitted follower growth model
+        top_n: Number of slots to return (None for all)
+        platforms / content_types: Optional subsets to restrict the grid to
+        month: Month to schedule for (default: current month)
+        models: Optional UserModels (utils.shards); slots are then scored
+            with the model of their platform and model_likes/model_growth
+            are not used
+
+    Returns:
+        Dictionary with the ranked schedule, the best slot and the grid size
+    """
+    grid, X = candidate_grid(profile, platforms, content_types, month)
+
+    if models is not None:
+        likes, growth = models.predict(X, grid['platform'])
+    else:
+        likes, growth = predict_targets(align_features(X, model_likes), model_likes, model_growth)
+
+    # Stable sort keeps ties in grid order (earliest day/hour first)
+    order = np.argsort(-likes, kind='stable')
+    if top_n is not None:
+        order = order[:top_n]
+
+    schedule = []
+    for rank, i in enumerate(order, start=1):
+        schedule.append({
+            "rank": rank,
+            "platform": grid['platform'].iat[i],
+            "content_type": grid['content_type'].iat[i],
+            "day_of_week": DAY_NAMES[grid['day'].iat[i]],
+            "day": int(grid['day'].iat[i]),
+            "hour": int(grid['hour'].iat[i]),
+            "predicted_likes": float(likes[i]),
+            "predicted_follower_growth": float(growth[i]) if growth is not None else None
+        })
+
+    return {
+        "schedule": schedule,
+        "best_slot": schedule[0] if schedule else None,
+        "candidates_scored": len(grid)
+    }
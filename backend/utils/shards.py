@@ -0,0 +1,146 @@
+"""
+Per-user model shards
+Every user can have models trained on their own uploads (a user shard) and,
+for platforms with enough posts, per-platform models (platform shards). They
+live next to the global models:
+
+    shards/user_<id>/likes_predictor.pkl
+    shards/user_<id>/platform_<platform>/likes_predictor.pkl
+
+and are served through the same ModelRegistry, so they are loaded lazily and
+evicted when the worker's model cache is full. Posts are scored with the most
+specific model available: platform shard, user shard, then the global model.
+"""
+import os
+import re
+import numpy as np
+import pandas as pd
+from utils.model_registry import LIKES_MODEL, GROWTH_MODEL
+from utils.prediction import align_features, predict_targets
+
+SHARD_FOLDER = 'shards'
+
+# Fewest posts a user (or one of their platforms) needs for its own models
+MIN_SHARD_POSTS = 30
+
+SHARD_SCOPES = ('global', 'user', 'platform')
+
+def platform_key(platform):
+    """Platform name as used in shard paths ('LinkedIn' -> 'linkedin')"""
+    return re.sub(r'[^a-z0-9]+', '_', str(platform).strip().lower()).strip('_') or 'unknown'
+
+def shard_dir(user_id, platform=None):
+    """Artifact directory of a user (or user platform) shard, relative to the model folder"""
+    parts = [SHARD_FOLDER, f'user_{int(user_id)}']
+    if platform is not None:
+        parts.append(f'platform_{platform_key(platform)}')
+    return os.path.join(*parts)
+
+def shard_name(artifact, user_id, platform=None):
+    """Registry name of an artifact inside a shard"""
+    return os.path.join(shard_dir(user_id, platform), artifact)
+
+def shard_platforms(model_folder, user_id):
+    """Platform keys a user has platform shards for"""
+    folder = os.path.join(model_folder, shard_dir(user_id))
+    try:
+        entries = os.listdir(folder)
+    except OSError:
+        return []
+    return sorted(
+        entry[len('platform_'):] for entry in entries
+        if entry.startswith('platform_') and os.path.exists(os.path.join(folder, entry, LIKES_MODEL))
+    )
+
+class UserModels:
+    """
+    Models serving one user, resolved lazily from a ModelRegistry
+
+    Args:
+        registry: ModelRegistry of the model folder
+        user_id: User whose shards are preferred (None: global models only)
+    """
+
+    def __init__(self, registry, user_id=None):
+        self.registry = registry
+        self.user_id = user_id
+        self.platforms = set(shard_platforms(registry.folder, user_id)) if user_id is not None else set()
+
+    def _pair(self, likes_name, growth_name):
+        model_likes = self.registry.get(likes_name)
+        if model_likes is None:
+            return None
+        return model_likes, self.registry.get(growth_name)
+
+    def default(self):
+        """(likes model, growth model) of the user shard, else the global models"""
+        if self.user_id is not None:
+            pair = self._pair(shard_name(LIKES_MODEL, self.user_id), shard_name(GROWTH_MODEL, self.user_id))
+            if pair is not None:
+                return pair
+        return self.registry.get(LIKES_MODEL), self.registry.get(GROWTH_MODEL)
+
+    def for_platform(self, platform):
+        """(likes model, growth model) serving posts of one platform"""
+        key = platform_key(platform)
+        if key in self.platforms:
+            pair = self._pair(shard_name(LIKES_MODEL, self.user_id, key),
+                              shard_name(GROWTH_MODEL, self.user_id, key))
+            if pair is not None:
+                return pair
+        return self.default()
+
+    def available(self):
+        """Whether any model can score this user's posts"""
+        return bool(self.platforms) or self.default()[0] is not None
+
+    def predict(self, X, platforms=None, chunk_rows=None, progress=None):
+        """
+        Predict likes and follower growth with the model of every row's platform
+
+        Rows are grouped by the model serving them, so each model is called
+        once (in chunks of chunk_rows) on its rows.
+
+        Args:
+            X: Feature matrix (DataFrame)
+            platforms: Optional platform of every row (array-like)
+            chunk_rows / progress: As in predict_targets()
+
+        Returns:
+            (predictions_likes, predictions_growth or None); growth is None
+            when one of the models used has no growth model
+
+        Raises:
+            LookupError: when no model serves some of the rows
+        """
+        if platforms is None or not self.platforms:
+            model_likes, model_growth = self.default()
+            if model_likes is None:
+                raise LookupError("No trained model available")
+            return predict_targets(align_features(X, model_likes), model_likes, model_growth, chunk_rows, progress)
+
+        platforms = pd.Series(np.asarray(platforms, dtype=object)).astype(str)
+        groups = {}
+        for platform in platforms.unique():
+            pair = self.for_platform(platform)
+            if pair[0] is None:
+                raise LookupError("No trained model available")
+            groups.setdefault(id(pair[0]), (pair, []))[1].append(platform)
+
+        predictions_likes = np.empty(len(X), dtype=np.float64)
+        predictions_growth = np.empty(len(X), dtype=np.float64)
+        has_growth = True
+        done = 0
+        for (model_likes, model_growth), members in groups.values():
+            rows = np.flatnonzero(platforms.isin(members).to_numpy())
+            X_group = align_features(X.iloc[rows], model_likes)
+            likes, growth = predict_targets(X_group, model_likes, model_growth, chunk_rows)
+            predictions_likes[rows] = likes
+            if growth is None:
+                has_growth = False
+            else:
+                predictions_growth[rows] = growth
+            done += len(rows)
+            if progress is not None:
+                progress(done / len(X))
+        return predictions_likes, predictions_growth if has_growth else None
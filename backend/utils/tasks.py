@@ -0,0 +1,305 @@
+"""
+Job functions executed in the background process pool
+Each function takes a JobContext first and only picklable arguments.
+"""
+import os
+import time
+import pandas as pd
+from utils.frame_store import load_frame, store_exists, store_rows, iter_frame
+from utils.model_registry import ModelRegistry, LIKES_MODEL, GROWTH_MODEL
+from utils.prediction import feature_matrix, summarize_predictions, write_prediction_rows
+from utils.shards import UserModels, MIN_SHARD_POSTS, shard_name, platform_key
+
+# Rows scored per model call in prediction jobs (progress is reported between chunks)
+PREDICT_CHUNK_ROWS = 100000
+
+# Posts per chunk in incremental training jobs
+TRAIN_CHUNK_ROWS = 100000
+
+# Per-process state, reused across jobs executed by the same pool process
+_registries = {}
+_feature_caches = {}
+
+def _registry(model_folder):
+    if model_folder not in _registries:
+        max_bytes = int(os.environ.get('MODEL_CACHE_MB', 512)) * 1024 * 1024
+        _registries[model_folder] = ModelRegistry(model_folder, max_bytes=max_bytes)
+    return _registries[model_folder]
+
+def _feature_cache(cache_dir):
+    from trainings.feature_cache import FeatureCache
+    if cache_dir not in _feature_caches:
+        _feature_caches[cache_dir] = FeatureCache(cache_dir)
+    return _feature_caches[cache_dir]
+
+def load_processed_frame(store_path, csv_path):
+    """Load a preprocessed frame from its store, or preprocess the CSV"""
+    if store_exists(store_path):
+        return load_frame(store_path)
+    from trainings.feature_engineering import engineer_features
+    return engineer_features(pd.read_csv(csv_path))
+
+def pick_model(models_dict, target):
+    """Preferred trained model for a target (random forest, gradient boosting, then linear)"""
+    for model_type in ('random_forest', 'hist_gradient_boosting', 'linear'):
+        model = models_dict.get(f'{target}_{model_type}')
+        if model is not None:
+            return model
+    return None
+
+def _training_chunks(ctx, chunks, total_rows=None):
+    """Pass chunks through, checking for cancellation and reporting progress"""
+    done = 0
+    for chunk in chunks:
+        ctx.check_cancelled()
+        yield chunk
+        done += len(chunk)
+        progress = 0.1 + 0.8 * done / total_rows if total_rows else 0.5
+        ctx.report('training', min(progress, 0.9), rows=done)
+
+def publish_models(registry, models_dict, likes_name=LIKES_MODEL, growth_name=GROWTH_MODEL, export=None,
+                   metadata=None):
+    """
+    Save the preferred trained models under the served artifact names
+    
+    With export ('float64', 'float32' or 'quantized' thresholds) forests are
+    saved in the compact inference format (trainings.train_model.export_model).
+    metadata (e.g. the model selection) is saved next to every artifact.
+    
+    Returns:
+        List of the artifact names written
+    
+    Raises:
+        ValueError: if no likes model was trained
+    """
+    if export:
+        from trainings.train_model import export_model
+        models_dict = {name: export_model(model, export) for name, model in models_dict.items()}
+    
+    artifacts = []
+    if 'joint' in models_dict:
+        # One artifact predicts both targets; the separate growth model is retired
+        registry.save(likes_name, models_dict['joint'], metadata)
+        registry.remove(growth_name)
+        artifacts.append(likes_name)
+    for target, artifact in (('likes', likes_name), ('follower_growth', growth_name)):
+        model = pick_model(models_dict, target)
+        if model is not None:
+            registry.save(artifact, model, metadata)
+            artifacts.append(artifact)
+    
+    if likes_name not in artifacts:
+        raise ValueError("No model trained successfully")
+    return artifacts
+
+def _train(df_processed, model_type, budget_seconds=None, selection_workers=None):
+    """
+    Train with train_models(), train_models_budgeted() (with a budget) or
+    select_models() (model_type 'auto')
+    
+    Returns:
+        (models, metrics, details): details holds the 'budget' report or the
+        model 'selection' (None otherwise)
+    """
+    if model_type == 'auto':
+        from trainings.model_selection import select_models
+        models_dict, metrics, selection = select_models(df_processed, max_workers=selection_workers)
+        return models_dict, metrics, {'budget': None, 'selection': selection}
+    if budget_seconds is not None:
+        from trainings.budgeted_training import train_models_budgeted
+        models_dict, metrics, report = train_models_budgeted(df_processed, model_type, budget_seconds)
+        return models_dict, metrics, {'budget': report, 'selection': None}
+    from trainings.train_model import train_models
+    models_dict, metrics = train_models(df_processed, model_type=model_type)
+    return models_dict, metrics, {'budget': None, 'selection': None}
+
+def _selection_metadata(details):
+    """Metadata saved with the artifacts of a training run"""
+    return {'selection': details['selection']} if details['selection'] is not None else None
+
+def train_models_job(ctx, store_path, csv_path, model_folder, model_type='random_forest', incremental=False,
+                     export=None, budget_seconds=None, selection_workers=None):
+    """
+    Train the likes and follower growth models and publish them
+    
+    With incremental the upload is streamed in chunks of TRAIN_CHUNK_ROWS
+    posts (train_models_incremental), so it never has to fit in memory. With
+    budget_seconds the models are trained on growing samples until the
+    budget is spent (train_models_budgeted). model_type 'auto' picks the
+    models by cross-validation in a pool of selection_workers processes
+    (select_models); the comparison is saved with the artifacts. export is
+    passed to publish_models().
+    """
+    details = {'budget': None, 'selection': None}
+    if incremental:
+        from trainings.incremental_training import train_models_incremental, iter_csv_chunks
+        ctx.report('training', 0.1)
+        if store_exists(store_path):
+            rows = store_rows(store_path)
+            chunks = _training_chunks(ctx, iter_frame(store_path, TRAIN_CHUNK_ROWS), rows)
+            models_dict, metrics = train_models_incremental(chunks, model_type, engineered=True)
+        else:
+            rows = None
+            chunks = _training_chunks(ctx, iter_csv_chunks(csv_path, TRAIN_CHUNK_ROWS))
+            models_dict, metrics = train_models_incremental(chunks, model_type)
+    else:
+        ctx.report('loading_data', 0.05)
+        df_processed = load_processed_frame(store_path, csv_path)
+        rows = len(df_processed)
+        ctx.check_cancelled()
+        
+        ctx.report('training', 0.2)
+        models_dict, metrics, details = _train(df_processed, model_type, budget_seconds, selection_workers)
+    ctx.check_cancelled()
+    
+    # Publishing replaces the artifacts atomically; web workers hot-reload them
+    ctx.report('saving', 0.9)
+    artifacts = publish_models(ModelRegistry(model_folder), models_dict, export=export,
+                               metadata=_selection_metadata(details))
+    
+    return {
+        'model_type': model_type,
+        'incremental': bool(incremental),
+        'artifacts': artifacts,
+        'rows': int(rows) if rows is not None else None,
+        'budget': details['budget'],
+        'selection': details['selection'],
+        'metrics': {
+            name: {k: float(v) for k, v in values.items()}
+            for name, values in metrics.items()
+        }
+    }
+
+def train_shard_job(ctx, user_id, sources, model_folder, model_type='random_forest', platforms=False, export=None,
+                    budget_seconds=None, selection_workers=None, fallback_global=False):
+    """
+    Train a user's model shard from all of their uploads and publish it
+    
+    With platforms, every platform with at least MIN_SHARD_POSTS posts also
+    gets its own models (platform shards). Users with fewer posts get no
+    shard: with fallback_global their posts train the global models instead
+    (for a first model when none exists), else the job fails.
+    
+    Args:
+        user_id: Owner of the shard
+        sources: (store_path, csv_path) of every upload of the user
+        platforms: Also train per-platform shards
+        export: Compact inference format, see publish_models()
+        budget_seconds: Time budget of the whole job, shared by its shards
+        selection_workers: Pool size of model selection (model_type 'auto')
+        fallback_global: Train the global models when there are too few posts for a shard
+    """
+    started = time.monotonic()
+    ctx.report('loading_data', 0.05)
+    frames = []
+    for store_path, csv_path in sources:
+        frames.append(load_processed_frame(store_path, csv_path))
+        ctx.check_cancelled()
+    if not frames:
+        raise ValueError("No uploads to train on")
+    df_processed = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    del frames
+    if len(df_processed) < MIN_SHARD_POSTS:
+        if not fallback_global:
+            raise ValueError(f"At least {MIN_SHARD_POSTS} posts are needed to train a user model")
+        ctx.report('training', 0.2, shard='global')
+        models_dict, metrics, details = _train(df_processed, model_type, budget_seconds, selection_workers)
+        ctx.check_cancelled()
+        ctx.report('saving', 0.9)
+        return {
+            'model_type': model_type,
+            'scope': 'global',
+            'rows': int(len(df_processed)),
+            'artifacts': publish_models(ModelRegistry(model_folder), models_dict, export=export,
+                                        metadata=_selection_metadata(details)),
+            'budget': details['budget'],
+            'selection': details['selection'],
+            'metrics': {name: {k: float(v) for k, v in values.items()} for name, values in metrics.items()}
+        }
+    
+    # The user shard first, then one shard per platform with enough posts
+    groups = [(None, None)]
+    if platforms and 'platform' in df_processed.columns:
+        keys = df_processed['platform'].astype(str).map(platform_key)
+        counts = keys.value_counts()
+        groups += [(key, (keys == key).to_numpy()) for key in sorted(counts.index[counts >= MIN_SHARD_POSTS])]
+    
+    registry = ModelRegistry(model_folder)
+    shards = {}
+    metrics = {}
+    for index, (key, mask) in enumerate(groups):
+        ctx.report('training', 0.1 + 0.8 * index / len(groups), shard=key or 'user')
+        df_shard = df_processed if mask is None else df_processed[mask].reset_index(drop=True)
+        shard_budget = None
+        if budget_seconds:
+            # The remaining budget is split evenly between the remaining shards
+            remaining = budget_seconds - (time.monotonic() - started)
+            shard_budget = max(remaining, 0) / (len(groups) - index)
+        models_dict, shard_metrics, details = _train(df_shard, model_type, shard_budget, selection_workers)
+        ctx.check_cancelled()
+        
+        name = key or 'user'
+        shards[name] = {
+            'rows': int(len(df_shard)),
+            'budget': details['budget'],
+            'selection': details['selection'],
+            'artifacts': publish_models(
+                registry, models_dict,
+                shard_name(LIKES_MODEL, user_id, key), shard_name(GROWTH_MODEL, user_id, key), export,
+                _selection_metadata(details)
+            )
+        }
+        for model_name, values in shard_metrics.items():
+            metrics[f'{name}/{model_name}'] = {k: float(v) for k, v in values.items()}
+    
+    return {
+        'model_type': model_type,
+        'scope': 'platform' if platforms else 'user',
+        'rows': int(len(df_processed)),
+        'shards': shards,
+        'metrics': metrics
+    }
+
+def predict_job(ctx, upload_id, store_path, csv_path, model_folder, cache_dir=None, output_dir=None, user_id=None):
+    """
+    Score an upload with the current models, reporting per-stage progress
+    
+    The user's model shards are preferred over the global models (see
+    utils.shards). When output_dir is given the per-post predictions are
+    written there and the store path is returned under '_output_path'.
+    """
+    ctx.report('loading_data', 0.05)
+    df_processed = load_processed_frame(store_path, csv_path)
+    ctx.check_cancelled()
+    
+    ctx.report('loading_models', 0.15)
+    models = UserModels(_registry(model_folder), user_id)
+    if not models.available():
+        raise ValueError("No trained model available")
+    ctx.check_cancelled()
+    
+    ctx.report('features', 0.2)
+    cache = _feature_cache(cache_dir) if cache_dir else None
+    X = feature_matrix(df_processed, cache, upload_id)
+    if X.shape[1] == 0:
+        raise ValueError("No valid features found in data")
+    ctx.check_cancelled()
+    
+    def on_progress(fraction):
+        ctx.check_cancelled()
+        ctx.report('predicting', 0.3 + 0.5 * fraction, rows=int(len(X)))
+    
+    ctx.report('predicting', 0.3, rows=int(len(X)))
+    platforms = df_processed['platform'] if 'platform' in df_processed.columns else None
+    predictions_likes, predictions_growth = models.predict(
+        X, platforms, chunk_rows=PREDICT_CHUNK_ROWS, progress=on_progress
+    )
+    
+    ctx.report('analytics', 0.85)
+    summary = summarize_predictions(df_processed, predictions_likes, predictions_growth)
+    
+    if output_dir:
+        ctx.report('saving', 0.95)
+        output_path = os.path.join(output_dir, f"job_{ctx.job_id}.store")
+        summary['_output_path'] = write_prediction_rows(df_processed, predictions_likes, predictions_growth, output_path)
+    return summary
@@ -1,8 +1,9 @@
 // Shared Configuration
 const CONFIG = {
     API_BASE_URL: 'http://localhost:5000/api',
-    MAX_FILE_SIZE: 16 * 1024 * 1024, // 16MB
-    SUPPORTED_FILE_TYPES: ['.csv']
+    MAX_FILE_SIZE: 1024 * 1024 * 1024, // 1GB (matches backend MAX_FILE_SIZE_MB)
+    SUPPORTED_FILE_TYPES: ['.csv'],
+    ASYNC_PREDICT_MIN_ROWS: 100000 // Larger uploads are scored as a background job
 };
 
 // Export for use in other files
@@ -91,6 +91,9 @@ function displayDashboardData(data) {
     
     // Update predictions list
     updatePredictionsList(recentPredictions);
+    
+    // Update recommended posting slots
+    updateScheduleList(data.schedule);
 }
 
 function updatePlatformBreakdownFromData(platformBreakdown, recentPredictions) {
@@ -155,6 +158,21 @@ function updatePredictionsList(recentPredictions) {
     }).join('');
 }
 
+function updateScheduleList(schedule) {
+    const list = document.getElementById('scheduleList');
+    if (!list || !schedule || !schedule.schedule || schedule.schedule.length === 0) return;
+    
+    list.innerHTML = schedule.schedule.map(slot => `
+        <div class="prediction-item">
+            <div class="prediction-info">
+                <h4>#${slot.rank} ${slot.day_of_week} ${formatHour(slot.hour)}</h4>
+                <p>${slot.platform} - ${slot.content_type}</p>
+            </div>
+            <div class="prediction-value">${Math.round(slot.predicted_likes)}</div>
+        </div>
+    `).join('');
+}
+
 function displayEmptyState() {
     // Already handled in HTML
 }
@@ -7,8 +7,11 @@ document.addEventListener('DOMContentLoaded', () => {
     // Try to load from sessionStorage
     const predictionData = sessionStorage.getItem('predictionData');
     const uploadStats = sessionStorage.getItem('uploadStats');
+    const predictionJobId = sessionStorage.getItem('predictionJobId');
     
-    if (predictionData && uploadStats) {
+    if (predictionJobId && uploadStats) {
+        streamPredictionJob(predictionJobId, JSON.parse(uploadStats));
+    } else if (predictionData && uploadStats) {
         const data = JSON.parse(predictionData);
         const stats = JSON.parse(uploadStats);
         displayResults(data, stats);
@@ -19,6 +22,64 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// Follow a background prediction job over Server-Sent Events
+function streamPredictionJob(jobId, stats) {
+    const progressSection = document.getElementById('progressSection');
+    const progressFill = document.getElementById('progressFill');
+    const progressText = document.getElementById('progressText');
+    const token = typeof getToken === 'function' ? getToken() : '';
+    
+    if (progressSection) progressSection.style.display = 'block';
+    
+    const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events?token=${encodeURIComponent(token || '')}`);
+    
+    source.addEventListener('progress', (event) => {
+        const job = JSON.parse(event.data);
+        const percent = Math.round((job.progress || 0) * 100);
+        if (progressFill) progressFill.style.width = `${percent}%`;
+        if (progressText) progressText.textContent = `${formatStage(job.stage || job.status)} (${percent}%)`;
+    });
+    
+    source.addEventListener('done', (event) => {
+        source.close();
+        sessionStorage.removeItem('predictionJobId');
+        if (progressSection) progressSection.style.display = 'none';
+        
+        const job = JSON.parse(event.data);
+        if (job.status === 'succeeded' && job.result) {
+            try {
+                sessionStorage.setItem('predictionData', JSON.stringify(job.result));
+            } catch (e) {
+                console.warn('SessionStorage full, using memory cache');
+            }
+            displayResults(job.result, stats);
+        } else {
+            alert(`Prediction ${job.status}: ${job.error || 'no result'}`);
+            displayNoData();
+        }
+    });
+    
+    source.onerror = () => {
+        // EventSource reconnects on its own; stop only if the server closed for good
+        if (source.readyState === EventSource.CLOSED) {
+            if (progressText) progressText.textContent = 'Lost connection to the server';
+        }
+    };
+}
+
+function formatStage(stage) {
+    const labels = {
+        queued: 'Queued',
+        running: 'Starting',
+        loading_data: 'Loading data',
+        loading_models: 'Loading models',
+        features: 'Preparing features',
+        predicting: 'Scoring posts',
+        analytics: 'Analyzing results'
+    };
+    return labels[stage] || stage;
+}
+
 function displayResults(data, stats) {
     const predictions = data.predictions || {};
     const likesData = predictions.likes || {};
@@ -61,6 +122,14 @@ function displayResults(data, stats) {
     
     // Update summary
     document.getElementById('totalPosts').textContent = data.total_posts_analyzed || stats.total_posts || 0;
+    
+    // Per-post predictions are streamed by the export endpoint
+    const exportLink = document.getElementById('exportPredictions');
+    if (exportLink && data.prediction_id) {
+        const token = typeof getToken === 'function' ? getToken() : '';
+        exportLink.href = `${API_BASE_URL}/predictions/${data.prediction_id}/export?format=csv&token=${encodeURIComponent(token || '')}`;
+        exportLink.style.display = '';
+    }
 }
 
 function updatePlatformAnalysis(platformAnalysis) {
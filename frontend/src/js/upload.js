@@ -2,7 +2,8 @@
 
 // Load config and auth
 const API_BASE_URL = typeof CONFIG !== 'undefined' ? CONFIG.API_BASE_URL : 'http://localhost:5000/api';
-const MAX_FILE_SIZE = typeof CONFIG !== 'undefined' ? CONFIG.MAX_FILE_SIZE : 16 * 1024 * 1024;
+const MAX_FILE_SIZE = typeof CONFIG !== 'undefined' ? CONFIG.MAX_FILE_SIZE : 1024 * 1024 * 1024;
+const ASYNC_PREDICT_MIN_ROWS = typeof CONFIG !== 'undefined' ? CONFIG.ASYNC_PREDICT_MIN_ROWS : 100000;
 
 // Load throttle utility
 const throttle = typeof throttle !== 'undefined' ? throttle : function(func, limit) {
@@ -186,21 +187,22 @@ async function uploadFile(file) {
             predictHeaders['Authorization'] = `Bearer ${token}`;
         }
         
-        // Use AbortController for timeout
-        const predictController = new AbortController();
-        const predictTimeoutId = setTimeout(() => predictController.abort(), 60000);
+        // Large uploads are scored in the background; results.html streams progress
+        const asyncMode = (data.stats.total_posts || 0) >= ASYNC_PREDICT_MIN_ROWS;
+        let predictResponse = await requestPrediction(data, predictHeaders, asyncMode);
         
-        const predictResponse = await fetch(`${API_BASE_URL}/predict`, {
-            method: 'POST',
-            headers: predictHeaders,
-            body: JSON.stringify({ 
-                filename: data.filename,
-                upload_id: data.upload_id 
-            }),
-            signal: predictController.signal
-        });
+        // 202 means a background job: model training (then retry) or async scoring
+        while (predictResponse.status === 202) {
+            const jobData = await predictResponse.json();
+            if (jobData.job_kind !== 'train') {
+                openPredictionJob(jobData.job_id, data.stats);
+                return;
+            }
+            if (progressSection) updateProgress(85, 'Training model...');
+            await waitForJob(jobData.job_id, predictHeaders);
+            predictResponse = await requestPrediction(data, predictHeaders, asyncMode);
+        }
         
-        clearTimeout(predictTimeoutId);
         if (progressSection) updateProgress(100, 'Complete!');
         
         const predictData = await predictResponse.json();
@@ -237,6 +239,62 @@ async function uploadFile(file) {
     }
 }
 
+// Request predictions for an uploaded file
+async function requestPrediction(uploadData, headers, asyncMode = false) {
+    // Use AbortController for timeout
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), 60000);
+    
+    try {
+        return await fetch(`${API_BASE_URL}/predict`, {
+            method: 'POST',
+            headers: headers,
+            body: JSON.stringify({ 
+                filename: uploadData.filename,
+                upload_id: uploadData.upload_id,
+                async: asyncMode
+            }),
+            signal: controller.signal
+        });
+    } finally {
+        clearTimeout(timeoutId);
+    }
+}
+
+// Hand a background prediction job over to the results page
+function openPredictionJob(jobId, stats) {
+    try {
+        sessionStorage.removeItem('predictionData');
+        sessionStorage.setItem('predictionJobId', String(jobId));
+        sessionStorage.setItem('uploadStats', JSON.stringify(stats));
+    } catch (e) {
+        console.warn('SessionStorage unavailable');
+    }
+    window.location.href = 'results.html';
+}
+
+// Poll a background job until it finishes
+async function waitForJob(jobId, headers, intervalMs = 2000) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { headers: headers });
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || 'Job status unavailable');
+        }
+        
+        const job = data.job;
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed' || job.status === 'cancelled') {
+            throw new Error(job.error || `Job ${job.status}`);
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Helper function for progress updates
 function updateProgress(percent, text) {
     if (progressFill) progressFill.style.width = `${percent}%`;
@@ -0,0 +1,316 @@
+"""
+ML pipeline benchmarks
+Times every stage of the pipeline (CSV parse, feature engineering, feature
+matrix, and training, prediction and serialize/load per model type, also in
+the flat inference format for forests) on seeded synthetic data, records the peak memory each stage allocates, and
+compares the results against a stored baseline.
+
+Usage (from the ml directory):
+    python -m benchmarks.run_benchmarks --sizes 1k,100k,1M
+    python -m benchmarks.run_benchmarks --update-baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ML_DIR not in sys.path:
+    sys.path.insert(0, ML_DIR)
+
+from benchmarks.synthetic import DEFAULT_SEED, write_posts_csv
+from trainings.feature_engineering import engineer_features
+from trainings.train_model import build_feature_matrix, train_models, export_models
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+
+DEFAULT_SIZES = '1k,10k,100k'
+MODEL_TYPES = ['linear', 'random_forest', 'hist_gradient_boosting']
+
+# A stage regresses when it is this much slower / larger than the baseline...
+TIME_THRESHOLD = 0.20
+MEMORY_THRESHOLD = 0.20
+# ...and the difference is above the noise floor
+MIN_SECONDS = 0.05
+MIN_BYTES = 1024 * 1024
+
+def parse_size(value):
+    """'10k' / '1M' / '2500' -> number of rows"""
+    value = value.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    number = value[:-1] if scale > 1 else value
+    return int(float(number) * scale)
+
+def measure(fn, memory=True):
+    """
+    Run fn once
+
+    Returns:
+        (result, seconds, peak bytes allocated while it ran or None)
+    """
+    if memory:
+        tracemalloc.start()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        result = fn()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - start_bytes if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+def _quiet(fn, *args, **kwargs):
+    """Call fn without its progress output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def benchmark_size(rows, seed=DEFAULT_SEED, repeat=1, model_types=MODEL_TYPES, memory=True, workdir=None):
+    """
+    Benchmark all pipeline stages on rows synthetic posts
+
+    Args:
+        rows: Number of posts
+        seed: Seed of the synthetic data
+        repeat: Runs per stage (the fastest time and largest peak are kept)
+        model_types: Model types trained, predicted and serialized
+        memory: Record peak memory with tracemalloc (slows stages down)
+        workdir: Directory for the CSV and model files (default: a temp dir)
+
+    Returns:
+        List of {'rows', 'stage', 'seconds', 'peak_bytes'} records (training
+        stages also hold the test metrics, serialize stages the artifact size;
+        *_flat_* stages measure the exported models)
+    """
+    records = []
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='ml-bench-')
+
+    def run(stage, fn, **extra):
+        best, peak, result = None, None, None
+        for _ in range(max(repeat, 1)):
+            result, seconds, stage_peak = measure(fn, memory)
+            best = seconds if best is None else min(best, seconds)
+            if stage_peak is not None:
+                peak = stage_peak if peak is None else max(peak, stage_peak)
+        record = {'rows': rows, 'stage': stage, 'seconds': best, 'peak_bytes': peak}
+        records.append(record)
+        print(f"  {rows:>10,}  {stage:<40} {best:9.3f}s" + (f"  {peak / 2**20:9.1f} MB" if peak is not None else ''))
+        return result, record
+
+    try:
+        csv_path = write_posts_csv(os.path.join(workdir, f'posts_{rows}.csv'), rows, seed)
+        df, _ = run('csv_parse', lambda: pd.read_csv(csv_path))
+        df_engineered, _ = run('engineer_features', lambda: engineer_features(df))
+        del df
+        X, _ = run('prepare_features', lambda: build_feature_matrix(df_engineered))
+
+        for model_type in model_types:
+            (models, metrics), record = run(f'train_{model_type}', lambda: _quiet(train_models, df_engineered, model_type))
+            record['metrics'] = {name: {k: float(v) for k, v in values.items()} for name, values in metrics.items()}
+            # Joint models are stored under their model type and predict every target
+            model = models.get(f'likes_{model_type}', models.get(model_type))
+            run(f'predict_{model_type}', lambda: model.predict(X))
+
+            model_path = os.path.join(workdir, f'models_{rows}_{model_type}.pkl')
+            _, record = run(f'serialize_{model_type}', lambda: joblib.dump(models, model_path))
+            record['artifact_bytes'] = os.path.getsize(model_path)
+            run(f'load_{model_type}', lambda: joblib.load(model_path))
+            
+            # Forests again in the flat inference format (memory-mapped on load)
+            flat_models, _ = run(f'export_{model_type}', lambda: export_models(models))
+            if all(flat_models[name] is models[name] for name in models):
+                del models
+                continue
+            flat_model = flat_models.get(f'likes_{model_type}', flat_models.get(model_type))
+            run(f'predict_flat_{model_type}', lambda: flat_model.predict(X))
+            flat_path = os.path.join(workdir, f'models_{rows}_{model_type}_flat.pkl')
+            _, record = run(f'serialize_flat_{model_type}', lambda: joblib.dump(flat_models, flat_path))
+            record['artifact_bytes'] = os.path.getsize(flat_path)
+            run(f'load_flat_{model_type}', lambda: joblib.load(flat_path, mmap_mode='r'))
+            del models, flat_models, flat_model
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return records
+
+def environment():
+    """Machine and library versions the results were measured with"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+def compare_results(results, baseline, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD,
+                    min_seconds=MIN_SECONDS, min_bytes=MIN_BYTES):
+    """
+    Stages that got slower or allocate more than in the baseline
+
+    Stages missing from the baseline are not compared.
+
+    Returns:
+        List of {'rows', 'stage', 'metric', 'baseline', 'current', 'change'}
+    """
+    reference = {(r['rows'], r['stage']): r for r in baseline.get('results', [])}
+    regressions = []
+    for record in results.get('results', []):
+        base = reference.get((record['rows'], record['stage']))
+        if base is None:
+            continue
+        for metric, threshold, floor in (('seconds', time_threshold, min_seconds),
+                                         ('peak_bytes', memory_threshold, min_bytes)):
+            old, new = base.get(metric), record.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append({
+                    'rows': record['rows'], 'stage': record['stage'], 'metric': metric,
+                    'baseline': old, 'current': new, 'change': new / old - 1 if old else None
+                })
+    return regressions
+
+def run_benchmarks(sizes, seed=DEFAULT_SEED, repeat=1, model_types=MODEL_TYPES, memory=True):
+    """
+    Benchmark every size
+
+    Returns:
+        Results document ({'created_at', 'seed', 'environment', 'results'})
+    """
+    records = []
+    for rows in sizes:
+        print(f"Benchmarking {rows:,} posts")
+        records.extend(benchmark_size(rows, seed, repeat, model_types, memory))
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'seed': seed,
+        'environment': environment(),
+        'results': records
+    }
+
+def model_comparison(results):
+    """
+    Per size and model type: fit time, predict latency, artifact size and accuracy
+
+    Returns:
+        List of {'rows', 'model_type', 'fit_seconds', 'predict_seconds',
+        'artifact_bytes', 'load_seconds', 'flat_predict_seconds',
+        'flat_artifact_bytes', 'flat_load_seconds', 'metrics'} (flat values
+        are None for models without a flat format)
+    """
+    stages = {(r['rows'], r['stage']): r for r in results['results']}
+    rows = []
+    for (size, stage), record in stages.items():
+        if not stage.startswith('train_'):
+            continue
+        model_type = stage[len('train_'):]
+        rows.append({
+            'rows': size,
+            'model_type': model_type,
+            'fit_seconds': record['seconds'],
+            'predict_seconds': stages.get((size, f'predict_{model_type}'), {}).get('seconds'),
+            'artifact_bytes': stages.get((size, f'serialize_{model_type}'), {}).get('artifact_bytes'),
+            'load_seconds': stages.get((size, f'load_{model_type}'), {}).get('seconds'),
+            'flat_predict_seconds': stages.get((size, f'predict_flat_{model_type}'), {}).get('seconds'),
+            'flat_artifact_bytes': stages.get((size, f'serialize_flat_{model_type}'), {}).get('artifact_bytes'),
+            'flat_load_seconds': stages.get((size, f'load_flat_{model_type}'), {}).get('seconds'),
+            'metrics': record.get('metrics', {})
+        })
+    return rows
+
+def _seconds(value):
+    return f"{value:8.3f}s" if value is not None else ''
+
+def _megabytes(value):
+    return f"{value / 2**20:8.1f} MB" if value is not None else ''
+
+def print_model_comparison(results):
+    print(f"\n  {'rows':>10}  {'model type':<24} {'fit':>9} {'predict':>9} {'artifact':>11} {'load':>9}"
+          f"  {'flat predict':>12} {'flat artifact':>13} {'flat load':>9}  likes R²")
+    for row in model_comparison(results):
+        r2 = next((m['r2'] for name, m in row['metrics'].items() if name.startswith('likes_')), None)
+        print(f"  {row['rows']:>10,}  {row['model_type']:<24} {row['fit_seconds']:8.2f}s"
+              f" {_seconds(row['predict_seconds']):>9} {_megabytes(row['artifact_bytes']):>11}"
+              f" {_seconds(row['load_seconds']):>9}  {_seconds(row['flat_predict_seconds']):>12}"
+              f" {_megabytes(row['flat_artifact_bytes']):>13} {_seconds(row['flat_load_seconds']):>9}"
+              + (f"  {r2:.4f}" if r2 is not None else ''))
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ML pipeline on synthetic data")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated post counts (e.g. 1k,100k,10M)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage (fastest is kept)")
+    parser.add_argument('--model-types', default=','.join(MODEL_TYPES))
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc (faster, no peak memory)")
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD)
+    parser.add_argument('--memory-threshold', type=float, default=MEMORY_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    model_types = [m.strip() for m in args.model_types.split(',') if m.strip()]
+    results = run_benchmarks(sizes, args.seed, args.repeat, model_types, memory=not args.no_memory)
+    print_model_comparison(results)
+    save_results(results, args.output)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        save_results(results, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --update-baseline)")
+        return 0
+
+    baseline = load_results(args.baseline)
+    if baseline.get('environment') != results['environment']:
+        print("Warning: the baseline was measured on a different machine or library versions")
+    regressions = compare_results(results, baseline, args.time_threshold, args.memory_threshold)
+    if not regressions:
+        print("No regressions against the baseline")
+        return 0
+
+    print(f"\n{len(regressions)} regression(s) against the baseline:")
+    for r in regressions:
+        if r['metric'] == 'seconds':
+            old, new = f"{r['baseline']:.3f}s", f"{r['current']:.3f}s"
+        else:
+            old, new = f"{r['baseline'] / 2**20:.1f} MB", f"{r['current'] / 2**20:.1f} MB"
+        change = f"+{r['change']:.0%}" if r['change'] is not None else ''
+        print(f"  {r['rows']:>10,}  {r['stage']:<40} {old} -> {new} {change}")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Seeded synthetic post data
+Generates posts with the schema of data/sample_social_media_data.csv at any
+size. Rows are produced in chunks, each drawn from its own generator seeded
+with (seed, chunk index), so the same seed always yields the same rows and
+10M-row files can be written without holding them in memory.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_ROWS = 500_000
+
+COLUMNS = [
+    'platform', 'post_date', 'post_time', 'content_type', 'caption_length', 'hashtags_count',
+    'likes', 'comments', 'shares', 'followers_at_post_time'
+]
+
+# Label, share of posts, follower base, likes multiplier
+PLATFORMS = [('Instagram', 0.45, 3500, 1.2), ('Facebook', 0.30, 5200, 0.8), ('LinkedIn', 0.25, 2800, 0.6)]
+CONTENT_TYPES = [('image', 0.40, 1.0), ('video', 0.30, 1.3), ('text', 0.25, 0.7), ('carousel', 0.05, 1.1)]
+
+START_DATE = '2024-01-01'
+SPAN_DAYS = 730
+
+# Posting hours (7:00-22:45) and how much each lifts likes
+_HOURS = np.arange(7, 23)
+_HOUR_WEIGHTS = np.exp(-((_HOURS - 18) ** 2) / 18.0)
+_TIMES = np.array([f'{h:02d}:{m:02d}:00' for h in _HOURS for m in (0, 15, 30, 45)])
+_DATES = pd.date_range(START_DATE, periods=SPAN_DAYS).strftime('%Y-%m-%d').to_numpy()
+
+def _choice(rng, options, size):
+    """Indices into options drawn with their share of posts"""
+    shares = np.array([option[1] for option in options])
+    return rng.choice(len(options), size=size, p=shares / shares.sum())
+
+def _chunk(rows, start, total, rng):
+    """Posts start..start+rows of a file with total posts"""
+    platform = _choice(rng, PLATFORMS, rows)
+    content_type = _choice(rng, CONTENT_TYPES, rows)
+
+    # Posts are spread evenly over the span in row order, like an export
+    day = (np.arange(start, start + rows, dtype=np.int64) * SPAN_DAYS) // max(total, 1)
+    time_index = rng.integers(0, len(_TIMES), rows)
+    hour_lift = _HOUR_WEIGHTS[time_index // 4]
+
+    base = np.array([p[2] for p in PLATFORMS])[platform]
+    followers = base * (1 + 0.6 * day / SPAN_DAYS) + rng.normal(0, 150, rows)
+    caption_length = np.clip(rng.normal(150, 45, rows), 10, 400).astype(np.int64)
+    hashtags_count = rng.integers(0, 10, rows)
+
+    expected = (
+        followers * 0.05
+        * np.array([p[3] for p in PLATFORMS])[platform]
+        * np.array([c[2] for c in CONTENT_TYPES])[content_type]
+        * (0.7 + 0.6 * hour_lift)
+        * (1 + 0.02 * hashtags_count)
+    )
+    likes = np.maximum(rng.normal(expected, expected * 0.15), 0)
+
+    return pd.DataFrame({
+        'platform': np.array([p[0] for p in PLATFORMS])[platform],
+        'post_date': _DATES[np.minimum(day, SPAN_DAYS - 1)],
+        'post_time': _TIMES[time_index],
+        'content_type': np.array([c[0] for c in CONTENT_TYPES])[content_type],
+        'caption_length': caption_length,
+        'hashtags_count': hashtags_count,
+        'likes': likes.astype(np.int64),
+        'comments': np.maximum(rng.normal(likes * 0.11, 5), 0).astype(np.int64),
+        'shares': np.maximum(rng.normal(likes * 0.05, 3), 0).astype(np.int64),
+        'followers_at_post_time': np.maximum(followers, 0).astype(np.int64)
+    }, columns=COLUMNS)
+
+def iter_posts(rows, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Generate synthetic posts chunk by chunk
+
+    Args:
+        rows: Total number of posts
+        seed: Random seed (same seed, same posts)
+        chunk_rows: Posts per chunk
+
+    Yields:
+        DataFrames of at most chunk_rows posts, in date order
+    """
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, index])
+        yield _chunk(min(chunk_rows, rows - start), start, rows, rng)
+
+def generate_posts(rows, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Synthetic posts as one DataFrame"""
+    chunks = list(iter_posts(rows, seed, chunk_rows))
+    if not chunks:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+def write_posts_csv(path, rows, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write synthetic posts to a CSV without holding them all in memory
+
+    Returns:
+        path
+    """
+    with open(path, 'w', newline='') as f:
+        header = True
+        for chunk in iter_posts(rows, seed, chunk_rows):
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            f.write(','.join(COLUMNS) + '\n')
+    return path
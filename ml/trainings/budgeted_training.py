@@ -0,0 +1,194 @@
+"""
+Time-budgeted model training
+Instead of fitting on every post, models are fitted on growing stratified
+samples (by platform and content type). Every step doubles the sample and
+(for forests) the number of trees and is scored on a fixed validation
+sample. Training stops when the validation error stops improving, when the
+next step is not expected to fit in the remaining wall-clock or CPU budget,
+or when the full data and tree count are reached. The best step's models are
+returned with a report of the chosen size.
+"""
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error
+from trainings.rolling import group_codes
+from trainings.train_model import prepare_features, build_feature_matrix, evaluate_model, hist_gradient_boosting
+
+BUDGETED_MODEL_TYPES = ('linear', 'random_forest', 'hist_gradient_boosting')
+
+# Samples are stratified by these columns (missing ones are ignored)
+STRATA_KEYS = ['platform', 'content_type']
+
+# Posts and trees of the first step; both double every step
+INITIAL_ROWS = 5_000
+INITIAL_TREES = 25
+MAX_TREES = 100
+GROWTH = 2
+
+# Validation sample: this share of the posts, at most VALIDATION_ROWS
+VALIDATION_FRACTION = 0.2
+VALIDATION_ROWS = 20_000
+
+# A step improving the validation MAE by less than this (relative) is a plateau
+PLATEAU_TOLERANCE = 0.01
+
+CLOCKS = {'wall': time.perf_counter, 'cpu': time.process_time}
+
+def stratified_order(df, keys=STRATA_KEYS, random_state=42):
+    """
+    Row order whose every prefix is a stratified sample
+
+    Rows are shuffled within their stratum and spread over the order by
+    their rank in it, so the first n rows hold every stratum in proportion
+    to its size.
+
+    Returns:
+        int64 array of row positions
+    """
+    rng = np.random.default_rng(random_state)
+    noise = rng.random(len(df))
+    codes = group_codes(df, keys)
+    counts = np.bincount(codes)
+    by_stratum = np.lexsort((noise, codes))
+    rank = np.empty(len(df), dtype=np.float64)
+    rank[by_stratum] = np.arange(len(df)) - np.repeat(np.cumsum(counts) - counts, counts)
+    position = (rank + 0.5) / counts[codes]
+    return np.lexsort((noise, position))
+
+def _estimator(model_type, rows, trees):
+    if model_type == 'random_forest':
+        return RandomForestRegressor(n_estimators=trees, max_depth=10, random_state=42, n_jobs=-1)
+    if model_type == 'hist_gradient_boosting':
+        return hist_gradient_boosting(rows)
+    return LinearRegression()
+
+def _schedule(pool_rows, model_type, initial_rows, initial_trees, max_trees, growth):
+    """(rows, trees) of every step until the full pool and tree count are reached"""
+    steps = []
+    rows, trees = min(initial_rows, pool_rows), initial_trees if model_type == 'random_forest' else None
+    while True:
+        steps.append((rows, trees))
+        if rows == pool_rows and (trees is None or trees == max_trees):
+            return steps
+        rows = min(rows * growth, pool_rows)
+        if trees is not None:
+            trees = min(trees * growth, max_trees)
+
+def train_models_budgeted(df, model_type='random_forest', budget_seconds=60.0, clock='wall',
+                          initial_rows=INITIAL_ROWS, initial_trees=INITIAL_TREES, max_trees=MAX_TREES,
+                          growth=GROWTH, tolerance=PLATEAU_TOLERANCE, random_state=42):
+    """
+    Train the likes and follower growth models within a time budget
+
+    Args:
+        df: Preprocessed DataFrame with features
+        model_type: 'linear', 'random_forest' or 'hist_gradient_boosting'
+        budget_seconds: Time budget (the first step always runs)
+        clock: 'wall' (elapsed seconds) or 'cpu' (CPU seconds of this process)
+        initial_rows / initial_trees: Sample size and trees of the first step
+        max_trees: Trees of a full forest
+        growth: Factor the sample and trees grow by every step
+        tolerance: Relative validation MAE improvement below which training stops
+        random_state: Seed of the sample order
+
+    Returns:
+        (models, metrics, report): models and validation metrics keyed like
+        train_models(); report holds the chosen 'rows' and 'trees', the
+        'seconds' spent, why training 'stopped' ('plateau', 'budget' or
+        'complete') and every step
+
+    Raises:
+        ValueError: for unsupported model types or clocks, data without
+            features or likes
+    """
+    if model_type not in BUDGETED_MODEL_TYPES:
+        raise ValueError(f"Budgeted training supports {', '.join(BUDGETED_MODEL_TYPES)}, not {model_type}")
+    if clock not in CLOCKS:
+        raise ValueError(f"Clock must be one of {', '.join(CLOCKS)}, not {clock}")
+    now = CLOCKS[clock]
+    start = now()
+
+    feature_cols = prepare_features(df)
+    if len(feature_cols) == 0:
+        raise ValueError("No valid features found in data")
+    if 'likes' not in df.columns:
+        raise ValueError("Target column 'likes' not found in data")
+
+    X = build_feature_matrix(df, feature_cols)
+    targets = {'likes': df['likes']}
+    if 'follower_growth' in df.columns:
+        targets['follower_growth'] = df['follower_growth']
+    Y = {
+        target: pd.to_numeric(values, errors='coerce').replace([np.inf, -np.inf], 0).fillna(0).to_numpy(dtype=np.float64)
+        for target, values in targets.items()
+    }
+
+    # Fixed validation sample; the rest is the pool the training samples grow in
+    order = stratified_order(df, random_state=random_state)
+    validation_rows = min(VALIDATION_ROWS, int(len(df) * VALIDATION_FRACTION))
+    if len(df) > 5 and validation_rows > 0:
+        validation, pool = order[:validation_rows], order[validation_rows:]
+    else:
+        validation, pool = order, order
+    X_validation = X.iloc[validation]
+
+    steps = []
+    best = None
+    stopped = 'complete'
+    for rows, trees in _schedule(len(pool), model_type, initial_rows, initial_trees, max_trees, growth):
+        spent = now() - start
+        if steps:
+            # Fit time grows linearly with the sample and the trees
+            last = steps[-1]
+            estimate = last['seconds'] * rows / last['rows'] * (trees / last['trees'] if trees else 1)
+            if spent + estimate > budget_seconds:
+                stopped = 'budget'
+                break
+
+        step_start = now()
+        sample = pool[:rows]
+        X_train = X.iloc[sample]
+        models = {}
+        for target, y in Y.items():
+            y_train = y[sample]
+            # Like train_models, no growth model when growth is always 0
+            if target != 'likes' and not (y_train != 0).any():
+                continue
+            model = _estimator(model_type, rows, trees)
+            model.fit(X_train, y_train)
+            models[f'{target}_{model_type}'] = model
+        mae = mean_absolute_error(Y['likes'][validation], models[f'likes_{model_type}'].predict(X_validation))
+        steps.append({'rows': int(rows), 'trees': trees, 'seconds': now() - step_start, 'mae': float(mae)})
+        print(f"  step {len(steps)}: {rows:,} posts" + (f", {trees} trees" if trees else '')
+              + f", validation MAE {mae:.2f} ({steps[-1]['seconds']:.1f}s)")
+
+        improved = best is None or mae < best[1]
+        if improved:
+            previous = best[1] if best is not None else None
+            best = (models, mae, rows, trees)
+        if len(steps) > 1 and (not improved or (previous - mae) / max(previous, 1e-12) < tolerance):
+            stopped = 'plateau'
+            break
+
+    models, _, rows, trees = best
+    metrics = {}
+    for name, model in models.items():
+        target = name[:-len(model_type) - 1]
+        print(f"\n=== Budgeted {name} ===")
+        metrics[name] = evaluate_model(Y[target][validation], model.predict(X_validation))
+
+    report = {
+        'budget_seconds': float(budget_seconds),
+        'clock': clock,
+        'seconds': float(now() - start),
+        'stopped': stopped,
+        'rows': int(rows),
+        'trees': trees,
+        'total_rows': int(len(df)),
+        'validation_rows': int(len(validation)),
+        'steps': steps
+    }
+    return models, metrics, report
@@ -0,0 +1,124 @@
+"""
+Compact frame representation
+Engineered frames keep platform and content type as pandas Categoricals,
+encode them against one persisted vocabulary (categories.json) and downcast
+numeric features to the smallest dtype that holds them (int8 for calendar
+and encoded columns, int32 for counts, float32 for rates and averages).
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'categories.json')
+
+# Raw label columns kept as Categoricals
+CATEGORICAL_COLUMNS = ['platform', 'content_type']
+
+# Target dtype of every engineered numeric column
+COMPACT_DTYPES = {
+    'posting_hour': np.int8,
+    'posting_day': np.int8,
+    'month': np.int8,
+    'day_of_month': np.int8,
+    'is_weekend': np.int8,
+    'platform_encoded': np.int8,
+    'content_type_encoded': np.int8,
+    'platform_content_interaction': np.int8,
+    'hour_platform_interaction': np.int16,
+    'likes': np.int32,
+    'comments': np.int32,
+    'shares': np.int32,
+    'caption_length': np.int32,
+    'hashtags_count': np.int32,
+    'followers_at_post_time': np.int32,
+    'followers': np.int32,
+    'engagement_rate': np.float32,
+    'rolling_avg_likes': np.float32,
+    'rolling_avg_engagement': np.float32,
+    'follower_growth': np.float32
+}
+
+def load_vocabulary(path=VOCABULARY_PATH):
+    """
+    Load the category vocabulary
+
+    Returns:
+        Dictionary mapping each categorical column to its ordered labels (the
+        position of a label is its code)
+    """
+    with open(path) as fh:
+        vocabulary = json.load(fh)
+    return {column: list(labels) for column, labels in vocabulary.items() if column != 'version'}
+
+VOCABULARY = load_vocabulary()
+
+def category_map(column):
+    """Label -> code mapping of a vocabulary column"""
+    return {label: code for code, label in enumerate(VOCABULARY[column])}
+
+def encode_category(values, column):
+    """
+    Vocabulary codes of labels (case-insensitive)
+
+    Each distinct label is looked up once; labels outside the vocabulary and
+    missing values get code 0.
+
+    Returns:
+        int8 Series aligned with values
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    labels = pd.Index(uniques).astype(str).str.lower()
+    lookup = np.append(pd.Index(VOCABULARY[column]).get_indexer(labels), -1)
+    encoded = lookup[codes]
+    return pd.Series(np.where(encoded >= 0, encoded, 0).astype(np.int8), index=values.index)
+
+def _downcast(series, dtype):
+    """Series as dtype when every value fits (missing values fall back to an exact float32)"""
+    dtype = np.dtype(dtype)
+    if series.dtype == dtype or not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if dtype.kind == 'f':
+        return series.astype(dtype)
+    values = series.to_numpy(dtype=np.float64)
+    if not np.isfinite(values).all():
+        # float32 holds every integer up to 2**24 exactly
+        exact = np.nanmax(np.abs(values), initial=0) < 2 ** 24 if not np.isinf(values).any() else False
+        return series.astype(np.float32) if exact else series
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max or not np.array_equal(values, np.round(values))):
+        return series
+    return series.astype(dtype)
+
+def compact_frame(df):
+    """
+    Convert an engineered frame to its compact dtypes (in place)
+
+    Returns:
+        The same DataFrame
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns:
+            df[col] = _downcast(df[col], dtype)
+    return df
+
+def frame_memory(df):
+    """
+    Deep memory usage of a frame (object strings included)
+
+    Returns:
+        Dictionary with the total bytes and the bytes of each column
+    """
+    usage = df.memory_usage(deep=True)
+    return {
+        'total': int(usage.sum()),
+        'columns': {str(col): int(size) for col, size in usage.items() if col != 'Index'}
+    }
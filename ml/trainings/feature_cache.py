@@ -0,0 +1,170 @@
+"""
+Versioned cache for engineered feature matrices
+Stores the final float32 matrix X per upload, keyed by the upload's row count
+and a fingerprint of the feature-engineering code, so entries invalidate
+themselves when posts are appended or the code changes - in every process,
+not only the one that changed the upload.
+"""
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Bump to invalidate every cached matrix even if the source is unchanged
+FEATURE_PIPELINE_VERSION = 2
+
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+def pipeline_modules():
+    """Modules whose source defines the feature matrix"""
+    from trainings import compact, feature_engineering, parallel_features, rolling, timestamps, train_model
+    return [compact, feature_engineering, parallel_features, rolling, timestamps,
+            train_model.prepare_features, train_model.build_feature_matrix]
+
+_fingerprint = None
+
+def pipeline_fingerprint():
+    """Hash of the feature pipeline version, source code and category vocabulary"""
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256(str(FEATURE_PIPELINE_VERSION).encode())
+        for obj in pipeline_modules():
+            digest.update(inspect.getsource(obj).encode())
+        from trainings.compact import VOCABULARY
+        digest.update(json.dumps(VOCABULARY, sort_keys=True).encode())
+        _fingerprint = digest.hexdigest()[:16]
+    return _fingerprint
+
+class FeatureCache:
+    """
+    Two-tier (memory LRU + disk) cache of feature matrices
+
+    Args:
+        cache_dir: Directory for the on-disk tier
+        memory_bytes: Budget of the in-memory LRU tier
+        disk_bytes: Budget of the on-disk tier; least recently used files are
+            removed first when it is exceeded
+    """
+
+    def __init__(self, cache_dir, memory_bytes=DEFAULT_MEMORY_BYTES, disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, upload_id, rows):
+        return f"upload{upload_id}-{int(rows)}-{pipeline_fingerprint()}"
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.npy', base + '.json'
+
+    def get(self, upload_id, rows):
+        """Return (X, feature_names) for an upload of rows posts, or None on a miss"""
+        key = self._key(upload_id, rows)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0].shape[0] == rows:
+                self._memory.move_to_end(key)
+                return entry
+
+        matrix_path, names_path = self._paths(key)
+        try:
+            with open(names_path) as fh:
+                feature_names = json.load(fh)
+            X = np.load(matrix_path, mmap_mode='r')
+            os.utime(matrix_path)
+        except (OSError, ValueError):
+            return None
+        if X.shape[0] != rows:
+            return None
+
+        entry = (X, feature_names)
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, upload_id, X, feature_names):
+        """Store the feature matrix of an upload in both tiers"""
+        X = np.ascontiguousarray(X)
+        key = self._key(upload_id, X.shape[0])
+        feature_names = list(feature_names)
+        matrix_path, names_path = self._paths(key)
+
+        # Write atomically so concurrent readers never see partial files; temp
+        # names are unique per process and thread so concurrent writers don't collide
+        suffix = f"{os.getpid()}-{threading.get_ident()}.tmp"
+        tmp_matrix = f"{matrix_path}.{suffix}.npy"
+        tmp_names = f"{names_path}.{suffix}"
+        np.save(tmp_matrix, X)
+        with open(tmp_names, 'w') as fh:
+            json.dump(feature_names, fh)
+        os.replace(tmp_names, names_path)
+        os.replace(tmp_matrix, matrix_path)
+
+        with self._lock:
+            self._remember(key, (X, feature_names))
+        self._drop_stale(upload_id, key)
+        self._evict_disk()
+
+    def invalidate(self, upload_id):
+        """Remove every cached version for an upload"""
+        self._drop_stale(upload_id, keep=None)
+
+    def _remember(self, key, entry):
+        """Insert into the memory tier, evicting least recently used entries"""
+        if key in self._memory:
+            self._memory_used -= self._memory.pop(key)[0].nbytes
+        size = entry[0].nbytes
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, (old_X, _) = self._memory.popitem(last=False)
+            self._memory_used -= old_X.nbytes
+
+    def _drop_stale(self, upload_id, keep):
+        """Delete entries of an upload built for other row counts or pipeline versions"""
+        prefix = f"upload{upload_id}-"
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefix) and k != keep]:
+                self._memory_used -= self._memory.pop(key)[0].nbytes
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and not name.startswith(f"{keep}."):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def _evict_disk(self):
+        """Remove least recently used matrices until the disk budget is met"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy') or '.tmp' in name:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            for stale in (path, path[:-len('.npy')] + '.json'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
@@ -3,71 +3,82 @@ Advanced Feature Engineering for Social Media Post Performance Prediction
 """
 import pandas as pd
 import numpy as np
+import math
 from datetime import datetime
+from trainings.timestamps import parse_datetime, parse_time_of_day, parse_post_datetime, hour_of_day
+from trainings.rolling import RollingWindows, group_codes, window_label
+from trainings.compact import category_map, encode_category, compact_frame
 
-def engineer_features(df):
+# Posts covered by the rolling averages (a number of posts, or a calendar span such as '7D')
+ROLLING_WINDOW = 7
+
+# Rolling averages and follower growth are computed per group of these columns
+# (the ones present in the data), e.g. per account and platform
+GROUP_KEYS = ['account_id', 'platform']
+
+DATE_COLUMNS = ['post_date', 'date', 'timestamp', 'datetime', 'created_at']
+
+# Lowercase label -> code, from the persisted category vocabulary
+PLATFORM_MAP = category_map('platform')
+CONTENT_TYPE_MAP = category_map('content_type')
+
+def find_date_column(df):
+    """Return the first recognised date column of a DataFrame, if any"""
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            return col
+    return None
+
+def find_followers_column(df):
+    """Return the follower count column of a DataFrame, if any"""
+    if 'followers_at_post_time' in df.columns:
+        return 'followers_at_post_time'
+    elif 'followers' in df.columns:
+        return 'followers'
+    return None
+
+def parse_post_time_hour(post_time):
+    """Hour of 'HH:MM[:SS]' post times (NaN where a time cannot be parsed)"""
+    return hour_of_day(parse_time_of_day(post_time))
+
+def add_post_features(df_processed):
     """
-    Perform advanced feature engineering on social media post data
+    Add the per-post features (time, encodings, caption, hashtags) in place
+    These only depend on the row itself, not on the posting history.
     
-    Args:
-        df: DataFrame with raw social media post data
-        
     Returns:
-        DataFrame with engineered features
+        Name of the parsed date column (or None)
     """
-    df_processed = df.copy()
-    
     # ========== DATE/TIME FEATURES ==========
     # Parse post_date and post_time
-    date_col = None
-    for col in ['post_date', 'date', 'timestamp', 'datetime', 'created_at']:
-        if col in df_processed.columns:
-            date_col = col
-            break
+    date_col = find_date_column(df_processed)
     
     if date_col:
-        df_processed[date_col] = pd.to_datetime(df_processed[date_col], errors='coerce')
+        df_processed[date_col] = parse_datetime(df_processed[date_col], date_col)
+        
+        # A separate post_time column is fused with the date (rows whose time
+        # cannot be parsed keep the hour of their date)
+        posted = df_processed[date_col]
+        if 'post_time' in df_processed.columns:
+            posted = parse_post_datetime(posted, df_processed['post_time'])
         
         # Extract time features
-        df_processed['posting_hour'] = df_processed[date_col].dt.hour
+        df_processed['posting_hour'] = posted.dt.hour
         df_processed['posting_day'] = df_processed[date_col].dt.dayofweek  # 0=Monday, 6=Sunday
         df_processed['month'] = df_processed[date_col].dt.month
         df_processed['day_of_month'] = df_processed[date_col].dt.day
         df_processed['is_weekend'] = (df_processed['posting_day'] >= 5).astype(int)
     
-    # If separate post_time column exists
-    if 'post_time' in df_processed.columns:
-        try:
-            time_parts = df_processed['post_time'].astype(str).str.split(':')
-            df_processed['posting_hour'] = time_parts.str[0].astype(int)
-        except:
-            pass
+    elif 'post_time' in df_processed.columns:
+        df_processed['posting_hour'] = parse_post_time_hour(df_processed['post_time'])
     
     # ========== PLATFORM ENCODING ==========
     if 'platform' in df_processed.columns:
-        platform_map = {
-            'instagram': 0,
-            'facebook': 1,
-            'linkedin': 2,
-            'Instagram': 0,
-            'Facebook': 1,
-            'LinkedIn': 2
-        }
-        df_processed['platform_encoded'] = df_processed['platform'].str.lower().map(platform_map).fillna(0).astype(int)
+        df_processed['platform_encoded'] = encode_category(df_processed['platform'], 'platform')
     
     # ========== CONTENT TYPE ENCODING ==========
     if 'content_type' in df_processed.columns:
-        content_map = {
-            'image': 0,
-            'video': 1,
-            'carousel': 2,
-            'text': 3,
-            'Image': 0,
-            'Video': 1,
-            'Carousel': 2,
-            'Text': 3
-        }
-        df_processed['content_type_encoded'] = df_processed['content_type'].str.lower().map(content_map).fillna(0).astype(int)
+        df_processed['content_type_encoded'] = encode_category(df_processed['content_type'], 'content_type')
     
     # ========== CAPTION FEATURES ==========
     if 'caption_length' not in df_processed.columns:
@@ -85,15 +96,24 @@ def engineer_features(df):
         else:
             df_processed['hashtags_count'] = 0
     
-    # ========== ENGAGEMENT FEATURES ==========
-    # Calculate engagement rate
-    if 'followers_at_post_time' in df_processed.columns:
-        followers_col = 'followers_at_post_time'
-    elif 'followers' in df_processed.columns:
-        followers_col = 'followers'
-    else:
-        followers_col = None
+    return date_col
+
+def add_interaction_features(df_processed):
+    """Add platform/content/time interaction features in place"""
+    # Platform x Content Type interaction
+    if 'platform_encoded' in df_processed.columns and 'content_type_encoded' in df_processed.columns:
+        df_processed['platform_content_interaction'] = (
+            df_processed['platform_encoded'].astype(np.int16) * 10 + df_processed['content_type_encoded']
+        )
     
+    # Time x Platform interaction
+    if 'posting_hour' in df_processed.columns and 'platform_encoded' in df_processed.columns:
+        df_processed['hour_platform_interaction'] = (
+            df_processed['posting_hour'] * 10 + df_processed['platform_encoded']
+        )
+
+def add_engagement_rate(df_processed, followers_col):
+    """Add (likes + comments + shares) / followers in place (0 without followers)"""
     if followers_col:
         # Engagement rate = (likes + comments + shares) / followers
         total_engagement = (
@@ -109,28 +129,118 @@ def engineer_features(df):
         df_processed['engagement_rate'] = df_processed['engagement_rate'].fillna(0)
     else:
         df_processed['engagement_rate'] = 0
+
+def sort_by_date(df_processed, date_col):
+    """Order posts by date; the sort is stable so ties keep their file order"""
+    return df_processed.sort_values(date_col, kind='stable').reset_index(drop=True)
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    """
+    Mean of the non-missing values among each row and the window-1 rows before it
+    
+    Integer-valued data is summed exactly (int64 prefix sums) and other values
+    window by window (not with a running sum), so a row's value depends only on
+    the rows in its window. This is what lets appended posts be
+    engineered from the stored tail of the history.
+    
+    Returns:
+        float64 array (NaN where the whole window is missing)
+    """
+    return RollingWindows(np.zeros(len(values), dtype=np.int64), window=window).mean(values)
+
+def rolling_windows(df_processed, date_col, group_keys=GROUP_KEYS, window=ROLLING_WINDOW):
+    """Rolling window layout of date-sorted posts, split by the group keys present"""
+    return RollingWindows(group_codes(df_processed, group_keys), df_processed[date_col], window)
+
+def add_history_features(df_processed, followers_col, windows, likes_mean):
+    """
+    Add rolling averages and follower growth to date-sorted posts in place
+    
+    Args:
+        df_processed: Date-sorted posts with engagement_rate
+        followers_col: Follower count column (or None)
+        windows: RollingWindows of the posts
+        likes_mean: Fill value for rolling likes windows without any likes
+        
+    Returns:
+        Rolling likes before filling (None without a likes column)
+    """
+    # Rolling average of likes (per group)
+    rolling_likes = None
+    if 'likes' in df_processed.columns:
+        rolling_likes = windows.mean(df_processed['likes'])
+        df_processed['rolling_avg_likes'] = pd.Series(rolling_likes, index=df_processed.index).fillna(likes_mean)
+    
+    # Rolling average of engagement rate
+    df_processed['rolling_avg_engagement'] = pd.Series(
+        windows.mean(df_processed['engagement_rate']), index=df_processed.index
+    ).fillna(0)
+    
+    # Calculate follower growth (against the group's previous post)
+    if followers_col:
+        df_processed['follower_growth'] = pd.Series(
+            windows.diff(df_processed[followers_col]), index=df_processed.index
+        ).fillna(0)
+    
+    return rolling_likes
+
+def normalize_numeric_features(df_processed, followers_col):
+    """Coerce count columns to integers, replace infinite values and compact the dtypes"""
+    # Fill missing values
+    numeric_cols = ['likes', 'comments', 'shares', 'caption_length', 'hashtags_count']
+    for col in numeric_cols:
+        if col in df_processed.columns:
+            df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0).astype(int)
+    
+    if followers_col:
+        df_processed[followers_col] = pd.to_numeric(df_processed[followers_col], errors='coerce').fillna(0).astype(int)
+    
+    # Replace infinite values (only float columns can hold them)
+    for col in df_processed.columns:
+        if pd.api.types.is_float_dtype(df_processed[col].dtype):
+            infinite = np.isinf(df_processed[col].to_numpy())
+            if infinite.any():
+                df_processed[col] = df_processed[col].mask(infinite, 0)
+    
+    return compact_frame(df_processed)
+
+def engineer_features(df, return_state=False, group_keys=GROUP_KEYS, window=ROLLING_WINDOW):
+    """
+    Perform advanced feature engineering on social media post data
+    
+    Args:
+        df: DataFrame with raw social media post data
+        return_state: Also return the rolling-window state needed to engineer
+            appended posts with engineer_features_incremental()
+        group_keys: Columns whose groups (e.g. account x platform) get their
+            own rolling averages and follower growth; missing ones are ignored
+        window: Rolling window, in posts (int) or calendar time ('7D')
+        
+    Returns:
+        DataFrame with engineered features, or (DataFrame, state or None)
+        when return_state is set
+    """
+    df_processed = df.copy()
+    state = None
+    
+    date_col = add_post_features(df_processed)
+    
+    # ========== ENGAGEMENT FEATURES ==========
+    # Calculate engagement rate
+    followers_col = find_followers_column(df_processed)
+    add_engagement_rate(df_processed, followers_col)
     
     # ========== ROLLING AVERAGES ==========
     # Sort by date for rolling calculations
     if date_col and len(df_processed) > 1:
-        df_processed = df_processed.sort_values(date_col).reset_index(drop=True)
-        
-        # Rolling average of likes (7-day window)
-        if 'likes' in df_processed.columns:
-            df_processed['rolling_avg_likes'] = df_processed['likes'].rolling(
-                window=min(7, len(df_processed)), 
-                min_periods=1
-            ).mean().fillna(df_processed['likes'].mean() if 'likes' in df_processed.columns else 0)
+        df_processed = sort_by_date(df_processed, date_col)
+        windows = rolling_windows(df_processed, date_col, group_keys, window)
+        likes_mean = df_processed['likes'].mean() if 'likes' in df_processed.columns else None
+        rolling_likes = add_history_features(df_processed, followers_col, windows, likes_mean)
         
-        # Rolling average of engagement rate
-        df_processed['rolling_avg_engagement'] = df_processed['engagement_rate'].rolling(
-            window=min(7, len(df_processed)),
-            min_periods=1
-        ).mean().fillna(0)
-        
-        # Calculate follower growth
-        if followers_col:
-            df_processed['follower_growth'] = df_processed[followers_col].diff().fillna(0)
+        if return_state:
+            state = _history_state(df, df_processed, date_col, followers_col, rolling_likes,
+                                   windows, group_keys, window)
     else:
         if 'likes' in df_processed.columns:
             df_processed['rolling_avg_likes'] = df_processed['likes'].mean()
@@ -140,30 +250,203 @@ def engineer_features(df):
         df_processed['follower_growth'] = 0
     
     # ========== INTERACTION FEATURES ==========
-    # Platform x Content Type interaction
-    if 'platform_encoded' in df_processed.columns and 'content_type_encoded' in df_processed.columns:
-        df_processed['platform_content_interaction'] = (
-            df_processed['platform_encoded'] * 10 + df_processed['content_type_encoded']
-        )
-    
-    # Time x Platform interaction
-    if 'posting_hour' in df_processed.columns and 'platform_encoded' in df_processed.columns:
-        df_processed['hour_platform_interaction'] = (
-            df_processed['posting_hour'] * 10 + df_processed['platform_encoded']
-        )
+    add_interaction_features(df_processed)
     
     # ========== NORMALIZE NUMERIC FEATURES ==========
-    # Fill missing values
-    numeric_cols = ['likes', 'comments', 'shares', 'caption_length', 'hashtags_count']
-    for col in numeric_cols:
-        if col in df_processed.columns:
-            df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0).astype(int)
+    df_processed = normalize_numeric_features(df_processed, followers_col)
     
-    if followers_col:
-        df_processed[followers_col] = pd.to_numeric(df_processed[followers_col], errors='coerce').fillna(0).astype(int)
+    if return_state:
+        return df_processed, state
+    return df_processed
+
+def engineer_post_features(df):
+    """
+    Engineer features for independent (e.g. draft) posts
     
-    # Replace infinite values
-    df_processed = df_processed.replace([np.inf, -np.inf], 0)
+    Per-post features are computed exactly as in engineer_features. Features
+    that depend on posting history (engagement rate, rolling averages,
+    follower growth) cannot be derived from a single draft, so they are taken
+    from the input when supplied and default to 0. Rows are never sorted or
+    mixed with each other.
     
-    return df_processed
+    Args:
+        df: DataFrame with one draft post per row
+        
+    Returns:
+        DataFrame with engineered features, in input order
+    """
+    df_processed = df.copy()
+    add_post_features(df_processed)
+    
+    for col in ['engagement_rate', 'rolling_avg_likes', 'rolling_avg_engagement', 'follower_growth']:
+        if col not in df_processed.columns:
+            df_processed[col] = 0
+        df_processed[col] = pd.to_numeric(df_processed[col], errors='coerce').fillna(0)
+    
+    add_interaction_features(df_processed)
+    return normalize_numeric_features(df_processed, find_followers_column(df_processed))
+
+# ========== INCREMENTAL FEATURE ENGINEERING ==========
+
+# Bump when the layout of the persisted feature state changes
+FEATURE_STATE_VERSION = 3
+
+class IncrementalUnsupported(ValueError):
+    """Raised when appended posts cannot be engineered exactly from the stored state"""
+
+def _json_float(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def _json_value(value):
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
 
+def _state_floats(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def _rolling_frame(df_processed, date_col, followers_col, group_keys):
+    """Columns the rolling features are computed from (dates as UTC datetime64)"""
+    columns = {date_col: df_processed[date_col].to_numpy(dtype='datetime64[ns]')}
+    for key in group_keys:
+        columns[key] = df_processed[key].to_numpy()
+    for col in ['likes', 'engagement_rate', followers_col]:
+        if col and col in df_processed.columns:
+            columns[col] = df_processed[col].to_numpy(dtype=np.float64)
+    return pd.DataFrame(columns)
+
+def _build_state(columns, rows, date_col, followers_col, group_keys, window, tail):
+    """State dictionary from the (date-ordered) posts later posts can still see"""
+    return {
+        'version': FEATURE_STATE_VERSION,
+        'columns': list(columns),
+        'rows': int(rows),
+        'date_col': date_col,
+        'followers_col': followers_col,
+        'group_keys': list(group_keys),
+        'window': window_label(window),
+        'last_date': int(tail[date_col].iloc[-1].value),
+        'tail': {
+            col: (tail[col].astype(np.int64).tolist() if col == date_col
+                  else [_json_value(v) for v in tail[col]] if col in group_keys
+                  else [_json_float(v) for v in tail[col]])
+            for col in tail.columns
+        }
+    }
+
+def _tail_frame(state):
+    """Rolling frame of the posts stored in a state"""
+    tail = pd.DataFrame(state['tail'])
+    date_col = state['date_col']
+    tail[date_col] = pd.to_datetime(tail[date_col].astype(np.int64))
+    for col in tail.columns:
+        if col != date_col and col not in state['group_keys']:
+            tail[col] = _state_floats(tail[col])
+    return tail
+
+def _history_state(df, df_processed, date_col, followers_col, rolling_likes, windows, group_keys, window):
+    """
+    Rolling-window state of a date-sorted history (before normalization)
+    
+    The state keeps the posts that later posts of the same group can still
+    see (the last window of every group), so its size grows with the number
+    of groups, not with the history.
+    
+    None if appends to it can never be engineered incrementally: missing dates,
+    or rolling averages filled with the history-wide mean.
+    """
+    if df_processed[date_col].isna().any():
+        return None
+    if rolling_likes is not None and np.isnan(rolling_likes).any():
+        return None
+    
+    keys = [key for key in group_keys if key in df_processed.columns]
+    frame = _rolling_frame(df_processed, date_col, followers_col, keys)
+    return _build_state(
+        df.columns, len(df_processed), date_col, followers_col, keys, window,
+        tail=frame[windows.tail(frame[date_col])].reset_index(drop=True)
+    )
+
+def engineer_features_incremental(df_new, state):
+    """
+    Engineer features for posts appended to a history, using only its state
+    
+    Appending the returned rows to the engineered history gives exactly what
+    engineer_features() returns for the whole history plus the new posts
+    (with the group keys and window the state was built with), so the cost is
+    proportional to the new posts only.
+    
+    Args:
+        df_new: DataFrame with the new raw posts (same columns as the history)
+        state: State from engineer_features(..., return_state=True) or a
+            previous incremental call
+        
+    Returns:
+        (DataFrame with engineered features for the new posts, updated state)
+        
+    Raises:
+        IncrementalUnsupported: when the result could differ from a full
+            recomputation (e.g. posts dated before the end of the history);
+            callers should fall back to engineer_features on everything
+    """
+    if not state or state.get('version') != FEATURE_STATE_VERSION:
+        raise IncrementalUnsupported("No feature state for this history")
+    if list(df_new.columns) != state['columns']:
+        raise IncrementalUnsupported("New posts have different columns than the history")
+    if len(df_new) == 0:
+        raise IncrementalUnsupported("No new posts")
+    
+    date_col = state['date_col']
+    group_keys = state['group_keys']
+    
+    df_processed = df_new.copy()
+    add_post_features(df_processed)
+    
+    dates = df_processed[date_col]
+    if dates.isna().any():
+        raise IncrementalUnsupported("New posts have missing or invalid dates")
+    if dates.min().value < state['last_date']:
+        raise IncrementalUnsupported("New posts are dated before the end of the history")
+    
+    # ========== ENGAGEMENT FEATURES ==========
+    followers_col = find_followers_column(df_processed)
+    add_engagement_rate(df_processed, followers_col)
+    
+    # ========== ROLLING AVERAGES ==========
+    # The history ends before every new post, so its tail precedes them after sorting
+    df_processed = sort_by_date(df_processed, date_col)
+    history = _tail_frame(state)
+    combined = pd.concat(
+        [history, _rolling_frame(df_processed, date_col, followers_col, group_keys)],
+        ignore_index=True
+    )
+    windows = rolling_windows(combined, date_col, group_keys, state['window'])
+    start = len(history)
+    
+    if 'likes' in df_processed.columns:
+        rolling_likes = windows.mean(combined['likes'])[start:]
+        if np.isnan(rolling_likes).any():
+            # Filled with the mean over all posts, which also changes earlier rows
+            raise IncrementalUnsupported("Rolling likes window without any likes")
+        df_processed['rolling_avg_likes'] = rolling_likes
+    
+    df_processed['rolling_avg_engagement'] = pd.Series(
+        windows.mean(combined['engagement_rate'])[start:]
+    ).fillna(0)
+    
+    if followers_col:
+        df_processed['follower_growth'] = pd.Series(windows.diff(combined[followers_col])[start:]).fillna(0)
+    
+    new_state = _build_state(
+        state['columns'], state['rows'] + len(df_new), date_col, followers_col, group_keys, state['window'],
+        tail=combined[windows.tail(combined[date_col])].reset_index(drop=True)
+    )
+    
+    # ========== INTERACTION FEATURES ==========
+    add_interaction_features(df_processed)
+    
+    # ========== NORMALIZE NUMERIC FEATURES ==========
+    df_processed = normalize_numeric_features(df_processed, followers_col)
+    
+    return df_processed, new_state
@@ -0,0 +1,245 @@
+"""
+Flat tree ensembles for inference
+A fitted forest is flattened into a handful of contiguous arrays: split
+feature, threshold and children of every node plus the leaf values. The
+evaluator routes all rows through all trees at once with numpy, one tree
+level per step, so no sklearn objects are unpickled or kept resident and the
+arrays can be memory-mapped (joblib.load(path, mmap_mode='r')).
+
+Thresholds are stored as float64 (identical to sklearn), float32 (rounded
+down, still identical for float32 inputs; models comparing float64 inputs keep
+float64 thresholds) or quantized: every threshold is
+replaced by its rank among the thresholds of its feature, inputs are binned
+against the same per-feature edges, and the comparison runs on small
+integers. Inputs must be finite (build_feature_matrix fills gaps with 0).
+"""
+import numpy as np
+
+THRESHOLD_FORMATS = ('float64', 'float32', 'quantized')
+
+# Tree x row node indices evaluated per block (small blocks stay in cache)
+BLOCK_NODES = 1 << 16
+
+class FlatForest:
+    """
+    Tree ensemble stored as contiguous arrays
+
+    Nodes of all trees are concatenated, deepest trees first. Leaves are their
+    own children, so after as many steps as a tree is deep every row has
+    reached one of its leaves without per-row branching; at every level only
+    the prefix of trees that are still deeper is advanced.
+
+    Args:
+        feature: int32 split feature of every node (0 for leaves)
+        threshold: Split threshold of every node (rows go left when
+            feature value <= threshold); bin codes when bin_edges is set
+        children: int32 array of shape (nodes, 2), left and right child
+        value: float64 array of shape (nodes, outputs), leaf values
+        roots: int32 root node of every tree
+        tree_depths: int32 depth of every tree, in decreasing order
+        n_features: Number of input features
+        divisor: Summed tree outputs are divided by it (trees of a forest, 1 for boosting)
+        offset: Added to the result (baseline of boosting models)
+        x_dtype: dtype inputs are cast to before comparing (float32 for
+            sklearn trees, float64 for histogram gradient boosting)
+        bin_edges / bin_offsets: Quantized thresholds: sorted thresholds of
+            every feature, concatenated, and where each feature starts
+        feature_names: Feature names the model was trained on (or None)
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, tree_depths, n_features, divisor=1.0, offset=0.0,
+                 x_dtype=np.float32, bin_edges=None, bin_offsets=None, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.tree_depths = tree_depths
+        self.divisor = float(divisor)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.x_dtype = np.dtype(x_dtype)
+        self.bin_edges = bin_edges
+        self.bin_offsets = bin_offsets
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = int(n_features)
+
+    @property
+    def depth(self):
+        return int(self.tree_depths[0]) if len(self.tree_depths) else 0
+
+    @property
+    def n_outputs(self):
+        return self.value.shape[1]
+
+    @property
+    def nbytes(self):
+        """Size of the arrays"""
+        arrays = [self.feature, self.threshold, self.children, self.value, self.roots, self.tree_depths,
+                  self.bin_edges, self.bin_offsets]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def _bin(self, X):
+        """Inputs as bin codes: code <= threshold code exactly when value <= threshold"""
+        codes = np.empty(X.shape, dtype=self.threshold.dtype)
+        for j in range(X.shape[1]):
+            edges = self.bin_edges[self.bin_offsets[j]:self.bin_offsets[j + 1]]
+            codes[:, j] = np.searchsorted(edges, X[:, j], side='left')
+        return codes
+
+    def _predict_block(self, X, active):
+        """Summed tree outputs of a block of rows, shape (rows, outputs)"""
+        rows = len(X)
+        X_flat = np.ascontiguousarray(X.T).ravel()
+        children = self.children.ravel()
+        columns = np.arange(rows)
+        node = np.repeat(self.roots.astype(np.intp)[:, None], rows, axis=1)
+        for trees in active:
+            current = node[:trees]
+            goes_right = X_flat[self.feature[current] * np.intp(rows) + columns] > self.threshold[current]
+            node[:trees] = children[2 * current + goes_right]
+        return self.value[node].sum(axis=0)
+
+    def predict(self, X):
+        """
+        Predict like the original model
+
+        Returns:
+            Array of shape (rows,) for single-output models, else (rows, outputs)
+        """
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy()
+        X = np.asarray(X, dtype=self.x_dtype).reshape(len(X), -1)
+        if self.bin_edges is not None:
+            X = self._bin(X)
+
+        # Trees still descending at every level
+        active = np.searchsorted(-self.tree_depths, -np.arange(self.depth), side='left')
+        predictions = np.empty((len(X), self.n_outputs), dtype=np.float64)
+        block = max(BLOCK_NODES // max(len(self.roots), 1), 1)
+        for start in range(0, len(X), block):
+            predictions[start:start + block] = self._predict_block(X[start:start + block], active)
+        predictions = predictions / self.divisor + self.offset
+        return predictions[:, 0] if self.n_outputs == 1 else predictions
+
+def _tree_nodes(tree):
+    """(feature, threshold, left, right, value, leaf mask, depth) of a fitted sklearn tree"""
+    leaf = tree.children_left < 0
+    return (
+        np.where(leaf, 0, tree.feature),
+        tree.threshold,
+        tree.children_left,
+        tree.children_right,
+        tree.value.reshape(tree.node_count, -1),
+        leaf,
+        tree.max_depth
+    )
+
+def _hist_nodes(predictor):
+    """(feature, threshold, left, right, value, leaf mask, depth) of a histogram gradient boosting tree"""
+    nodes = predictor.nodes
+    if nodes['is_categorical'].any():
+        raise ValueError("Categorical splits cannot be flattened")
+    leaf = nodes['is_leaf'].astype(bool)
+    return (
+        np.where(leaf, 0, nodes['feature_idx']),
+        nodes['num_threshold'],
+        nodes['left'].astype(np.int64),
+        nodes['right'].astype(np.int64),
+        nodes['value'].reshape(-1, 1),
+        leaf,
+        int(nodes['depth'].max())
+    )
+
+def _float32_floor(threshold):
+    """Largest float32 <= every threshold (same splits for float32 inputs)"""
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def _quantize(feature, threshold, leaf, n_features):
+    """Per-feature threshold edges and the bin code of every node threshold"""
+    edges = [np.unique(threshold[~leaf & (feature == j)]) for j in range(n_features)]
+    width = max((len(e) for e in edges), default=0)
+    code_dtype = np.uint8 if width < 2 ** 8 else np.uint16 if width < 2 ** 16 else np.uint32
+    codes = np.zeros(len(feature), dtype=code_dtype)
+    for j, feature_edges in enumerate(edges):
+        split = ~leaf & (feature == j)
+        codes[split] = np.searchsorted(feature_edges, threshold[split])
+    offsets = np.zeros(n_features + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in edges])
+    return codes, np.concatenate(edges) if edges else np.empty(0), offsets
+
+def flatten_trees(trees, n_features, divisor=1.0, offset=0.0, x_dtype=np.float32, thresholds='float64',
+                  feature_names=None):
+    """
+    Flatten a list of trees into a FlatForest
+
+    Args:
+        trees: Node tuples from _tree_nodes / _hist_nodes
+        n_features: Number of input features
+        divisor / offset / x_dtype / feature_names: See FlatForest
+        thresholds: 'float64', 'float32' or 'quantized' ('float32' keeps
+            float64 thresholds when x_dtype is float64, where rounding would
+            send inputs between the two values down the wrong branch)
+
+    Raises:
+        ValueError: for unknown threshold formats
+    """
+    if thresholds not in THRESHOLD_FORMATS:
+        raise ValueError(f"Threshold format must be one of {', '.join(THRESHOLD_FORMATS)}, not {thresholds}")
+
+    # Deepest trees first (stable, so equally deep trees keep their order)
+    tree_depths = np.array([nodes[6] for nodes in trees], dtype=np.int32)
+    order = np.argsort(-tree_depths, kind='stable')
+    trees = [trees[i] for i in order]
+    tree_depths = tree_depths[order]
+
+    sizes = np.array([len(nodes[0]) for nodes in trees], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    node_ids = np.arange(sizes.sum())
+    feature = np.concatenate([nodes[0] for nodes in trees]).astype(np.int32)
+    threshold = np.concatenate([nodes[1] for nodes in trees]).astype(np.float64)
+    leaf = np.concatenate([nodes[5] for nodes in trees])
+    left = np.concatenate([nodes[2] + start for nodes, start in zip(trees, starts)])
+    right = np.concatenate([nodes[3] + start for nodes, start in zip(trees, starts)])
+    # Leaves are their own children
+    children = np.column_stack([np.where(leaf, node_ids, left), np.where(leaf, node_ids, right)]).astype(np.int32)
+    value = np.ascontiguousarray(np.concatenate([nodes[4] for nodes in trees]), dtype=np.float64)
+
+    bin_edges, bin_offsets = None, None
+    if thresholds == 'quantized':
+        threshold, bin_edges, bin_offsets = _quantize(feature, threshold, leaf, n_features)
+    elif thresholds == 'float32' and np.dtype(x_dtype) == np.float32:
+        threshold = _float32_floor(threshold)
+
+    return FlatForest(
+        feature, threshold, children, value, starts.astype(np.int32), tree_depths, n_features,
+        divisor=divisor, offset=offset, x_dtype=x_dtype,
+        bin_edges=bin_edges, bin_offsets=bin_offsets, feature_names=feature_names
+    )
+
+def flatten_forest(model, thresholds='float64'):
+    """
+    Flatten a fitted RandomForestRegressor (or another averaged ensemble of
+    sklearn trees) or HistGradientBoostingRegressor
+
+    Raises:
+        ValueError: for other models
+    """
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if hasattr(model, 'estimators_') and all(hasattr(tree, 'tree_') for tree in model.estimators_):
+        trees = [_tree_nodes(tree.tree_) for tree in model.estimators_]
+        return flatten_trees(trees, model.n_features_in_, divisor=len(trees), thresholds=thresholds,
+                             feature_names=feature_names)
+    if hasattr(model, '_predictors') and hasattr(model, '_baseline_prediction'):
+        if any(len(predictors) != 1 for predictors in model._predictors):
+            raise ValueError("Only single-output gradient boosting models can be flattened")
+        if model.loss in ('poisson', 'gamma'):
+            raise ValueError(f"Gradient boosting with {model.loss} loss cannot be flattened")
+        trees = [_hist_nodes(predictors[0]) for predictors in model._predictors]
+        offset = np.asarray(model._baseline_prediction, dtype=np.float64).ravel()
+        return flatten_trees(trees, model.n_features_in_, offset=offset, x_dtype=np.float64,
+                             thresholds=thresholds, feature_names=feature_names)
+    raise ValueError(f"{type(model).__name__} cannot be flattened")
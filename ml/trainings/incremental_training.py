@@ -0,0 +1,225 @@
+"""
+Out-of-core model training
+Posts are streamed in chunks. Every raw chunk is engineered from the rolling
+state of the chunks before it (so for a date-ordered archive the features
+match a single pass over everything), split into training rows and held-out
+rows, and used to update the models: forests grow a few trees per chunk,
+linear models take one stochastic gradient pass. Held-out rows are kept in a
+fixed-size reservoir the metrics are computed on, so memory is bounded by the
+chunk size, never by the archive.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from trainings.feature_engineering import engineer_features, engineer_features_incremental, IncrementalUnsupported
+from trainings.train_model import prepare_features, build_feature_matrix, evaluate_model
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Share of every chunk held out for evaluation (like the 80/20 split of train_models)
+HOLDOUT_FRACTION = 0.2
+
+# Held-out rows kept for the metrics
+RESERVOIR_ROWS = 50_000
+
+# Trees added to each forest per chunk
+TREES_PER_CHUNK = 10
+
+INCREMENTAL_MODEL_TYPES = ('linear', 'random_forest', 'both')
+
+def iter_csv_chunks(paths, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Read one or more CSVs (in order) as DataFrames of at most chunk_rows posts"""
+    for path in ([paths] if isinstance(paths, str) else paths):
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            yield chunk.reset_index(drop=True)
+
+def engineer_chunks(chunks):
+    """
+    Engineer raw chunks, carrying the rolling-window state across chunks
+
+    A chunk the state cannot continue (the first one, posts out of date
+    order, different columns) starts a new history.
+    """
+    state = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        try:
+            df_processed, state = engineer_features_incremental(chunk, state)
+        except IncrementalUnsupported:
+            df_processed, state = engineer_features(chunk, return_state=True)
+        yield df_processed
+
+class EvaluationReservoir:
+    """
+    Uniform sample of at most capacity held-out rows (reservoir sampling)
+
+    Args:
+        capacity: Maximum rows kept
+        rng: numpy Generator
+    """
+
+    def __init__(self, capacity, rng):
+        self.capacity = capacity
+        self.rng = rng
+        self.seen = 0
+        self.size = 0
+        self.X = None
+        self.Y = None
+
+    def add(self, X, Y):
+        """Offer rows (feature matrix, target matrix) to the reservoir"""
+        X = np.asarray(X, dtype=np.float32)
+        Y = np.asarray(Y, dtype=np.float64).reshape(len(X), -1)
+        if self.X is None:
+            self.X = np.empty((self.capacity, X.shape[1]), dtype=np.float32)
+            self.Y = np.empty((self.capacity, Y.shape[1]), dtype=np.float64)
+
+        # Fill the free slots first
+        fill = min(self.capacity - self.size, len(X))
+        self.X[self.size:self.size + fill] = X[:fill]
+        self.Y[self.size:self.size + fill] = Y[:fill]
+        self.size += fill
+
+        # Then row i (0-based over everything offered) replaces a random slot
+        # with probability capacity / (i + 1)
+        index = self.seen + np.arange(fill, len(X))
+        slots = (self.rng.random(len(index)) * (index + 1)).astype(np.int64)
+        accepted = np.flatnonzero(slots < self.capacity)
+        # Later rows win when several land in the same slot
+        slots, last = np.unique(slots[accepted][::-1], return_index=True)
+        rows = fill + accepted[::-1][last]
+        self.X[slots] = X[rows]
+        self.Y[slots] = Y[rows]
+        self.seen += len(X)
+
+    def arrays(self):
+        """(X, Y) of the rows kept"""
+        if self.X is None:
+            return None, None
+        return self.X[:self.size], self.Y[:self.size]
+
+class _ForestLearner:
+    """Random forest that grows trees_per_chunk trees on every chunk (warm start)"""
+
+    def __init__(self, trees_per_chunk, random_state):
+        self.trees_per_chunk = trees_per_chunk
+        self.model = RandomForestRegressor(
+            n_estimators=0,
+            max_depth=10,
+            random_state=random_state,
+            n_jobs=-1,
+            warm_start=True
+        )
+
+    def partial_fit(self, X, y):
+        self.model.n_estimators += self.trees_per_chunk
+        self.model.fit(X, y)
+
+    def finish(self):
+        return self.model
+
+class _LinearLearner:
+    """Standardized linear regression trained by stochastic gradient descent"""
+
+    def __init__(self, random_state):
+        self.scaler = StandardScaler()
+        self.regressor = SGDRegressor(random_state=random_state)
+
+    def partial_fit(self, X, y):
+        self.scaler.partial_fit(X)
+        self.regressor.partial_fit(self.scaler.transform(X), y)
+
+    def finish(self):
+        return Pipeline([('scaler', self.scaler), ('regressor', self.regressor)])
+
+def _targets(df):
+    """Target matrix (likes, follower growth) of an engineered chunk"""
+    columns = [df['likes']]
+    if 'follower_growth' in df.columns:
+        columns.append(df['follower_growth'])
+    Y = np.column_stack([pd.to_numeric(c, errors='coerce').to_numpy(dtype=np.float64) for c in columns])
+    return np.where(np.isfinite(Y), Y, 0)
+
+def train_models_incremental(chunks, model_type='random_forest', engineered=False,
+                             holdout_fraction=HOLDOUT_FRACTION, reservoir_rows=RESERVOIR_ROWS,
+                             trees_per_chunk=TREES_PER_CHUNK, random_state=42):
+    """
+    Train the likes and follower growth models chunk by chunk
+
+    Args:
+        chunks: Iterable of DataFrames in date order, e.g. iter_csv_chunks()
+        model_type: 'linear', 'random_forest' or 'both'
+        engineered: Chunks are already engineered (e.g. read from a store)
+        holdout_fraction: Share of every chunk held out for evaluation
+        reservoir_rows: Maximum held-out rows kept for the metrics
+        trees_per_chunk: Trees each forest grows per chunk
+        random_state: Seed of the holdout split, reservoir and models
+
+    Returns:
+        (models, metrics) keyed like train_models(); metrics are computed on
+        the evaluation reservoir
+
+    Raises:
+        ValueError: for unsupported model types, data without features or
+            likes, or when no chunk had training rows
+    """
+    if model_type not in INCREMENTAL_MODEL_TYPES:
+        raise ValueError(f"Incremental training supports {', '.join(INCREMENTAL_MODEL_TYPES)}, not {model_type}")
+    model_types = ['linear', 'random_forest'] if model_type == 'both' else [model_type]
+    rng = np.random.default_rng(random_state)
+    reservoir = EvaluationReservoir(reservoir_rows, rng)
+
+    feature_cols = None
+    targets = None
+    learners = {}
+    has_growth = False
+    rows = 0
+    for index, df in enumerate(chunks if engineered else engineer_chunks(chunks)):
+        if feature_cols is None:
+            feature_cols = prepare_features(df)
+            if len(feature_cols) == 0:
+                raise ValueError("No valid features found in data")
+            if 'likes' not in df.columns:
+                raise ValueError("Target column 'likes' not found in data")
+            targets = ['likes', 'follower_growth'] if 'follower_growth' in df.columns else ['likes']
+            for target in targets:
+                for name in model_types:
+                    learner = _ForestLearner(trees_per_chunk, random_state) if name == 'random_forest' \
+                        else _LinearLearner(random_state)
+                    learners[f'{target}_{name}'] = (targets.index(target), learner)
+
+        X = build_feature_matrix(df, feature_cols)
+        Y = _targets(df)
+        held_out = rng.random(len(X)) < holdout_fraction
+        reservoir.add(X[held_out], Y[held_out])
+
+        train = ~held_out
+        if not train.any():
+            continue
+        X_train, Y_train = X[train], Y[train]
+        has_growth |= Y_train.shape[1] > 1 and bool((Y_train[:, 1] != 0).any())
+        for column, learner in learners.values():
+            learner.partial_fit(X_train, Y_train[:, column])
+        rows += int(train.sum())
+        print(f"  chunk {index + 1}: {rows:,} training rows, {reservoir.size:,} held out")
+
+    if rows == 0:
+        raise ValueError("No training rows found in data")
+
+    models = {}
+    metrics = {}
+    X_test, Y_test = reservoir.arrays()
+    X_test = pd.DataFrame(X_test, columns=feature_cols) if X_test is not None else None
+    for name, (column, learner) in learners.items():
+        # Like train_models, no growth model when growth is always 0
+        if name.startswith('follower_growth') and not has_growth:
+            continue
+        models[name] = learner.finish()
+        if X_test is not None and len(X_test) > 0:
+            print(f"\n=== Incremental {name} ===")
+            metrics[name] = evaluate_model(Y_test[:, column], models[name].predict(X_test))
+    return models, metrics
@@ -0,0 +1,212 @@
+"""
+Cross-validated model selection
+Every candidate (a model type with one hyperparameter set) is scored with
+K-fold cross-validation on the same folds. The feature matrix and targets are
+built once and written to a memory-mapped file all workers read, and every
+(candidate, fold) fit runs single-threaded in a process pool, so the work
+spreads evenly over the cores without oversubscribing them. Cross-validation
+runs on a stratified sample of at most SELECTION_ROWS posts, which keeps its
+time independent of the upload size; the winner of every target (lowest mean
+CV MAE) is then refit on all posts.
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+from threadpoolctl import threadpool_limits
+from trainings.budgeted_training import stratified_order
+from trainings.train_model import prepare_features, build_feature_matrix, hist_gradient_boosting
+
+# Candidate name -> (model type, hyperparameters overriding the defaults of train_models)
+CANDIDATES = {
+    'random_forest': ('random_forest', {}),
+    'random_forest_deep': ('random_forest', {'max_depth': 20, 'min_samples_leaf': 5}),
+    'hist_gradient_boosting': ('hist_gradient_boosting', {}),
+    'hist_gradient_boosting_wide': ('hist_gradient_boosting', {'learning_rate': 0.05, 'max_leaf_nodes': 63}),
+    'linear': ('linear', {})
+}
+
+CV_FOLDS = 5
+
+# Posts cross-validation runs on (a stratified sample of larger uploads)
+SELECTION_ROWS = 20_000
+
+# Fits of the same type take about as long; the slowest are scheduled first
+_COST_ORDER = {'random_forest': 0, 'hist_gradient_boosting': 1, 'linear': 2}
+
+# Feature matrix and targets of the pool process (memory-mapped)
+_shared = {}
+
+def build_candidate(model_type, params=None, train_rows=0, n_jobs=-1):
+    """Unfitted estimator of a model type, with train_models() defaults overridden by params"""
+    params = dict(params or {})
+    if model_type == 'random_forest':
+        defaults = {'n_estimators': 100, 'max_depth': 10, 'random_state': 42, 'n_jobs': n_jobs}
+        return RandomForestRegressor(**{**defaults, **params})
+    if model_type == 'hist_gradient_boosting':
+        return hist_gradient_boosting(train_rows).set_params(**params)
+    if model_type == 'linear':
+        return LinearRegression(**params)
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+def _load_shared(folder):
+    """Pool initializer: memory-map the shared feature matrix and targets"""
+    _shared['X'] = np.load(os.path.join(folder, 'X.npy'), mmap_mode='r')
+    _shared['Y'] = np.load(os.path.join(folder, 'Y.npy'), mmap_mode='r')
+
+def _score_fold(name, model_type, params, train, test, targets):
+    """
+    Fit a candidate on one fold for every target column and score it
+
+    Returns:
+        (name, {target: {'mae', 'rmse', 'r2'}}, seconds)
+    """
+    start = time.perf_counter()
+    X, Y = _shared['X'], _shared['Y']
+    X_train, X_test = X[train], X[test]
+    scores = {}
+    with threadpool_limits(limits=1):
+        for column in targets:
+            model = build_candidate(model_type, params, len(train), n_jobs=1)
+            model.fit(X_train, Y[train, column])
+            y_test, y_pred = Y[test, column], model.predict(X_test)
+            scores[int(column)] = {
+                'mae': mean_absolute_error(y_test, y_pred),
+                'rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
+                'r2': r2_score(y_test, y_pred)
+            }
+    return name, scores, time.perf_counter() - start
+
+def _run_tasks(tasks, X, Y, workers):
+    """Run _score_fold tasks, in a process pool sharing memory-mapped X and Y when workers > 1"""
+    if workers == 1:
+        _shared['X'], _shared['Y'] = X, Y
+        try:
+            return [_score_fold(*task) for task in tasks]
+        finally:
+            _shared.clear()
+
+    with tempfile.TemporaryDirectory(prefix='model_selection_') as folder:
+        np.save(os.path.join(folder, 'X.npy'), X)
+        np.save(os.path.join(folder, 'Y.npy'), Y)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_shared, initargs=(folder,)) as executor:
+            futures = [executor.submit(_score_fold, *task) for task in tasks]
+            return [future.result() for future in futures]
+
+def select_models(df, candidates=None, folds=CV_FOLDS, max_workers=None, selection_rows=SELECTION_ROWS,
+                  random_state=42):
+    """
+    Pick the model of every target by K-fold cross-validation and refit it
+
+    Args:
+        df: Preprocessed DataFrame with features
+        candidates: Candidate name -> (model type, hyperparameters), default
+            CANDIDATES
+        folds: Cross-validation folds
+        max_workers: Pool size (default: number of CPUs)
+        selection_rows: Posts cross-validation runs on
+        random_state: Seed of the sample and the folds
+
+    Returns:
+        (models, metrics, selection): the refit winners keyed like
+        train_models() (f'{target}_{model_type}'), their mean CV metrics, and
+        the comparison: CV metrics of every candidate and target, the
+        'winners' per target, folds, rows, workers and seconds
+
+    Raises:
+        ValueError: for unknown model types, fewer than two folds, data
+            without features or likes, or fewer posts than folds
+    """
+    candidates = CANDIDATES if candidates is None else candidates
+    for name, (model_type, _) in candidates.items():
+        if model_type not in _COST_ORDER:
+            raise ValueError(f"Unsupported model type for candidate {name}: {model_type}")
+    if folds < 2:
+        raise ValueError("Cross-validation needs at least 2 folds")
+    start = time.perf_counter()
+
+    feature_cols = prepare_features(df)
+    if len(feature_cols) == 0:
+        raise ValueError("No valid features found in data")
+    if 'likes' not in df.columns:
+        raise ValueError("Target column 'likes' not found in data")
+    if len(df) < folds:
+        raise ValueError(f"At least {folds} posts are needed for {folds}-fold cross-validation")
+
+    X = build_feature_matrix(df, feature_cols)
+    target_names = ['likes', 'follower_growth'] if 'follower_growth' in df.columns else ['likes']
+    Y = np.column_stack([
+        pd.to_numeric(df[target], errors='coerce').replace([np.inf, -np.inf], 0).fillna(0).to_numpy(dtype=np.float64)
+        for target in target_names
+    ])
+    # Like train_models, no growth model when growth is always 0
+    columns = [0] + [i for i in range(1, len(target_names)) if (Y[:, i] != 0).any()]
+
+    # One sample and one set of folds shared by every candidate
+    sample = np.sort(stratified_order(df, random_state=random_state)[:selection_rows])
+    X_sample = np.ascontiguousarray(X.to_numpy(dtype=np.float32)[sample])
+    Y_sample = np.ascontiguousarray(Y[sample][:, columns])
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=random_state).split(X_sample))
+
+    ordered = sorted(candidates.items(), key=lambda item: _COST_ORDER[item[1][0]])
+    tasks = [
+        (name, model_type, params, train, test, range(len(columns)))
+        for name, (model_type, params) in ordered
+        for train, test in splits
+    ]
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks)))
+    print(f"\n=== Cross-validating {len(candidates)} candidates x {folds} folds "
+          f"on {len(sample):,} posts ({workers} workers) ===")
+    results = _run_tasks(tasks, X_sample, Y_sample, workers)
+
+    comparison = {
+        name: {'model_type': model_type, 'params': dict(params), 'seconds': 0.0, 'targets': {}}
+        for name, (model_type, params) in candidates.items()
+    }
+    fold_scores = {}
+    for name, scores, seconds in results:
+        comparison[name]['seconds'] += seconds
+        for column, values in scores.items():
+            fold_scores.setdefault((name, target_names[columns[column]]), []).append(values)
+    for (name, target), scores in fold_scores.items():
+        mae = [s['mae'] for s in scores]
+        comparison[name]['targets'][target] = {
+            'mae': float(np.mean(mae)),
+            'mae_std': float(np.std(mae)),
+            'rmse': float(np.mean([s['rmse'] for s in scores])),
+            'r2': float(np.mean([s['r2'] for s in scores]))
+        }
+
+    models = {}
+    metrics = {}
+    winners = {}
+    for column in columns:
+        target = target_names[column]
+        # Ties go to the candidate listed first
+        winner = min(candidates, key=lambda name: comparison[name]['targets'][target]['mae'])
+        winners[target] = winner
+        model_type, params = candidates[winner]
+        cv = comparison[winner]['targets'][target]
+        print(f"  {target}: {winner} (CV MAE {cv['mae']:.2f} ± {cv['mae_std']:.2f}, R² {cv['r2']:.4f})")
+
+        model = build_candidate(model_type, params, len(X))
+        model.fit(X, Y[:, column])
+        models[f'{target}_{model_type}'] = model
+        metrics[f'{target}_{model_type}'] = {k: cv[k] for k in ('mae', 'rmse', 'r2')}
+
+    selection = {
+        'folds': int(folds),
+        'rows': int(len(sample)),
+        'total_rows': int(len(df)),
+        'workers': int(workers),
+        'seconds': float(time.perf_counter() - start),
+        'winners': winners,
+        'candidates': comparison
+    }
+    return models, metrics, selection
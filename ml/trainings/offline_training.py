@@ -0,0 +1,329 @@
+"""
+Offline batch training
+Every CSV of a data directory is streamed in chunks through the feature
+engineering, the selected model types are trained on the result, and the best
+model of every target is published as a versioned, content-hashed artifact:
+
+    models/artifacts/likes_predictor-<sha256 prefix>.pkl
+    models/manifests/<version>.json     metrics, features, training time, artifacts
+    models/manifest.json                manifest of the current version
+    models/likes_predictor.pkl          served name, linked to the current artifact
+
+The served names are replaced atomically, so web workers (ModelRegistry)
+hot-reload a new version without training anything themselves.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import joblib
+import pandas as pd
+from trainings.incremental_training import (
+    DEFAULT_CHUNK_ROWS, INCREMENTAL_MODEL_TYPES, iter_csv_chunks, engineer_chunks, train_models_incremental
+)
+from trainings.flat_forest import THRESHOLD_FORMATS
+from trainings.train_model import train_models, export_models
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ML_DIR, 'data')
+MODEL_DIR = os.path.join(ML_DIR, 'models')
+
+ARTIFACT_DIR = 'artifacts'
+MANIFEST_DIR = 'manifests'
+MANIFEST_NAME = 'manifest.json'
+
+# Served artifact names of every target (as in backend/utils/model_registry.py)
+SERVED_ARTIFACTS = {'likes': 'likes_predictor.pkl', 'follower_growth': 'follower_growth_predictor.pkl'}
+
+OFFLINE_MODEL_TYPES = ('linear', 'random_forest', 'both', 'hist_gradient_boosting', 'auto')
+
+# Versions whose manifests and artifacts are kept
+KEEP_VERSIONS = 5
+
+# Hex digits of the content hash in artifact names
+HASH_DIGITS = 16
+
+def file_sha256(path, block_bytes=1 << 20):
+    """Hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def list_csvs(data_dir):
+    """CSV files of a data directory, in name order"""
+    return sorted(glob.glob(os.path.join(data_dir, '*.csv')))
+
+def _engineered_chunks(paths, chunk_rows, rows):
+    """Engineered chunks of every CSV, counting posts per file"""
+    for path in paths:
+        rows[path] = 0
+        for df_processed in engineer_chunks(iter_csv_chunks(path, chunk_rows)):
+            rows[path] += len(df_processed)
+            yield df_processed
+
+def _aligned(chunks):
+    """Chunks with the columns of the first one (features other files lack are 0 after build_feature_matrix)"""
+    columns = None
+    for chunk in chunks:
+        if columns is None:
+            columns = chunk.columns
+        yield chunk if chunk.columns.equals(columns) else chunk.reindex(columns=columns)
+
+def load_engineered(paths, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Engineer CSVs chunk by chunk (each file is its own history) and
+    concatenate the engineered chunks
+
+    Returns:
+        (engineered DataFrame, {path: posts})
+    """
+    rows = {}
+    frames = list(_engineered_chunks(paths, chunk_rows, rows))
+    if not frames:
+        raise ValueError("No posts found in the data files")
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0], rows
+
+def _train(df, model_type, selection_workers=None):
+    """(models, metrics, selection or None) of one model type"""
+    if model_type == 'auto':
+        from trainings.model_selection import select_models
+        return select_models(df, max_workers=selection_workers)
+    models, metrics = train_models(df, model_type=model_type)
+    return models, metrics, None
+
+def best_models(models, metrics):
+    """
+    Model name to publish for every target: lowest test MAE (models without
+    metrics only when a target has no evaluated model)
+    """
+    chosen = {}
+    for target in SERVED_ARTIFACTS:
+        names = [name for name in models if name.startswith(f'{target}_')]
+        if names:
+            chosen[target] = min(names, key=lambda name: metrics.get(name, {}).get('mae', float('inf')))
+    return chosen
+
+def write_artifact(model, model_dir, name):
+    """
+    Write a model as a content-hashed artifact (identical models share one file)
+
+    Returns:
+        (path relative to model_dir, sha256, bytes)
+    """
+    folder = os.path.join(model_dir, ARTIFACT_DIR)
+    os.makedirs(folder, exist_ok=True)
+    stem, ext = os.path.splitext(name)
+    tmp_path = os.path.join(folder, f"{stem}.{os.getpid()}.tmp")
+    joblib.dump(model, tmp_path)
+    sha256 = file_sha256(tmp_path)
+    relative = os.path.join(ARTIFACT_DIR, f"{stem}-{sha256[:HASH_DIGITS]}{ext}")
+    size = os.path.getsize(tmp_path)
+    if os.path.exists(os.path.join(model_dir, relative)):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, os.path.join(model_dir, relative))
+    return relative, sha256, size
+
+def _write_json(data, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp_path, path)
+
+def _link(source, target):
+    """Atomically point target at source's contents (hard link, else copy)"""
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+def publish_version(manifest, model_dir):
+    """
+    Make a version current: write its manifest, then point the served names
+    at its artifacts (served names of targets without an artifact are removed)
+
+    The metadata next to each served name (read by ModelRegistry.metadata)
+    records the version and, if any, the model selection.
+    """
+    os.makedirs(os.path.join(model_dir, MANIFEST_DIR), exist_ok=True)
+    _write_json(manifest, os.path.join(model_dir, MANIFEST_DIR, f"{manifest['version']}.json"))
+    for served in SERVED_ARTIFACTS.values():
+        path = os.path.join(model_dir, served)
+        metadata_path = os.path.splitext(path)[0] + '.json'
+        artifact = manifest['artifacts'].get(served)
+        if artifact is None:
+            for stale in (path, metadata_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            continue
+        metadata = {'version': manifest['version']}
+        if manifest['selection'] is not None:
+            metadata['selection'] = manifest['selection']
+        _write_json(metadata, metadata_path)
+        _link(os.path.join(model_dir, artifact['file']), path)
+    _write_json(manifest, os.path.join(model_dir, MANIFEST_NAME))
+
+def prune_versions(model_dir, keep=KEEP_VERSIONS):
+    """
+    Delete the manifests of all but the newest keep versions and the
+    artifacts no kept version uses
+
+    Returns:
+        Versions removed
+    """
+    folder = os.path.join(model_dir, MANIFEST_DIR)
+    if keep <= 0 or not os.path.isdir(folder):
+        return []
+    # Version ids start with their UTC timestamp, so name order is age order
+    versions = sorted(name[:-len('.json')] for name in os.listdir(folder) if name.endswith('.json'))
+    removed = versions[:-keep]
+    for version in removed:
+        os.remove(os.path.join(folder, f"{version}.json"))
+
+    used = set()
+    for version in versions[-keep:]:
+        with open(os.path.join(folder, f"{version}.json")) as fh:
+            used.update(artifact['file'] for artifact in json.load(fh)['artifacts'].values())
+    artifact_folder = os.path.join(model_dir, ARTIFACT_DIR)
+    if os.path.isdir(artifact_folder):
+        for name in os.listdir(artifact_folder):
+            if os.path.join(ARTIFACT_DIR, name) not in used:
+                os.remove(os.path.join(artifact_folder, name))
+    return removed
+
+def train_offline(data_dir=DATA_DIR, model_dir=MODEL_DIR, model_types=('random_forest',), incremental=False,
+                  chunk_rows=DEFAULT_CHUNK_ROWS, export='float32', selection_workers=None, keep=KEEP_VERSIONS):
+    """
+    Train on every CSV of data_dir and publish a new model version to model_dir
+
+    Args:
+        data_dir: Directory of the CSVs to train on
+        model_dir: Model folder the web workers serve
+        model_types: Model types to train (see OFFLINE_MODEL_TYPES); the one
+            with the lowest test MAE is published for every target
+        incremental: Stream the chunks into train_models_incremental()
+            instead of training on all engineered posts at once
+        chunk_rows: Posts read and engineered per chunk
+        export: Threshold format of exported forests (None: sklearn pickles)
+        selection_workers: Pool size of model selection ('auto')
+        keep: Versions kept (0 keeps all)
+
+    Returns:
+        The manifest of the new version
+
+    Raises:
+        ValueError: without CSVs, posts or a likes model, for model types
+            that cannot be trained (incrementally) or unknown export formats
+    """
+    if export and export not in THRESHOLD_FORMATS:
+        raise ValueError(f"Threshold format must be one of {', '.join(THRESHOLD_FORMATS)}, not {export}")
+    supported = INCREMENTAL_MODEL_TYPES if incremental else OFFLINE_MODEL_TYPES
+    for model_type in model_types:
+        if model_type not in supported:
+            kind = "Incremental training" if incremental else "Offline training"
+            raise ValueError(f"{kind} supports {', '.join(supported)}, not {model_type}")
+    paths = list_csvs(data_dir)
+    if not paths:
+        raise ValueError(f"No CSV files found in {data_dir}")
+    start = time.perf_counter()
+
+    models = {}
+    metrics = {}
+    selection = None
+    training_seconds = {}
+    if incremental:
+        rows = {}
+        type_start = time.perf_counter()
+        model_type = 'both' if len(set(model_types)) > 1 else model_types[0]
+        chunks = _aligned(_engineered_chunks(paths, chunk_rows, rows))
+        models, metrics = train_models_incremental(chunks, model_type, engineered=True)
+        training_seconds[model_type] = time.perf_counter() - type_start
+    else:
+        df_processed, rows = load_engineered(paths, chunk_rows)
+        print(f"Engineered {len(df_processed):,} posts from {len(paths)} files "
+              f"({time.perf_counter() - start:.1f}s)")
+        for model_type in model_types:
+            type_start = time.perf_counter()
+            type_models, type_metrics, type_selection = _train(df_processed, model_type, selection_workers)
+            training_seconds[model_type] = time.perf_counter() - type_start
+            models.update(type_models)
+            metrics.update(type_metrics)
+            selection = type_selection or selection
+
+    chosen = best_models(models, metrics)
+    if 'likes' not in chosen:
+        raise ValueError("No model trained successfully")
+    likes_model = models[chosen['likes']]
+    features = getattr(likes_model, 'feature_names_in_', None)
+    published = {chosen[target]: models[chosen[target]] for target in chosen}
+    if export:
+        published = export_models(published, export)
+
+    artifacts = {}
+    for target, name in chosen.items():
+        served = SERVED_ARTIFACTS[target]
+        relative, sha256, size = write_artifact(published[name], model_dir, served)
+        artifacts[served] = {'file': relative, 'sha256': sha256, 'bytes': size, 'model': name}
+
+    created = datetime.now(timezone.utc)
+    content = hashlib.sha256(''.join(sorted(a['sha256'] for a in artifacts.values())).encode()).hexdigest()
+    manifest = {
+        'version': f"{created:%Y%m%dT%H%M%SZ}-{content[:8]}",
+        'created_at': created.isoformat(),
+        'model_types': list(model_types),
+        'incremental': bool(incremental),
+        'export': export,
+        'sources': [
+            {'file': os.path.basename(path), 'sha256': file_sha256(path), 'rows': int(rows.get(path, 0))}
+            for path in paths
+        ],
+        'rows': int(sum(rows.values())),
+        'features': [str(f) for f in features] if features is not None else None,
+        'training_seconds': {name: float(seconds) for name, seconds in training_seconds.items()},
+        'total_seconds': float(time.perf_counter() - start),
+        'metrics': {name: {k: float(v) for k, v in values.items()} for name, values in metrics.items()},
+        'selection': selection,
+        'artifacts': artifacts
+    }
+    publish_version(manifest, model_dir)
+    prune_versions(model_dir, keep)
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the likes and follower growth models offline")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="Directory of the CSVs to train on")
+    parser.add_argument('--model-dir', default=MODEL_DIR, help="Model folder the web workers serve")
+    parser.add_argument('--model-types', default='random_forest',
+                        help=f"Comma-separated model types ({', '.join(OFFLINE_MODEL_TYPES)})")
+    parser.add_argument('--incremental', action='store_true', help="Train out of core, chunk by chunk")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--export', default='float32',
+                        help="Threshold format of exported forests (float64, float32, quantized or none)")
+    parser.add_argument('--selection-workers', type=int, default=None, help="Processes of model type auto")
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS, help="Versions to keep (0: all)")
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = train_offline(
+            args.data_dir, args.model_dir, [t.strip() for t in args.model_types.split(',') if t.strip()],
+            incremental=args.incremental, chunk_rows=args.chunk_rows,
+            export=None if args.export.lower() == 'none' else args.export.lower(),
+            selection_workers=args.selection_workers, keep=args.keep
+        )
+    except ValueError as e:
+        print(f"Training failed: {e}")
+        return 1
+
+    print(f"\nPublished version {manifest['version']} ({manifest['rows']:,} posts, "
+          f"{manifest['total_seconds']:.1f}s)")
+    for served, artifact in manifest['artifacts'].items():
+        print(f"  {served} -> {artifact['file']} ({artifact['model']})")
+    return 0
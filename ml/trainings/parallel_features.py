@@ -0,0 +1,179 @@
+"""
+Partitioned feature engineering across a process pool
+Posts are ordered by date and split into consecutive date ranges. Every
+partition is engineered in its own process together with a halo: the earlier
+posts its rolling windows and follower diffs reach into. Results are handed to
+a sink in date order as they complete, so the engineered frame never has to be
+held in memory and the output matches engineer_features() row for row.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from trainings.feature_engineering import (
+    ROLLING_WINDOW, GROUP_KEYS, engineer_features, find_date_column, find_followers_column, add_post_features,
+    add_engagement_rate, add_history_features, add_interaction_features, normalize_numeric_features,
+    rolling_windows, sort_by_date, _rolling_frame, _build_state
+)
+from trainings.rolling import RollingWindows, group_codes
+from trainings.timestamps import parse_datetime
+
+# Posts per partition (more partitions are used when there are more workers)
+DEFAULT_PARTITION_ROWS = 500_000
+
+def partition_bounds(rows, partition_rows=DEFAULT_PARTITION_ROWS, workers=1):
+    """
+    Start offsets of consecutive, equally sized partitions
+
+    Returns:
+        int64 array of partition starts followed by rows
+    """
+    count = max(-(-rows // partition_rows), workers, 1)
+    count = min(count, max(rows, 1))
+    return np.linspace(0, rows, count + 1).astype(np.int64)
+
+def partition_halos(windows, bounds):
+    """
+    Earlier rows each partition's windows and diffs reach into
+
+    Rows of a group that belong to one partition are contiguous in the
+    group-ordered layout of windows, so the halo of the group is the range
+    from the window start of its first row (or the row before it, for the
+    diff) up to that row. All ranges are built at once, without looping over
+    groups.
+
+    Args:
+        windows: RollingWindows of all date-ordered rows
+        bounds: Partition starts followed by the number of rows
+
+    Returns:
+        List with the sorted date positions of each partition's halo
+    """
+    n = windows.n
+    partition = np.searchsorted(bounds, np.arange(n), side='right') - 1
+    part_sorted = partition[windows.order]
+
+    # First row of every (group, partition) block in the group-ordered layout
+    block_first = np.ones(n, dtype=bool)
+    block_first[1:] = part_sorted[1:] != part_sorted[:-1]
+    block_first |= windows.first
+    first = np.flatnonzero(block_first & ~windows.first)
+    low = np.minimum(windows.starts[first], first - 1)
+
+    # Expand the [low, first) ranges into positions
+    lengths = first - low
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    sorted_positions = np.repeat(low, lengths) + np.arange(lengths.sum()) - offsets
+    halo_rows = windows.order[sorted_positions]
+    halo_parts = np.repeat(part_sorted[first], lengths)
+
+    order = np.lexsort((halo_rows, halo_parts))
+    halo_rows, halo_parts = halo_rows[order], halo_parts[order]
+    splits = np.searchsorted(halo_parts, np.arange(len(bounds)))
+    return [halo_rows[splits[p]:splits[p + 1]] for p in range(len(bounds) - 1)]
+
+def _engineer_partition(df_part, halo_rows, likes_mean, group_keys, window, tail_mask):
+    """
+    Engineer one partition (worker process)
+
+    Args:
+        df_part: Halo rows followed by the partition's rows, in date order
+        halo_rows: Number of leading halo rows
+        likes_mean: Likes mean over all posts (fill value of empty windows)
+        group_keys / window: Rolling window grouping
+        tail_mask: Rows of the partition kept in the feature state (or None)
+
+    Returns:
+        (engineered partition, rolling frame of its state rows or None,
+        whether a rolling likes window was empty)
+    """
+    df_processed = df_part.reset_index(drop=True)
+    date_col = add_post_features(df_processed)
+    followers_col = find_followers_column(df_processed)
+    add_engagement_rate(df_processed, followers_col)
+    df_processed = sort_by_date(df_processed, date_col)
+
+    windows = rolling_windows(df_processed, date_col, group_keys, window)
+    rolling_likes = add_history_features(df_processed, followers_col, windows, likes_mean)
+    empty_window = rolling_likes is not None and bool(np.isnan(rolling_likes[halo_rows:]).any())
+
+    df_processed = df_processed.iloc[halo_rows:].reset_index(drop=True)
+    tail = None
+    if tail_mask is not None:
+        keys = [key for key in group_keys if key in df_processed.columns]
+        tail = _rolling_frame(df_processed[tail_mask], date_col, followers_col, keys)
+
+    add_interaction_features(df_processed)
+    return normalize_numeric_features(df_processed, followers_col), tail, empty_window
+
+def engineer_features_partitioned(df, sink, partition_rows=DEFAULT_PARTITION_ROWS, max_workers=None,
+                                  return_state=False, group_keys=GROUP_KEYS, window=ROLLING_WINDOW):
+    """
+    Engineer features in date-range partitions across a process pool
+
+    The engineered partitions are passed to sink in date order; concatenated
+    they equal engineer_features(df). At most two partitions per worker are
+    in flight, so memory stays bounded by the partition size.
+
+    Args:
+        df: DataFrame with raw social media post data (may be memory-mapped)
+        sink: Callable receiving each engineered partition, e.g.
+            FrameStoreWriter.append
+        partition_rows: Target posts per partition
+        max_workers: Pool size (default: number of CPUs)
+        return_state: Also compute the state for engineer_features_incremental()
+        group_keys / window: Rolling window grouping, as in engineer_features()
+
+    Returns:
+        The feature state (None when return_state is not set or appends
+        cannot be engineered incrementally)
+    """
+    workers = max_workers or os.cpu_count() or 1
+    date_col = find_date_column(df)
+    if date_col is None or len(df) <= max(partition_rows, 1) or workers == 1:
+        result = engineer_features(df, return_state=return_state, group_keys=group_keys, window=window)
+        df_processed, state = result if return_state else (result, None)
+        sink(df_processed)
+        return state
+
+    # Same stable date order as engineer_features
+    dates = parse_datetime(df[date_col], date_col).reset_index(drop=True)
+    order = dates.sort_values(kind='stable').index.to_numpy()
+    sorted_dates = dates.take(order).reset_index(drop=True)
+    keys = [key for key in group_keys if key in df.columns]
+    sorted_keys = pd.DataFrame({key: df[key].take(order).to_numpy() for key in keys}, index=pd.RangeIndex(len(df)))
+    windows = RollingWindows(group_codes(sorted_keys, keys), sorted_dates, window)
+
+    bounds = partition_bounds(len(df), partition_rows, workers)
+    halos = partition_halos(windows, bounds)
+    tail_mask = windows.tail(sorted_dates) if return_state else None
+    likes_mean = df['likes'].take(order).reset_index(drop=True).mean() if 'likes' in df.columns else None
+
+    def submit(executor, p):
+        start, stop = bounds[p], bounds[p + 1]
+        rows = np.concatenate([halos[p], np.arange(start, stop)])
+        return executor.submit(
+            _engineer_partition, df.take(order[rows]), len(halos[p]), likes_mean, group_keys, window,
+            tail_mask[start:stop] if tail_mask is not None else None
+        )
+
+    tails = []
+    empty_window = False
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_partition = 0
+        while next_partition < len(bounds) - 1 or pending:
+            while next_partition < len(bounds) - 1 and len(pending) < 2 * workers:
+                pending.append(submit(executor, next_partition))
+                next_partition += 1
+            df_processed, tail, empty = pending.popleft().result()
+            sink(df_processed)
+            tails.append(tail)
+            empty_window |= empty
+
+    if not return_state or sorted_dates.isna().any() or empty_window:
+        return None
+    followers_col = find_followers_column(df)
+    return _build_state(df.columns, len(df), date_col, followers_col, keys, window,
+                        tail=pd.concat(tails, ignore_index=True))
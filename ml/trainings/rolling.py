@@ -0,0 +1,192 @@
+"""
+Grouped rolling windows
+Rolling means and diffs are computed per group (e.g. per account and platform)
+in one vectorized pass: rows are ordered by group, the start of every row's
+window is located with a single search, and all windows are summed together.
+Integer-valued data (likes, counts) is summed as the difference of two exact
+int64 prefix sums, linear in the number of rows for any window length; other
+values are summed window by window, offset by offset (linear in the rows
+times the window length). There is no Python loop over groups.
+"""
+import numpy as np
+import pandas as pd
+
+def parse_window(window):
+    """
+    Normalize a window specification
+
+    Args:
+        window: Number of posts (int) or a calendar span ('7D', '12h',
+            pd.Timedelta)
+
+    Returns:
+        ('rows', n) or ('time', span in nanoseconds)
+    """
+    if isinstance(window, (int, np.integer)) and not isinstance(window, bool):
+        if window < 1:
+            raise ValueError("Rolling window must cover at least one post")
+        return ('rows', int(window))
+    span = pd.Timedelta(window)
+    if span <= pd.Timedelta(0):
+        raise ValueError("Rolling window must be a positive time span")
+    return ('time', span.value)
+
+def window_label(window):
+    """JSON-friendly form of a window specification"""
+    kind, size = parse_window(window)
+    return size if kind == 'rows' else str(pd.Timedelta(size))
+
+def group_codes(df, keys):
+    """
+    Integer group code of every row for the group keys present in df
+
+    Returns:
+        int64 array (all zeros when none of the keys is present)
+    """
+    keys = [key for key in keys if key in df.columns]
+    if not keys or len(df) == 0:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(keys, sort=False, dropna=False, observed=True).ngroup().to_numpy(dtype=np.int64)
+
+class RollingWindows:
+    """
+    Window layout of date-ordered rows split into groups
+
+    A row's window holds the rows of its group up to and including itself
+    that are within the window: the last n posts, or the posts dated less than
+    the time span before it. Windows are summed exactly (integer data) or on
+    their own (not with a running sum), so a row's value depends only on the
+    rows in its window.
+
+    Args:
+        codes: Group code of every row (None for a single group)
+        dates: Row dates (required for time windows); rows must be ordered
+            by date within each group, missing dates last
+        window: Window specification (see parse_window)
+    """
+
+    def __init__(self, codes, dates=None, window=7):
+        self.kind, self.size = parse_window(window)
+        n = len(codes) if codes is not None else len(dates)
+        self.n = n
+        codes = np.zeros(n, dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+
+        # Stable sort keeps the date order inside every group
+        self.order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[self.order]
+        position = np.arange(n)
+        first = np.ones(n, dtype=bool)
+        first[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        self.group_start = np.maximum.accumulate(np.where(first, position, 0)) if n else position
+        self.first = first
+
+        if self.kind == 'rows':
+            self.starts = np.maximum(position - self.size + 1, self.group_start)
+        else:
+            if dates is None:
+                raise ValueError("Time windows need the row dates")
+            self.starts = self._time_starts(sorted_codes, pd.Series(dates).to_numpy(dtype='datetime64[ns]'))
+
+    def _time_starts(self, sorted_codes, dates):
+        """First row of each window: the first row of the group dated after date - span"""
+        n = self.n
+        missing = np.isnat(dates)
+        # Missing dates sort last and only ever cover themselves
+        values = np.where(missing, np.iinfo(np.int64).max, dates.view(np.int64))
+        bounds = np.where(missing, np.iinfo(np.int64).max, values - self.size)
+
+        # Dates are replaced by their rank among all rows (rows dated at or
+        # before them), so (group, rank) fits in one sortable int64 key. Ranks
+        # are looked up in date order, where the lookups are sequential.
+        ranked = values if np.all(values[1:] >= values[:-1]) else np.sort(values)
+        row_ranks = np.searchsorted(ranked, values, side='right')[self.order]
+        bound_ranks = np.searchsorted(ranked, bounds, side='right')[self.order]
+        row_keys = sorted_codes * (n + 1) + row_ranks
+        starts = np.searchsorted(row_keys, sorted_codes * (n + 1) + bound_ranks, side='right')
+        return np.where(missing[self.order], np.arange(n), starts)
+
+    def _window_sums(self, values, lengths):
+        """
+        Sum of every window over values already in group order
+
+        Integer-valued data: the int64 prefix sum up to the row minus the one
+        before its window start, which is exact. Other values: a float prefix
+        sum would depend on the rows before the window, so windows are added
+        up oldest row first, one offset at a time over the rows whose window
+        is still that long (the Python loop runs over the window length).
+        """
+        if np.array_equal(values, np.round(values)) and np.abs(values).sum() < 2 ** 53:
+            prefix = np.zeros(self.n + 1, dtype=np.int64)
+            np.cumsum(values.astype(np.int64), out=prefix[1:])
+            return (prefix[1:] - prefix[self.starts]).astype(np.float64)
+
+        sums = np.zeros(self.n, dtype=np.float64)
+        active = np.arange(self.n)
+        offset = 0
+        while active.size:
+            sums[active] += values[self.starts[active] + offset]
+            offset += 1
+            active = active[lengths[active] > offset]
+        return sums
+
+    def _lengths(self):
+        return np.arange(self.n) - self.starts + 1
+
+    def mean(self, values):
+        """
+        Mean of the non-missing values in every row's window
+
+        Returns:
+            float64 array in input row order (NaN where the whole window is missing)
+        """
+        if self.n == 0:
+            return np.empty(0, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)[self.order]
+        valid = ~np.isnan(values)
+        lengths = self._lengths()
+        sums = self._window_sums(np.where(valid, values, 0.0), lengths)
+        counts = lengths.astype(np.float64) if valid.all() else self._window_sums(valid.astype(np.float64), lengths)
+        result = np.empty(self.n, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[self.order] = np.where(counts > 0, sums / counts, np.nan)
+        return result
+
+    def diff(self, values):
+        """
+        Difference to the previous row of the same group
+
+        Returns:
+            float64 array in input row order (NaN for the first row of a group)
+        """
+        values = np.asarray(values, dtype=np.float64)[self.order]
+        previous = np.empty(self.n, dtype=np.float64)
+        previous[1:] = values[:-1]
+        previous[self.first] = np.nan
+        result = np.empty(self.n, dtype=np.float64)
+        result[self.order] = values - previous
+        return result
+
+    def tail(self, dates=None):
+        """
+        Rows (in input order) that later rows of the same group can still see
+
+        For a window of n posts these are the last n-1 rows of every group,
+        for time windows the rows within the span of the group's last date;
+        the last row of every group is always kept (for diffs).
+
+        Returns:
+            Boolean mask in input row order
+        """
+        last = np.ones(self.n, dtype=bool)
+        last[:-1] = self.first[1:]
+        position = np.arange(self.n)
+        # Position of the last row of each row's group
+        group_end = np.minimum.accumulate(np.where(last, position, self.n)[::-1])[::-1]
+        if self.kind == 'rows':
+            keep = group_end - position < max(self.size - 1, 1)
+        else:
+            dates = pd.Series(dates).to_numpy(dtype='datetime64[ns]')[self.order].view(np.int64)
+            keep = (dates > dates[group_end] - self.size) | last
+        mask = np.empty(self.n, dtype=bool)
+        mask[self.order] = keep
+        return mask
@@ -0,0 +1,191 @@
+"""
+Fast timestamp parsing
+Formats are detected once from a sample and cached per column signature (the
+column name plus the digit pattern of its values), so repeated uploads of the
+same export skip detection. Every distinct string is parsed only once with the
+detected format; only the values that fail it fall back to per-element
+inference.
+"""
+import re
+import threading
+import numpy as np
+import pandas as pd
+# pandas.tseries.api only exports it from pandas 2.2 on
+from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# Values sampled to detect a column's format
+SAMPLE_SIZE = 1000
+
+# Tried in order when the guessed format does not fit the sample
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y/%m/%d', '%Y/%m/%d %H:%M:%S', '%m/%d/%Y', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M',
+    '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y', '%d.%m.%Y', '%b %d, %Y', '%d %b %Y'
+]
+TIME_FORMATS = ['%H:%M:%S', '%H:%M', '%H:%M:%S.%f', '%I:%M %p', '%I:%M:%S %p', '%I %p', '%H']
+
+MAX_CACHED_FORMATS = 1024
+
+# Below this many sampled values a column is always factorized
+UNIQUE_SAMPLE_MIN = 50
+
+_format_cache = {}
+_cache_lock = threading.Lock()
+
+_DIGITS = re.compile(r'\d')
+
+def column_signature(column, value):
+    """Cache key of a column: its name and the digit pattern of a value"""
+    return (column, _DIGITS.sub('0', value))
+
+def _fits(sample, fmt):
+    """Number of sample values a format parses"""
+    try:
+        return int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+    except (ValueError, TypeError):
+        return 0
+
+def detect_format(values, candidates=DATE_FORMATS, sample_size=SAMPLE_SIZE):
+    """
+    Detect the strftime format of string values from a sample
+
+    Returns:
+        The format parsing the most sampled values (the guessed format wins
+        ties), or None if none parses any
+    """
+    values = pd.Series(values).dropna()
+    if values.empty:
+        return None
+    step = max(len(values) // sample_size, 1)
+    sample = values.iloc[::step][:sample_size].astype(str).to_numpy()
+
+    guessed = guess_datetime_format(sample[0])
+    best, best_count = None, 0
+    for fmt in ([guessed] if guessed else []) + list(candidates):
+        count = _fits(sample, fmt)
+        if count == len(sample):
+            return fmt
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+def cached_format(column, values, candidates=DATE_FORMATS):
+    """Format of a column, detected on the first call for each column signature"""
+    first = next((str(v) for v in values if v is not None and v == v), None)
+    if first is None:
+        return None
+    key = column_signature(column, first)
+    fmt = _format_cache.get(key)
+    if fmt is None and key not in _format_cache:
+        fmt = detect_format(values, candidates)
+        with _cache_lock:
+            if len(_format_cache) >= MAX_CACHED_FORMATS:
+                _format_cache.clear()
+            _format_cache[key] = fmt
+    return fmt
+
+def _parse_unique(uniques, fmt):
+    """Parse strings with a format; only the values it misses are inferred one by one"""
+    parsed = pd.to_datetime(uniques, format=fmt, errors='coerce')
+    failed = np.asarray(parsed.isna() & (uniques != 'nan'))
+    if failed.any():
+        fallback = pd.to_datetime(uniques[failed], errors='coerce', format='mixed')
+        try:
+            filled = pd.Series(parsed)
+            filled.iloc[np.flatnonzero(failed)] = pd.DatetimeIndex(fallback).astype(parsed.dtype)
+            parsed = pd.DatetimeIndex(filled)
+        except (TypeError, ValueError):
+            pass
+    return parsed
+
+def _mostly_unique(values):
+    """Whether a sample of the values is mostly distinct (factorizing would not pay off)"""
+    if len(values) < UNIQUE_SAMPLE_MIN:
+        return False
+    sample = values.iloc[::max(len(values) // SAMPLE_SIZE, 1)]
+    return sample.nunique() > 0.9 * len(sample)
+
+def _parse_strings(values, column, candidates):
+    """
+    Parse a string column with its cached format
+
+    Columns with repeated values (dates, times of day, categoricals) are parsed
+    once per distinct value and expanded by code; mostly distinct columns are
+    parsed directly.
+
+    Returns:
+        datetime64 Series aligned with values
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = values.cat.categories
+    elif _mostly_unique(values):
+        strings = values.astype(str).where(values.notna())
+        fmt = cached_format(column, strings, candidates)
+        if fmt is None:
+            return pd.to_datetime(strings, errors='coerce', format='mixed')
+        return pd.Series(_parse_unique(pd.Index(strings.fillna('nan')), fmt), index=values.index)
+    else:
+        codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques).astype(str)
+
+    fmt = cached_format(column, uniques, candidates)
+    if fmt is None:
+        parsed = pd.to_datetime(uniques, errors='coerce', format='mixed')
+    else:
+        parsed = _parse_unique(uniques, fmt)
+    result = parsed.take(np.where(codes >= 0, codes, 0)).where(codes >= 0)
+    return pd.Series(result, index=values.index)
+
+def parse_datetime(values, column=None):
+    """
+    Parse a column of timestamps (drop-in for pd.to_datetime(values, errors='coerce'))
+
+    Args:
+        values: Series of strings, datetimes or epoch numbers
+        column: Column name used for the format cache (default: values.name)
+
+    Returns:
+        datetime64 Series with NaT for unparseable values
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+    if not (pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)
+            or isinstance(values.dtype, pd.CategoricalDtype)):
+        return pd.to_datetime(values, errors='coerce')
+    return _parse_strings(values, column if column is not None else values.name, DATE_FORMATS)
+
+def parse_time_of_day(values, column='post_time'):
+    """
+    Parse 'HH:MM[:SS]'-style times into offsets from midnight
+
+    Returns:
+        timedelta64 Series with NaT for unparseable values
+    """
+    values = pd.Series(values)
+    if not (isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(values.dtype)
+            or pd.api.types.is_string_dtype(values.dtype)):
+        values = values.astype(str).where(values.notna())
+    parsed = _parse_strings(values, column, TIME_FORMATS)
+    return parsed - parsed.dt.normalize()
+
+def hour_of_day(offsets):
+    """Hour (float, NaN when missing) of time-of-day offsets"""
+    return offsets // pd.Timedelta(hours=1)
+
+def parse_post_datetime(dates, times, date_column=None):
+    """
+    Fuse a date column and a post_time column into one timestamp per post
+
+    Both columns are parsed once per distinct value and combined arithmetically
+    (date at midnight + time of day), which avoids concatenating strings.
+    Posts whose time cannot be parsed keep the timestamp of their date.
+
+    Returns:
+        datetime64 Series (NaT where the date is missing or invalid)
+    """
+    parsed_dates = parse_datetime(dates, date_column)
+    offsets = parse_time_of_day(times)
+    fused = parsed_dates.dt.normalize() + offsets.to_numpy()
+    return fused.where(offsets.notna().to_numpy(), parsed_dates)
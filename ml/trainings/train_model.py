@@ -1,13 +1,13 @@
 """
 Enhanced Machine Learning Model Training
-Trains both Linear Regression and Random Forest models
+Trains Linear Regression, Random Forest and Histogram Gradient Boosting models
 Predicts: Likes and Follower Growth
 """
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 import os
@@ -16,6 +16,11 @@ import sys
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
+# Boosting rounds of the histogram gradient boosting models; with more than
+# 10,000 training rows early stopping (10 rounds without improvement on a 10%
+# validation split) usually ends training well before this
+HGB_MAX_ITER = 500
+
 def prepare_features(df):
     """
     Prepare features for model training
@@ -69,13 +74,102 @@ def prepare_features(df):
     
     return features
 
+def build_feature_matrix(df, feature_cols=None):
+    """
+    Build the numeric feature matrix used for prediction
+    
+    Args:
+        df: Preprocessed DataFrame with features
+        feature_cols: Feature columns to use (default: prepare_features(df))
+        
+    Returns:
+        DataFrame of float features with missing/infinite values set to 0
+    """
+    if feature_cols is None:
+        feature_cols = prepare_features(df)
+    
+    X = df[feature_cols].fillna(0)
+    X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
+    X = X.replace([np.inf, -np.inf], 0)
+    return X
+
+def evaluate_model(y_true, y_pred):
+    """
+    Compute and print the evaluation metrics of a model on the test set
+    
+    Returns:
+        Dictionary with mae, rmse and r2
+    """
+    metrics = {
+        'mae': mean_absolute_error(y_true, y_pred),
+        'rmse': np.sqrt(mean_squared_error(y_true, y_pred)),
+        'r2': r2_score(y_true, y_pred)
+    }
+    print(f"  MAE: {metrics['mae']:.2f}")
+    print(f"  RMSE: {metrics['rmse']:.2f}")
+    print(f"  R² Score: {metrics['r2']:.4f}")
+    return metrics
+
+def hist_gradient_boosting(train_rows):
+    """
+    Histogram gradient boosting regressor for a training set size
+    
+    Early stopping kicks in above 10,000 rows; the minimum leaf size shrinks
+    on small datasets so the trees can still split.
+    """
+    return HistGradientBoostingRegressor(
+        max_iter=HGB_MAX_ITER,
+        learning_rate=0.1,
+        min_samples_leaf=min(20, max(train_rows // 10, 1)),
+        early_stopping='auto',
+        n_iter_no_change=10,
+        random_state=42
+    )
+
+class MultiTargetRegressor:
+    """
+    One model predicting several targets in a single traversal
+    
+    Targets are standardized before fitting so each weighs the same in the
+    split criterion of a multi-output forest; predictions are returned in the
+    original units, one column per target.
+    
+    Args:
+        estimator: Unfitted regressor supporting 2D targets
+        targets: Target names, in column order of the predictions
+    """
+    
+    def __init__(self, estimator, targets):
+        self.estimator = estimator
+        self.targets = list(targets)
+    
+    @property
+    def feature_names_in_(self):
+        return getattr(self.estimator, 'feature_names_in_', None)
+    
+    def fit(self, X, Y):
+        Y = np.asarray(Y, dtype=np.float64).reshape(len(X), -1)
+        self.mean_ = Y.mean(axis=0)
+        self.scale_ = Y.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1.0
+        scaled = (Y - self.mean_) / self.scale_
+        self.estimator.fit(X, scaled if scaled.shape[1] > 1 else scaled[:, 0])
+        return self
+    
+    def predict(self, X):
+        """Predictions of shape (rows, targets)"""
+        Y = np.asarray(self.estimator.predict(X)).reshape(len(X), -1)
+        return Y * self.scale_ + self.mean_
+
 def train_models(df, model_type='both'):
     """
     Train machine learning models to predict likes and follower growth
     
     Args:
         df: Preprocessed DataFrame with features
-        model_type: 'linear', 'random_forest', or 'both'
+        model_type: 'linear', 'random_forest', 'both' (linear and random
+            forest), 'hist_gradient_boosting', or 'joint' (one multi-output
+            random forest for likes and follower growth, stored under 'joint')
         
     Returns:
         Dictionary with trained models for likes and follower_growth
@@ -106,23 +200,18 @@ def train_models(df, model_type='both'):
         df_sorted = df.sort_values('post_date' if 'post_date' in df.columns else df.index)
         y_follower_growth = df_sorted['followers_at_post_time'].diff().fillna(0)
     
-    # Split data
+    # One split shared by every target and model
     if len(X) > 5:
-        X_train, X_test, y_likes_train, y_likes_test = train_test_split(
-            X, y_likes, test_size=0.2, random_state=42
-        )
-        
-        if y_follower_growth is not None:
-            _, _, y_growth_train, y_growth_test = train_test_split(
-                X, y_follower_growth, test_size=0.2, random_state=42
-            )
-        else:
-            y_growth_train, y_growth_test = None, None
+        targets = [y_likes] + ([y_follower_growth] if y_follower_growth is not None else [])
+        split = train_test_split(X, *targets, test_size=0.2, random_state=42)
+        X_train, X_test, y_likes_train, y_likes_test = split[:4]
+        y_growth_train, y_growth_test = split[4:6] if y_follower_growth is not None else (None, None)
     else:
         X_train, X_test = X, X
         y_likes_train, y_likes_test = y_likes, y_likes
-        y_growth_train, y_growth_test = y_follower_growth, y_follower_growth if y_follower_growth is not None else (None, None)
+        y_growth_train, y_growth_test = y_follower_growth, y_follower_growth
     
+    has_growth = y_growth_train is not None and len(y_growth_train[y_growth_train != 0]) > 0
     models = {}
     metrics = {}
     
@@ -134,15 +223,7 @@ def train_models(df, model_type='both'):
         models['likes_linear'] = lr_likes
         
         if len(X_test) > 0:
-            y_pred = lr_likes.predict(X_test)
-            metrics['likes_linear'] = {
-                'mae': mean_absolute_error(y_likes_test, y_pred),
-                'rmse': np.sqrt(mean_squared_error(y_likes_test, y_pred)),
-                'r2': r2_score(y_likes_test, y_pred)
-            }
-            print(f"  MAE: {metrics['likes_linear']['mae']:.2f}")
-            print(f"  RMSE: {metrics['likes_linear']['rmse']:.2f}")
-            print(f"  R² Score: {metrics['likes_linear']['r2']:.4f}")
+            metrics['likes_linear'] = evaluate_model(y_likes_test, lr_likes.predict(X_test))
     
     if model_type in ['random_forest', 'both']:
         print("\n=== Training Random Forest for LIKES ===")
@@ -156,18 +237,19 @@ def train_models(df, model_type='both'):
         models['likes_random_forest'] = rf_likes
         
         if len(X_test) > 0:
-            y_pred = rf_likes.predict(X_test)
-            metrics['likes_random_forest'] = {
-                'mae': mean_absolute_error(y_likes_test, y_pred),
-                'rmse': np.sqrt(mean_squared_error(y_likes_test, y_pred)),
-                'r2': r2_score(y_likes_test, y_pred)
-            }
-            print(f"  MAE: {metrics['likes_random_forest']['mae']:.2f}")
-            print(f"  RMSE: {metrics['likes_random_forest']['rmse']:.2f}")
-            print(f"  R² Score: {metrics['likes_random_forest']['r2']:.4f}")
+            metrics['likes_random_forest'] = evaluate_model(y_likes_test, rf_likes.predict(X_test))
+    
+    if model_type == 'hist_gradient_boosting':
+        print("\n=== Training Histogram Gradient Boosting for LIKES ===")
+        hgb_likes = hist_gradient_boosting(len(X_train))
+        hgb_likes.fit(X_train, y_likes_train)
+        models['likes_hist_gradient_boosting'] = hgb_likes
+        
+        if len(X_test) > 0:
+            metrics['likes_hist_gradient_boosting'] = evaluate_model(y_likes_test, hgb_likes.predict(X_test))
     
     # Train models for FOLLOWER GROWTH prediction (if data available)
-    if y_growth_train is not None and len(y_growth_train[y_growth_train != 0]) > 0:
+    if has_growth:
         if model_type in ['linear', 'both']:
             print("\n=== Training Linear Regression for FOLLOWER GROWTH ===")
             lr_growth = LinearRegression()
@@ -175,15 +257,7 @@ def train_models(df, model_type='both'):
             models['follower_growth_linear'] = lr_growth
             
             if len(X_test) > 0 and y_growth_test is not None:
-                y_pred = lr_growth.predict(X_test)
-                metrics['follower_growth_linear'] = {
-                    'mae': mean_absolute_error(y_growth_test, y_pred),
-                    'rmse': np.sqrt(mean_squared_error(y_growth_test, y_pred)),
-                    'r2': r2_score(y_growth_test, y_pred)
-                }
-                print(f"  MAE: {metrics['follower_growth_linear']['mae']:.2f}")
-                print(f"  RMSE: {metrics['follower_growth_linear']['rmse']:.2f}")
-                print(f"  R² Score: {metrics['follower_growth_linear']['r2']:.4f}")
+                metrics['follower_growth_linear'] = evaluate_model(y_growth_test, lr_growth.predict(X_test))
         
         if model_type in ['random_forest', 'both']:
             print("\n=== Training Random Forest for FOLLOWER GROWTH ===")
@@ -197,35 +271,116 @@ def train_models(df, model_type='both'):
             models['follower_growth_random_forest'] = rf_growth
             
             if len(X_test) > 0 and y_growth_test is not None:
-                y_pred = rf_growth.predict(X_test)
-                metrics['follower_growth_random_forest'] = {
-                    'mae': mean_absolute_error(y_growth_test, y_pred),
-                    'rmse': np.sqrt(mean_squared_error(y_growth_test, y_pred)),
-                    'r2': r2_score(y_growth_test, y_pred)
-                }
-                print(f"  MAE: {metrics['follower_growth_random_forest']['mae']:.2f}")
-                print(f"  RMSE: {metrics['follower_growth_random_forest']['rmse']:.2f}")
-                print(f"  R² Score: {metrics['follower_growth_random_forest']['r2']:.4f}")
+                metrics['follower_growth_random_forest'] = evaluate_model(y_growth_test, rf_growth.predict(X_test))
+        
+        if model_type == 'hist_gradient_boosting':
+            print("\n=== Training Histogram Gradient Boosting for FOLLOWER GROWTH ===")
+            hgb_growth = hist_gradient_boosting(len(X_train))
+            hgb_growth.fit(X_train, y_growth_train)
+            models['follower_growth_hist_gradient_boosting'] = hgb_growth
+            
+            if len(X_test) > 0 and y_growth_test is not None:
+                metrics['follower_growth_hist_gradient_boosting'] = evaluate_model(y_growth_test, hgb_growth.predict(X_test))
+    
+    # Train ONE model for both targets: shared trees, one traversal per prediction
+    if model_type == 'joint':
+        targets = ['likes', 'follower_growth'] if has_growth else ['likes']
+        print(f"\n=== Training joint Random Forest for {' + '.join(t.upper() for t in targets)} ===")
+        joint = MultiTargetRegressor(
+            RandomForestRegressor(
+                n_estimators=100,
+                max_depth=10,
+                random_state=42,
+                n_jobs=-1
+            ),
+            targets
+        )
+        Y_train = np.column_stack([y_likes_train, y_growth_train] if has_growth else [y_likes_train])
+        joint.fit(X_train, Y_train)
+        models['joint'] = joint
+        
+        if len(X_test) > 0:
+            predictions = joint.predict(X_test)
+            for i, (target, y_test) in enumerate(zip(targets, (y_likes_test, y_growth_test))):
+                print(f"  {target}:")
+                metrics[f'{target}_joint'] = evaluate_model(y_test, predictions[:, i])
     
     return models, metrics
 
-def train_model(df, model_type='random_forest'):
+def export_model(model, thresholds='float32'):
+    """
+    Convert a trained model to the compact inference format
+    
+    Random forests and histogram gradient boosting models (also inside a
+    joint model) are flattened into contiguous arrays evaluated with numpy
+    (see trainings.flat_forest): they load in about a millisecond, take a
+    fraction of the memory and predict the same values. Other models are
+    returned unchanged.
+    
+    Args:
+        model: Trained model
+        thresholds: 'float64', 'float32' or 'quantized' split thresholds
+    """
+    from trainings.flat_forest import THRESHOLD_FORMATS, FlatForest, flatten_forest
+    
+    if thresholds not in THRESHOLD_FORMATS:
+        raise ValueError(f"Threshold format must be one of {', '.join(THRESHOLD_FORMATS)}, not {thresholds}")
+    if isinstance(model, MultiTargetRegressor):
+        exported = MultiTargetRegressor(export_model(model.estimator, thresholds), model.targets)
+        exported.mean_ = model.mean_
+        exported.scale_ = model.scale_
+        return exported
+    if isinstance(model, FlatForest):
+        return model
+    try:
+        return flatten_forest(model, thresholds)
+    except ValueError:
+        return model
+
+def export_models(models, thresholds='float32'):
+    """Convert every model of a train_models() dictionary with export_model()"""
+    return {name: export_model(model, thresholds) for name, model in models.items()}
+
+def train_model(df, model_type='random_forest', budget_seconds=None):
     """
     Main training function (backward compatibility)
     Returns the best model for likes prediction
+    
+    With budget_seconds the models are trained on growing samples until the
+    budget runs out or accuracy plateaus (see trainings.budgeted_training).
+    With model_type='auto' the model is picked by cross-validation (see
+    trainings.model_selection). When several likes models are trained, the
+    one with the lowest test MAE is returned.
     """
-    models, metrics = train_models(df, model_type)
+    if model_type == 'auto':
+        from trainings.model_selection import select_models
+        models, metrics, selection = select_models(df)
+        print(f"\nModel selection: {selection['winners']['likes']} in {selection['seconds']:.1f}s")
+    elif budget_seconds:
+        from trainings.budgeted_training import train_models_budgeted
+        models, metrics, report = train_models_budgeted(df, model_type, budget_seconds)
+        print(f"\nBudgeted training: {report['rows']:,} of {report['total_rows']:,} posts, "
+              f"{report['seconds']:.1f}s, stopped on {report['stopped']}")
+    else:
+        models, metrics = train_models(df, model_type)
+    
+    likes_models = [name for name in models if name.startswith('likes_') and name in metrics]
+    if likes_models:
+        return models[min(likes_models, key=lambda name: metrics[name]['mae'])]
     
-    # Return Random Forest for likes as default (usually better performance)
+    # Without metrics, Random Forest for likes as default (usually better performance)
     if 'likes_random_forest' in models:
         return models['likes_random_forest']
+    elif 'likes_hist_gradient_boosting' in models:
+        return models['likes_hist_gradient_boosting']
     elif 'likes_linear' in models:
         return models['likes_linear']
+    elif 'joint' in models:
+        return models['joint']
     else:
         raise ValueError("No model trained successfully")
 
 if __name__ == '__main__':
-    # Example usage
-    print("Enhanced ML Model Training Script")
-    print("Supports both Linear Regression and Random Forest")
-    print("Predicts: Likes and Follower Growth")
+    # Offline trainer: python -m trainings.train_model --data-dir data --model-types random_forest,auto
+    from trainings.offline_training import main
+    sys.exit(main())